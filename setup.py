@@ -48,6 +48,7 @@ setuptools.setup(
         "pushi.app.controllers",
         "pushi.app.models",
         "pushi.base",
+        "pushi.bench",
         "pushi.net",
         "pushi.test",
     ],
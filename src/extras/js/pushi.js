@@ -108,6 +108,10 @@ Channel.prototype.setlatest = function(data) {
     this.trigger("latest", data);
 };
 
+Channel.prototype.setmembers = function(data) {
+    this.trigger("members", data);
+};
+
 Channel.prototype.setmessage = function(event, data, mid, timestamp) {
     this.trigger(event, data, mid, timestamp);
 };
@@ -124,6 +128,10 @@ Channel.prototype.latest = function(skip, count, callback) {
     this.pushi.latest(this.name, skip, count, callback);
 };
 
+Channel.prototype.members = function(skip, count, callback) {
+    this.pushi.members(this.name, skip, count, callback);
+};
+
 Channel.prototype.trigger = Observable.prototype.trigger;
 Channel.prototype.bind = Observable.prototype.bind;
 Channel.prototype.unbind = Observable.prototype.unbind;
@@ -297,6 +305,13 @@ Pushi.prototype.open = function(callback) {
         if (isConnected) {
             data = JSON.parse(json.data);
             self.callobj(Pushi.prototype.onoconnect, this.subscriptions, data);
+        } else if (json.event === "pusher:ping") {
+            self.sendEvent("pusher:pong", "{}");
+        } else if (self.state === "connected" && json.event === "pusher:batch") {
+            for (var index = 0; index < json.data.length; index++) {
+                data = json.data[index];
+                self.callobj(Pushi.prototype.onmessage, this.subscriptions, data);
+            }
         } else if (self.state === "connected") {
             data = json;
             self.callobj(Pushi.prototype.onmessage, this.subscriptions, data);
@@ -413,6 +428,15 @@ Pushi.prototype.onlatest = function(channel, data) {
     this.trigger("latest", channel, data);
 };
 
+Pushi.prototype.onmembers = function(channel, data) {
+    if (!this.channels[channel]) {
+        return;
+    }
+    var _channel = this.channels[channel];
+    _channel.setmembers(data);
+    this.trigger("members", channel, data);
+};
+
 Pushi.prototype.onmemberadded = function(channel, member) {
     this.trigger("member_added", channel, member);
 };
@@ -447,6 +471,11 @@ Pushi.prototype.onmessage = function(json) {
             this.onlatest(channel, data);
             break;
 
+        case "pusher_internal:members":
+            data = JSON.parse(json.data);
+            this.onmembers(channel, data);
+            break;
+
         case "pusher:member_added":
             member = JSON.parse(json.member);
             this.onmemberadded(channel, member);
@@ -456,6 +485,16 @@ Pushi.prototype.onmessage = function(json) {
             member = JSON.parse(json.member);
             this.onmemberremoved(channel, member);
             break;
+
+        case "pusher:member_diff":
+            data = JSON.parse(json.data);
+            for (var index = 0; index < data.added.length; index++) {
+                this.onmemberadded(channel, data.added[index]);
+            }
+            for (index = 0; index < data.removed.length; index++) {
+                this.onmemberremoved(channel, data.removed[index]);
+            }
+            break;
     }
 
     this.trigger(json.event, json.data, json.channel, json.mid, json.timestamp);
@@ -627,6 +666,37 @@ Pushi.prototype.latest = function(channel, skip, count, callback) {
     return channel;
 };
 
+Pushi.prototype.members = function(channel, skip, count, callback) {
+    // sets the default values for the members retrieval, a zero count
+    // means that the page is bounded by the members limit of the server
+    skip = skip || 0;
+    count = count || 0;
+
+    // verifies if the channel is currently defined in the
+    // list of channels for the connection if not returns immediately
+    if (!this.channels[channel]) {
+        return;
+    }
+
+    // sends the event for the retrieval of the page of members of the
+    // (presence) channel, in case more members exist than the ones sent
+    // upon subscription (members_more flag)
+    this.sendEvent("pusher:members", {
+        channel: channel,
+        skip: skip,
+        count: count
+    });
+
+    // in case the callback function is defined registers for the
+    // members event on the channel object
+    channel = this.channels[channel];
+    callback && channel.bind("members", callback, true);
+
+    // returns the channel structure to the caller function so that
+    // may be used for any other operations pending
+    return channel;
+};
+
 Pushi.prototype.ensureChannel = function(name) {
     if (this.channels[name]) {
         return this.channels[name];
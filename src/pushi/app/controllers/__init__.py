@@ -31,6 +31,7 @@ from . import base
 from . import event
 from . import health
 from . import messaging
+from . import metrics
 from . import smtp
 from . import socket
 from . import subscription
@@ -43,6 +44,7 @@ from .base import BaseController
 from .event import EventController
 from .health import HealthController
 from .messaging import MessagingController
+from .metrics import MetricsController
 from .smtp import SMTPController
 from .socket import SocketController
 from .subscription import SubscriptionController
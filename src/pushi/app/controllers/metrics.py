@@ -0,0 +1,59 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import appier
+
+
+class MetricsController(appier.Controller):
+    """
+    Controller for the metrics endpoint.
+
+    Exposes the metrics of the Pushi system (connections, subscriptions,
+    events, fan-out and delayed queue latencies) using the Prometheus
+    text exposition format, to be scraped by a monitoring system.
+    """
+
+    @appier.route("/metrics", "GET")
+    def metrics(self):
+        """
+        Renders the complete set of metrics of the current process
+        using the Prometheus text exposition format.
+
+        :rtype: String
+        :return: The metrics in the Prometheus text exposition format.
+        """
+
+        self.content_type("text/plain; version=0.0.4; charset=utf-8")
+
+        state = getattr(self.owner, "state", None)
+        if state == None:
+            return ""
+
+        return state.metrics.render()
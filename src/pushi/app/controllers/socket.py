@@ -40,8 +40,8 @@ class SocketController(appier.Controller):
 
         sockets = []
 
-        for socket_id, channel in state.socket_channels.iteritems():
-            socket = dict(socket_id=socket_id, channel=channel)
+        for socket_id, channels in state.socket_channels.items():
+            socket = dict(socket_id=socket_id, channel=list(channels))
             sockets.append(socket)
 
         return dict(sockets=sockets)
@@ -51,6 +51,6 @@ class SocketController(appier.Controller):
     def show(self, socket_id):
         app_id = self.session.get("app_id", None)
         state = self.state.get_state(app_id=app_id)
-        channels = state.socket_channels.get(socket_id, [])
+        channels = state.socket_channels.get(socket_id, ())
 
-        return dict(channels=channels)
+        return dict(channels=list(channels))
@@ -124,21 +124,30 @@ class APN(base.PushiBase):
         base.PushiBase.pre_update(self)
         previous = self.__class__.get(id=self.id)
         if self.state:
-            self.state.apn_handler.remove(
-                previous.app_id, previous.token, previous.event
+            self.state.handoff(
+                self.state.apn_handler.remove,
+                previous.app_id,
+                previous.token,
+                previous.event,
             )
 
     def post_create(self):
         base.PushiBase.post_create(self)
         if self.state:
-            self.state.apn_handler.add(self.app_id, self.token, self.event)
+            self.state.handoff(
+                self.state.apn_handler.add, self.app_id, self.token, self.event
+            )
 
     def post_update(self):
         base.PushiBase.post_update(self)
         if self.state:
-            self.state.apn_handler.add(self.app_id, self.token, self.event)
+            self.state.handoff(
+                self.state.apn_handler.add, self.app_id, self.token, self.event
+            )
 
     def post_delete(self):
         base.PushiBase.post_delete(self)
         if self.state:
-            self.state.apn_handler.remove(self.app_id, self.token, self.event)
+            self.state.handoff(
+                self.state.apn_handler.remove, self.app_id, self.token, self.event
+            )
@@ -35,6 +35,14 @@ import appier
 
 from . import base
 
+QUEUE_POLICY_S = {
+    "drop_oldest": "Drop Oldest",
+    "drop_newest": "Drop Newest",
+    "disconnect": "Disconnect",
+}
+""" The map associating the outbound queue policies with
+their human readable description """
+
 
 class App(base.PushiBase):
     """
@@ -66,6 +74,9 @@ class App(base.PushiBase):
         - On create: Auto-generates `ident`, `key`, and `secret` credentials.
         - The `instance` field is set to `ident` for self-referential scoping.
         - Credentials are immutable after creation for security.
+        - On create/update/delete: Invalidates the app record (or the negative
+          entry) cached by the state, that otherwise expires after
+          `PUSHI_APP_TTL` (or `PUSHI_APP_MISS_TTL`) seconds.
 
     Cautions:
         - Credential exposure: The `key` and `secret` fields are marked `safe=True`
@@ -213,12 +224,179 @@ class App(base.PushiBase):
     :type: str
     """
 
+    queue_bytes = appier.field(
+        type=int,
+        description="Queue Bytes",
+        observations="""The maximum number of bytes that may be queued
+        for a connection of the application before the queue policy is
+        applied, falls back to the server default if not set""",
+    )
+    """
+    Maximum size in bytes of the outbound queue of each connection.
+    Protects the server memory from slow consumers (eg: mobile clients).
+
+    :type: int
+    """
+
+    queue_messages = appier.field(
+        type=int,
+        description="Queue Messages",
+        observations="""The maximum number of messages that may be queued
+        for a connection of the application before the queue policy is
+        applied, falls back to the server default if not set""",
+    )
+    """
+    Maximum number of messages in the outbound queue of each connection.
+
+    :type: int
+    """
+
+    queue_policy = appier.field(
+        meta="enum",
+        enum=QUEUE_POLICY_S,
+        description="Queue Policy",
+        observations="""The policy applied to a connection that goes over
+        its outbound queue limits, either dropping the oldest or the newest
+        messages or disconnecting the connection""",
+    )
+    """
+    Policy for connections over their queue limits, one of `drop_oldest`,
+    `drop_newest` or `disconnect` (closed with the 4100 code).
+
+    :type: str
+    """
+
+    coalesce = appier.field(
+        type=int,
+        description="Coalesce (ms)",
+        observations="""The size in milliseconds of the window in which
+        the events of a connection are coalesced into a single batched
+        frame, zero disables coalescing (server default if not set)""",
+    )
+    """
+    Window in milliseconds for the coalescing of events (eg: 5 to 20),
+    reduces the frames and syscalls for bursty (high frequency) channels.
+
+    :type: int
+    """
+
+    coalesce_channels = appier.field(
+        type=list,
+        description="Coalesce Channels",
+        observations="""The prefixes of the channels whose events are
+        coalesced, if not set the events of every channel are coalesced""",
+    )
+    """
+    Prefixes of the channels subject to coalescing (eg: `prices-`).
+
+    :type: list
+    """
+
+    conflate_channels = appier.field(
+        type=list,
+        description="Conflate Channels",
+        observations="""The prefixes of the channels whose events are
+        conflated, keeping only the most recent undelivered event of the
+        channel for each slow connection (besides the conflated- channels)""",
+    )
+    """
+    Prefixes of the (state like) channels to be conflated (eg: `scores-`).
+
+    :type: list
+    """
+
+    max_connections = appier.field(
+        type=int,
+        description="Max Connections",
+        observations="""The maximum number of simultaneous connections
+        of the application, zero means unlimited (server default if not set)""",
+    )
+    """
+    Maximum number of simultaneous connections of the application.
+
+    :type: int
+    """
+
+    members_limit = appier.field(
+        type=int,
+        description="Members Limit",
+        observations="""The maximum number of members of a presence channel
+        sent inline upon subscription, the remaining ones are requested in
+        pages, zero means unlimited (server default if not set)""",
+    )
+    """
+    Maximum number of members sent inline upon the subscription of a
+    presence channel (eg: 1000), protects the joins of large channels.
+
+    :type: int
+    """
+
+    connection_rate = appier.field(
+        type=float,
+        description="Connection Rate",
+        observations="""The number of new connections per second allowed
+        for the application (token bucket), zero means unlimited""",
+    )
+    """
+    Rate of new connections per second for the application, protects
+    the server from reconnection storms of a single tenant.
+
+    :type: float
+    """
+
+    connection_burst = appier.field(
+        type=int,
+        description="Connection Burst",
+        observations="""The number of new connections that may be accepted
+        at once over the connection rate, defaults to the rate""",
+    )
+    """
+    Capacity of the connection token bucket of the application.
+
+    :type: int
+    """
+
+    message_rate = appier.field(
+        type=float,
+        description="Message Rate",
+        observations="""The number of messages per second that each connection
+        of the application is allowed to send, zero means unlimited""",
+    )
+    """
+    Rate of (inbound) messages per second for each connection, messages
+    over the limit are dropped with a `pusher:error` (4301) event.
+
+    :type: float
+    """
+
+    message_burst = appier.field(
+        type=int,
+        description="Message Burst",
+        observations="""The number of messages that a connection may send
+        at once over the message rate, defaults to the rate""",
+    )
+    """
+    Capacity of the message token bucket of each connection.
+
+    :type: int
+    """
+
     @classmethod
     def validate(cls):
         return super(App, cls).validate() + [
             appier.not_null("name"),
             appier.not_empty("name"),
             appier.not_duplicate("name", cls._name()),
+            appier.gt("queue_bytes", 0),
+            appier.gt("queue_messages", 0),
+            appier.is_in("queue_policy", QUEUE_POLICY_S.keys()),
+            appier.gte("coalesce", 0),
+            appier.gte("max_connections", 0),
+            appier.gte("members_limit", 0),
+            appier.gte("connection_rate", 0),
+            appier.gte("connection_burst", 0),
+            appier.gte("message_rate", 0),
+            appier.gte("message_burst", 0),
         ]
 
     @classmethod
@@ -238,6 +416,21 @@ class App(base.PushiBase):
 
         self.instance = self.ident
 
+    def post_create(self):
+        base.PushiBase.post_create(self)
+        if self.state:
+            self.state.invalidate_app(app_id=self.ident, app_key=self.key)
+
+    def post_update(self):
+        base.PushiBase.post_update(self)
+        if self.state:
+            self.state.invalidate_app(app_id=self.ident, app_key=self.key)
+
+    def post_delete(self):
+        base.PushiBase.post_delete(self)
+        if self.state:
+            self.state.invalidate_app(app_id=self.ident, app_key=self.key)
+
     @appier.operation(
         name="Generate VAPID",
         description="""Generates a new VAPID key pair for Web Push notifications,
@@ -123,21 +123,30 @@ class SMTP(base.PushiBase):
         base.PushiBase.pre_update(self)
         previous = self.__class__.get(id=self.id)
         if self.state:
-            self.state.smtp_handler.remove(
-                previous.app_id, previous.email, previous.event
+            self.state.handoff(
+                self.state.smtp_handler.remove,
+                previous.app_id,
+                previous.email,
+                previous.event,
             )
 
     def post_create(self):
         base.PushiBase.post_create(self)
         if self.state:
-            self.state.smtp_handler.add(self.app_id, self.email, self.event)
+            self.state.handoff(
+                self.state.smtp_handler.add, self.app_id, self.email, self.event
+            )
 
     def post_update(self):
         base.PushiBase.post_update(self)
         if self.state:
-            self.state.smtp_handler.add(self.app_id, self.email, self.event)
+            self.state.handoff(
+                self.state.smtp_handler.add, self.app_id, self.email, self.event
+            )
 
     def post_delete(self):
         base.PushiBase.post_delete(self)
         if self.state:
-            self.state.smtp_handler.remove(self.app_id, self.email, self.event)
+            self.state.handoff(
+                self.state.smtp_handler.remove, self.app_id, self.email, self.event
+            )
@@ -152,21 +152,30 @@ class WebPush(base.PushiBase):
         base.PushiBase.pre_update(self)
         previous = self.__class__.get(id=self.id)
         if self.state:
-            self.state.web_push_handler.remove(
-                previous.app_id, previous.id, previous.event
+            self.state.handoff(
+                self.state.web_push_handler.remove,
+                previous.app_id,
+                previous.id,
+                previous.event,
             )
 
     def post_create(self):
         base.PushiBase.post_create(self)
         if self.state:
-            self.state.web_push_handler.add(self.app_id, self.id, self.event)
+            self.state.handoff(
+                self.state.web_push_handler.add, self.app_id, self.id, self.event
+            )
 
     def post_update(self):
         base.PushiBase.post_update(self)
         if self.state:
-            self.state.web_push_handler.add(self.app_id, self.id, self.event)
+            self.state.handoff(
+                self.state.web_push_handler.add, self.app_id, self.id, self.event
+            )
 
     def post_delete(self):
         base.PushiBase.post_delete(self)
         if self.state:
-            self.state.web_push_handler.remove(self.app_id, self.id, self.event)
+            self.state.handoff(
+                self.state.web_push_handler.remove, self.app_id, self.id, self.event
+            )
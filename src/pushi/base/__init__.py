@@ -26,17 +26,30 @@ __license__ = "Apache License, Version 2.0"
 """ The license for the module """
 
 from . import apn
+from . import broker
+from . import bus
+from . import cache
 from . import handler
 from . import messaging
+from . import metrics
+from . import ordered
+from . import ring
 from . import smtp
+from . import snapshot
 from . import state
 from . import web
 from . import web_push
 
 from .apn import APNHandler
+from .broker import Broker, LoopbackHub, LoopbackBroker
+from .bus import Bus, WorkerBus
+from .cache import AppCache, HistoryCache
 from .handler import Handler
 from .messaging import Messenger
+from .metrics import Metric, Counter, Gauge, Histogram, Metrics
+from .ordered import OrderedSet
+from .ring import RingBuffer
 from .smtp import SMTPHandler
-from .state import AppState, State
+from .state import AppState, ChannelInfo, Handoff, MemberInfo, State
 from .web import WebHandler
 from .web_push import WebPushHandler, is_pem_key
@@ -28,9 +28,16 @@ __copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
 __license__ = "Apache License, Version 2.0"
 """ The license for the module """
 
+import os
+
 import pushi
 
+SERVER_BACKEND = os.environ.get("SERVER_BACKEND", "netius")
+
 state = pushi.State()
 app = pushi.PushiApp(state)
-server = pushi.PushiServer(state)
+if SERVER_BACKEND == "asyncio":
+    server = pushi.AsyncioServer(state)
+else:
+    server = pushi.PushiServer(state)
 state.load(app, server)
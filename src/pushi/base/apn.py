@@ -258,8 +258,9 @@ class APNHandler(handler.Handler):
 
         return dict(success=True, tokens=sent_tokens)
 
-    def load(self):
-        subs = pushi.APN.find()
+    def load(self, subs=None):
+        if subs == None:
+            subs = pushi.APN.find()
         for sub in subs:
             app_id = sub.app_id
             token = sub.token
@@ -269,7 +270,8 @@ class APNHandler(handler.Handler):
     def add(self, app_id, token, event):
         events = self.subs.get(app_id, {})
         tokens = events.get(event, [])
-        tokens.append(token)
+        if not token in tokens:
+            tokens.append(token)
         events[event] = tokens
         self.subs[app_id] = events
 
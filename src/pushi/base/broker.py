@@ -0,0 +1,147 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import uuid
+import threading
+
+
+class Broker(object):
+    """
+    Top level abstract broker from which all the (inter-node)
+    brokers should inherit, a broker relays the events sent to
+    channels among the various nodes of a pushi cluster.
+
+    The routing is interest based, meaning that each node
+    registers the channels for which it holds subscribers and
+    the events are only published to the interested nodes.
+    """
+
+    def __init__(self, node_id=None, name=None):
+        self.node_id = node_id or str(uuid.uuid4())
+        self.name = name or self.__class__.__name__
+        self.callback = None
+
+    def connect(self, callback):
+        self.callback = callback
+
+    def disconnect(self):
+        self.callback = None
+
+    def interest(self, app_id, channel):
+        pass
+
+    def disinterest(self, app_id, channel):
+        pass
+
+    def publish(self, app_id, channel, message):
+        pass
+
+    def on_message(self, message):
+        if not self.callback:
+            return
+        self.callback(message)
+
+
+class LoopbackHub(object):
+    """
+    In-process hub that holds the interests and the nodes of a
+    loopback cluster, to be shared by its loopback brokers.
+    """
+
+    def __init__(self):
+        self.nodes = {}
+        self.interests = {}
+        self.lock = threading.RLock()
+
+
+class LoopbackBroker(Broker):
+    """
+    Broker implementation that relays the events to the other
+    nodes of the same process using a shared hub, meant to be
+    used for testing and development purposes.
+
+    The delivery of the events is synchronous, meaning that the
+    publishing only returns after the interested nodes are done
+    with the sending of the event to their sockets.
+    """
+
+    hub = LoopbackHub()
+    """ The default hub shared by the loopback brokers, so that
+    every broker of the process belongs to the same cluster """
+
+    def __init__(self, node_id=None, name=None, hub=None):
+        Broker.__init__(self, node_id=node_id, name=name)
+        if hub:
+            self.hub = hub
+
+    def connect(self, callback):
+        Broker.connect(self, callback)
+        with self.hub.lock:
+            self.hub.nodes[self.node_id] = self
+
+    def disconnect(self):
+        Broker.disconnect(self)
+        with self.hub.lock:
+            self.hub.nodes.pop(self.node_id, None)
+            for key, nodes in list(self.hub.interests.items()):
+                nodes.discard(self.node_id)
+                if not nodes:
+                    del self.hub.interests[key]
+
+    def interest(self, app_id, channel):
+        with self.hub.lock:
+            nodes = self.hub.interests.setdefault((app_id, channel), set())
+            nodes.add(self.node_id)
+
+    def disinterest(self, app_id, channel):
+        with self.hub.lock:
+            nodes = self.hub.interests.get((app_id, channel), set())
+            nodes.discard(self.node_id)
+            if not nodes:
+                self.hub.interests.pop((app_id, channel), None)
+
+    def publish(self, app_id, channel, message):
+        # gathers the nodes that hold subscribers for the channel (except
+        # the current one) under lock and then delivers the message to each
+        # of them outside of it, avoiding holding the lock while sending
+        with self.hub.lock:
+            node_ids = self.hub.interests.get((app_id, channel), ())
+            brokers = [
+                self.hub.nodes[node_id]
+                for node_id in node_ids
+                if not node_id == self.node_id and node_id in self.hub.nodes
+            ]
+        for broker in brokers:
+            broker.on_message(message)
+
+
+BROKERS = dict(loopback=LoopbackBroker)
+""" The map associating the names of the brokers with their
+classes, used for the loading of the broker from configuration """
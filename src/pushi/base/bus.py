@@ -0,0 +1,195 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import json
+import socket
+import struct
+import threading
+
+HEADER_SIZE = 4
+""" The size in bytes of the header that prefixes every
+message sent through the bus, containing its length """
+
+
+class Bus(object):
+    """
+    Top level abstract bus from which all the (message) buses
+    should inherit, a bus relays messages among the various
+    processes of a pushi infra-structure.
+
+    Messages are plain (JSON serializable) dictionaries and
+    are delivered to the callback provided upon listening.
+    """
+
+    def __init__(self, name=None):
+        self.name = name or self.__class__.__name__
+        self.callback = None
+        self.close_callback = None
+
+    def publish(self, message):
+        pass
+
+    def send(self, message):
+        pass
+
+    def listen(self, callback, close_callback=None):
+        self.callback = callback
+        self.close_callback = close_callback
+
+    def on_message(self, message):
+        if not self.callback:
+            return
+        self.callback(message)
+
+    def on_close(self):
+        if not self.close_callback:
+            return
+        self.close_callback()
+
+
+class WorkerBus(Bus):
+    """
+    Bus implementation that connects a master process with a
+    set of forked worker processes using Unix socket pairs.
+
+    The master publishes messages to every worker and each
+    worker sends messages back to the master only, the pairs
+    must be created before the fork and then each side should
+    call either `parent()` or `child()` to drop the sockets
+    that it does not own.
+    """
+
+    def __init__(self, workers, name=None):
+        Bus.__init__(self, name=name)
+        self.workers = workers
+        self.index = None
+        self.sockets = []
+        self.locks = []
+        self.pairs = [socket.socketpair() for _index in range(workers)]
+
+    def parent(self):
+        """
+        Turns the current bus into the master side of the bus,
+        closing the worker side of the socket pairs.
+        """
+
+        for parent_s, child_s in self.pairs:
+            child_s.close()
+            self.sockets.append(parent_s)
+        self.locks = [threading.Lock() for _socket in self.sockets]
+        self.pairs = []
+
+    def child(self, index):
+        """
+        Turns the current bus into the worker side of the bus for
+        the worker with the provided index, closing every other
+        socket so that the master is able to detect the worker exit.
+
+        :type index: int
+        :param index: The index of the worker that owns the bus.
+        """
+
+        for _index, (parent_s, child_s) in enumerate(self.pairs):
+            parent_s.close()
+            if _index == index:
+                continue
+            child_s.close()
+        self.index = index
+        self.sockets = [self.pairs[index][1]]
+        self.locks = [threading.Lock()]
+        self.pairs = []
+
+    def publish(self, message):
+        data = self._encode(message)
+        for _socket, lock in zip(self.sockets, self.locks):
+            self._write(_socket, lock, data)
+
+    def send(self, message):
+        data = self._encode(message)
+        self._write(self.sockets[0], self.locks[0], data)
+
+    def listen(self, callback, close_callback=None):
+        Bus.listen(self, callback, close_callback=close_callback)
+        for _socket in self.sockets:
+            thread = threading.Thread(target=self._receive, args=(_socket,))
+            thread.daemon = True
+            thread.start()
+
+    def _receive(self, _socket):
+        # runs the reading loop on the socket, where each message is
+        # prefixed with its length so that it's possible to read the
+        # complete payload before decoding it, the loop is only broken
+        # when the other side of the bus closes the socket
+        while True:
+            header = self._read(_socket, HEADER_SIZE)
+            if not header:
+                break
+            size = struct.unpack("!I", header)[0]
+            data = self._read(_socket, size)
+            if data == None:
+                break
+            message = json.loads(data.decode("utf-8"))
+            self.on_message(message)
+
+        # notifies the owner about the closing of the bus so that
+        # the proper actions may be taken (eg: stop the worker)
+        self.on_close()
+
+    def _read(self, _socket, size):
+        # reads the requested number of bytes from the socket, note that
+        # an error in the socket (eg: closed while reading) is considered
+        # to be the end of the stream, so that the closing is notified
+        buffer = []
+        while size > 0:
+            try:
+                data = _socket.recv(size)
+            except (socket.error, OSError):
+                return None
+            if not data:
+                return None
+            buffer.append(data)
+            size -= len(data)
+        return b"".join(buffer)
+
+    def _write(self, _socket, lock, data):
+        # the lock is required as the same socket may be written
+        # from multiple threads (eg: app and bus threads) and the
+        # messages must not be interleaved in the stream
+        lock.acquire()
+        try:
+            _socket.sendall(data)
+        except socket.error:
+            pass
+        finally:
+            lock.release()
+
+    def _encode(self, message):
+        data = json.dumps(message).encode("utf-8")
+        return struct.pack("!I", len(data)) + data
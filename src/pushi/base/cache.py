@@ -0,0 +1,390 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import time
+import threading
+import collections
+
+
+class HistoryCache(object):
+    """
+    Write-through and size bounded LRU cache of the newest events of
+    each channel, used to serve the recent history of the channels
+    (eg: `pusher:latest`) without any access to the data source.
+
+    Each channel keeps at most `count` events (newest first) and at
+    most `size` channels are cached, with the least recently used ones
+    being evicted first. A channel entry is only created upon a read
+    from the data source (fill), after that the new events are added
+    to it as they are persisted (write-through).
+
+    As the fill and the write-through run in different threads, each
+    channel has a version that is incremented by every added event
+    (even if the channel is not cached), a fill is discarded in case
+    the version changed since the read from the data source started
+    and the added events are de-duplicated by their mid.
+    """
+
+    def __init__(self, count=50, size=10000):
+        self.count = count
+        self.size = size
+        self.channels = collections.OrderedDict()
+        self.versions = collections.OrderedDict()
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.channels)
+
+    def __contains__(self, key):
+        return key in self.channels
+
+    def get(self, key, skip=0, count=10):
+        """
+        Retrieves the page of events of the channel identified by the
+        key, from the newest to the oldest one, in case the requested
+        page is not completely available in the cache (miss) an invalid
+        value is returned and the data source should be used instead.
+
+        :type key: Tuple
+        :param key: The key (app id and channel) of the channel.
+        :type skip: int
+        :param skip: The number of (newest) events to be skipped.
+        :type count: int
+        :param count: The maximum number of events to be retrieved.
+        :rtype: List
+        :return: The page of events or an invalid value on a miss.
+        """
+
+        self.lock.acquire()
+        try:
+            entry = self.channels.pop(key, None)
+            if entry == None:
+                return None
+            self.channels[key] = entry
+            events, complete = entry
+            if skip + count > len(events) and not complete:
+                return None
+            return list(events)[skip : skip + count]
+        finally:
+            self.lock.release()
+
+    def version(self, key):
+        """
+        Retrieves the current version of the channel, to be obtained
+        before the read of its events from the data source and then
+        provided to the fill of the cache with them.
+
+        :type key: Tuple
+        :param key: The key (app id and channel) of the channel.
+        :rtype: Tuple
+        :return: The opaque version of the channel.
+        """
+
+        self.lock.acquire()
+        try:
+            return (self.versions.get(key, 0), self.dropped)
+        finally:
+            self.lock.release()
+
+    def fill(self, key, events, version=None):
+        """
+        Fills the cache for the channel with the newest events retrieved
+        from the data source, in case less events than the capacity were
+        retrieved the entry is considered complete (full history).
+
+        In case the version of the channel before the read is provided
+        and an event has been added since then nothing is done, as the
+        events read may not include it (or include it already).
+
+        :type key: Tuple
+        :param key: The key (app id and channel) of the channel.
+        :type events: List
+        :param events: The newest events of the channel, newest first.
+        :type version: Tuple
+        :param version: The version of the channel before the events
+        were read from the data source.
+        """
+
+        if self.count < 1:
+            return
+        complete = len(events) < self.count
+        events = collections.deque(events[: self.count])
+
+        self.lock.acquire()
+        try:
+            if key in self.channels:
+                return
+            if not version == None and not version == (
+                self.versions.get(key, 0),
+                self.dropped,
+            ):
+                return
+            self.channels[key] = [events, complete]
+            while len(self.channels) > self.size:
+                self.channels.popitem(last=False)
+        finally:
+            self.lock.release()
+
+    def add(self, key, event):
+        """
+        Adds the (newly persisted) event to the cached events of the
+        channel, in case the channel is not cached only its version is
+        incremented as the next read is going to fill it from the data
+        source, an event that is already cached (same mid) is ignored.
+
+        :type key: Tuple
+        :param key: The key (app id and channel) of the channel.
+        :type event: Dictionary
+        :param event: The event to be added as the newest of the channel.
+        """
+
+        self.lock.acquire()
+        try:
+            self.versions[key] = self.versions.pop(key, 0) + 1
+            while len(self.versions) > self.size:
+                self.versions.popitem(last=False)
+                self.dropped += 1
+            entry = self.channels.get(key, None)
+            if entry == None:
+                return
+            events = entry[0]
+            mid = event.get("mid", None) if isinstance(event, dict) else None
+            if mid and any(item.get("mid", None) == mid for item in events):
+                return
+            events.appendleft(event)
+            if len(events) <= self.count:
+                return
+            events.pop()
+            entry[1] = False
+        finally:
+            self.lock.release()
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self.channels.clear()
+            self.versions.clear()
+            self.dropped += 1
+        finally:
+            self.lock.release()
+
+
+class AppCache(object):
+    """
+    In-process cache of the app records (models) indexed by both their
+    identifier and key, used to avoid a round-trip to the data source
+    every time an app is resolved (eg: in every handler of an event).
+
+    The entries are invalidated explicitly upon the update or removal
+    of the app and expire after `ttl` seconds as a safety net for the
+    changes made outside of the current process, a zero (or negative)
+    `ttl` disables the cache.
+
+    The lookups of unknown apps (eg: invalid keys) are cached as well
+    (negative entries) for the shorter `miss_ttl` seconds, bounded to
+    the `size` most recent ones, so that a flood of them does not
+    reach the data source.
+    """
+
+    def __init__(self, ttl=60.0, miss_ttl=5.0, size=10000):
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.size = size
+        self.apps = dict()
+        self.keys = dict()
+        self.misses = collections.OrderedDict()
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.apps)
+
+    def __contains__(self, app_id):
+        return app_id in self.apps
+
+    def get(self, app_id=None, app_key=None):
+        """
+        Retrieves the cached app for the provided identifier or key
+        (the key takes precedence), in case there's no valid entry
+        for it (miss) an invalid value is returned.
+
+        :type app_id: String
+        :param app_id: The identifier of the app to be retrieved.
+        :type app_key: String
+        :param app_key: The key of the app to be retrieved.
+        :rtype: App
+        :return: The cached app or an invalid value on a miss.
+        """
+
+        if self.ttl <= 0:
+            return None
+
+        self.lock.acquire()
+        try:
+            if app_key:
+                app_id = self.keys.get(app_key, None)
+            entry = self.apps.get(app_id, None)
+            if entry == None:
+                return None
+            app, expires = entry
+            if time.time() < expires:
+                return app
+            self._remove(app_id)
+            return None
+        finally:
+            self.lock.release()
+
+    def put(self, app, generation=None):
+        """
+        Adds the app (retrieved from the data source) to the cache, in
+        case the generation of the cache at the time of the retrieval is
+        provided and an invalidation occurred since then nothing is done,
+        as the app may be stale (read before a concurrent update).
+
+        :type app: App
+        :param app: The app that is going to be added to the cache.
+        :type generation: int
+        :param generation: The generation of the cache before the app
+        was retrieved from the data source.
+        """
+
+        if self.ttl <= 0:
+            return
+
+        self.lock.acquire()
+        try:
+            if not generation == None and not generation == self.generation:
+                return
+            self._remove(app.ident)
+            self.apps[app.ident] = (app, time.time() + self.ttl)
+            self.keys[app.key] = app.ident
+            self.misses.pop(("id", app.ident), None)
+            self.misses.pop(("key", app.key), None)
+        finally:
+            self.lock.release()
+
+    def put_missing(self, app_id=None, app_key=None, generation=None):
+        """
+        Adds a negative entry to the cache for the provided identifier
+        or key (the key takes precedence) of an app that does not exist
+        in the data source, so that the next lookups are not repeated.
+
+        :type app_id: String
+        :param app_id: The identifier of the app that does not exist.
+        :type app_key: String
+        :param app_key: The key of the app that does not exist.
+        :type generation: int
+        :param generation: The generation of the cache before the app
+        was looked up in the data source.
+        """
+
+        if self.miss_ttl <= 0:
+            return
+
+        key = ("key", app_key) if app_key else ("id", app_id)
+
+        self.lock.acquire()
+        try:
+            if not generation == None and not generation == self.generation:
+                return
+            self.misses.pop(key, None)
+            self.misses[key] = time.time() + self.miss_ttl
+            while len(self.misses) > self.size:
+                self.misses.popitem(last=False)
+        finally:
+            self.lock.release()
+
+    def is_missing(self, app_id=None, app_key=None):
+        """
+        Verifies if there's a (valid) negative entry in the cache for the
+        provided identifier or key (the key takes precedence), meaning
+        that the app is known not to exist in the data source.
+
+        :type app_id: String
+        :param app_id: The identifier of the app to be verified.
+        :type app_key: String
+        :param app_key: The key of the app to be verified.
+        :rtype: bool
+        :return: If the app is known not to exist.
+        """
+
+        key = ("key", app_key) if app_key else ("id", app_id)
+
+        self.lock.acquire()
+        try:
+            expires = self.misses.get(key, None)
+            if expires == None:
+                return False
+            if time.time() < expires:
+                return True
+            del self.misses[key]
+            return False
+        finally:
+            self.lock.release()
+
+    def invalidate(self, app_id=None, app_key=None):
+        """
+        Invalidates the cached app for the provided identifier and key
+        values, should be called whenever the app is changed or removed.
+
+        :type app_id: String
+        :param app_id: The identifier of the app to be invalidated.
+        :type app_key: String
+        :param app_key: The key of the app to be invalidated.
+        """
+
+        self.lock.acquire()
+        try:
+            self.generation += 1
+            if app_key:
+                self._remove(self.keys.get(app_key, None))
+                self.misses.pop(("key", app_key), None)
+            if app_id:
+                self._remove(app_id)
+                self.misses.pop(("id", app_id), None)
+        finally:
+            self.lock.release()
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self.generation += 1
+            self.apps.clear()
+            self.keys.clear()
+            self.misses.clear()
+        finally:
+            self.lock.release()
+
+    def _remove(self, app_id):
+        entry = self.apps.pop(app_id, None)
+        if entry == None:
+            return
+        self.keys.pop(entry[0].key, None)
@@ -46,5 +46,20 @@ class Handler(object):
     def send(self, app_id, event, json_d):
         pass
 
-    def load(self):
+    def load(self, subs=None):
         pass
+
+    def snapshot(self):
+        """
+        Retrieves the (JSON serializable) in-memory subscription maps
+        of the handler, to be stored in the snapshot of the state so
+        that they're restored on startup without a complete load.
+
+        :rtype: Object
+        :return: The subscription maps of the handler.
+        """
+
+        return getattr(self, "subs", None)
+
+    def restore(self, snapshot):
+        self.subs = snapshot
@@ -0,0 +1,209 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import bisect
+import threading
+
+BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+""" The default upper bounds (in seconds) of the buckets of the
+histograms, suitable for latencies from sub-millisecond (fan-out)
+to several seconds (persistence under load) """
+
+
+class Metric(object):
+    """
+    Top level abstract metric from which all the metrics inherit,
+    each metric may be labeled by a single label whose values are
+    the keys of the values map of the metric.
+
+    The values of the metrics are updated from multiple threads (eg:
+    server loop, HTTP handlers) and read by the scrapes, as such both
+    the updates and the reads of the values are done under the lock.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name, help, label=None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.values = dict()
+        self.lock = threading.Lock()
+
+    def samples(self):
+        """
+        Retrieves the complete set of samples of the metric as tuples
+        containing the suffix of the name, the (extra) labels and the value.
+
+        :rtype: List
+        :return: The sequence of samples of the metric.
+        """
+
+        return [("", key, dict(), value) for key, value in self.get_values().items()]
+
+    def get_values(self):
+        with self.lock:
+            return dict(self.values)
+
+    def render(self):
+        lines = [
+            "# HELP %s %s" % (self.name, self.help),
+            "# TYPE %s %s" % (self.name, self.type),
+        ]
+        for suffix, key, labels, value in sorted(
+            self.samples(), key=lambda sample: str(sample[1])
+        ):
+            labels = dict(labels)
+            if self.label and not key == None:
+                labels[self.label] = key
+            labels_s = ",".join(
+                '%s="%s"' % (name, _escape(labels[name])) for name in sorted(labels)
+            )
+            labels_s = "{%s}" % labels_s if labels_s else ""
+            lines.append("%s%s%s %s" % (self.name, suffix, labels_s, _number(value)))
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, key=None, value=1):
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+
+class Gauge(Metric):
+    """
+    Gauge metric whose values are computed by the provided callable
+    at render (scrape) time, so that no cost is incurred on the hot
+    path, the callable returns either a number or a map of numbers
+    (by label value).
+    """
+
+    type = "gauge"
+
+    def __init__(self, name, help, callable, label=None):
+        Metric.__init__(self, name, help, label=label)
+        self.callable = callable
+
+    def get_values(self):
+        values = self.callable()
+        if isinstance(values, dict):
+            return values
+        return {None: values}
+
+
+class Histogram(Metric):
+    """
+    Histogram metric with fixed buckets, the observation only increments
+    the (non cumulative) count of the matching bucket, the cumulative
+    counts are computed at render time.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, help, label=None, buckets=BUCKETS):
+        Metric.__init__(self, name, help, label=label)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, key=None):
+        with self.lock:
+            values = self.values.get(key, None)
+            if values == None:
+                values = [0] * (len(self.buckets) + 1) + [0.0]
+                self.values[key] = values
+            values[bisect.bisect_left(self.buckets, value)] += 1
+            values[-1] += value
+
+    def samples(self):
+        with self.lock:
+            items = [(key, list(values)) for key, values in self.values.items()]
+
+        samples = []
+        for key, values in items:
+            total = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values[:-1]):
+                total += count
+                samples.append(("_bucket", key, dict(le=_number(bound)), total))
+            samples.append(("_sum", key, dict(), values[-1]))
+            samples.append(("_count", key, dict(), total))
+        return samples
+
+
+class Metrics(object):
+    """
+    Registry of the metrics of a process, able to render all of them
+    using the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help, label=None):
+        return self.register(Counter(name, help, label=label))
+
+    def gauge(self, name, help, callable, label=None):
+        return self.register(Gauge(name, help, callable, label=label))
+
+    def histogram(self, name, help, label=None, buckets=BUCKETS):
+        return self.register(Histogram(name, help, label=label, buckets=buckets))
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _escape(value):
+    value = str(value)
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
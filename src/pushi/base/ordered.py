@@ -0,0 +1,85 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import sys
+import collections
+
+ORDERED = dict if sys.version_info >= (3, 7) else collections.OrderedDict
+""" The dictionary type to be used as the storage of the ordered set,
+the built-in one already keeps the insertion order in recent versions """
+
+
+class OrderedSet(object):
+    """
+    Set that keeps the insertion order of its items, providing O(1)
+    addition, removal and membership test while iterating the items
+    in the same order as they were added (as a list would).
+
+    Used for the channel and socket indexes so that the cost of the
+    subscribe and unsubscribe operations does not grow with the size
+    of the channels.
+    """
+
+    __slots__ = ("items",)
+
+    def __init__(self, items=()):
+        self.items = ORDERED.fromkeys(items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item):
+        return item in self.items
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    def __nonzero__(self):
+        return self.__bool__()
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, list(self))
+
+    def add(self, item):
+        self.items[item] = None
+
+    def remove(self, item):
+        del self.items[item]
+
+    def discard(self, item):
+        self.items.pop(item, None)
+
+    def copy(self):
+        return OrderedSet(self.items)
+
+    __copy__ = copy
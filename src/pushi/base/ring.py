@@ -0,0 +1,141 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import threading
+import collections
+
+OVERHEAD = 128
+""" The estimated overhead in bytes of each buffered event, added
+to the size of its payload for the memory accounting """
+
+
+class RingBuffer(object):
+    """
+    In-memory buffer of the latest events sent per channel, used
+    to replay the events lost by a client while it was disconnected
+    (resume) without any access to the data source.
+
+    Each channel keeps at most `count` events and the complete set
+    of channels is bounded by `size` bytes, once that limit is reached
+    the oldest events of the least recently used channels are evicted.
+    """
+
+    def __init__(self, count=64, size=16777216):
+        self.count = count
+        self.size = size
+        self.bytes = 0
+        self.channels = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.channels)
+
+    def __contains__(self, key):
+        return key in self.channels
+
+    def add(self, key, json_d):
+        """
+        Adds the provided event (JSON dictionary) to the buffer of the
+        channel identified by the key, the event must contain a message
+        identifier (mid) as that's the reference used upon resume.
+
+        :type key: Tuple
+        :param key: The key (app id and channel) of the channel.
+        :type json_d: Dictionary
+        :param json_d: The event to be buffered, containing the mid.
+        """
+
+        mid = json_d.get("mid", None)
+        if not mid or self.count < 1:
+            return
+        size = len(json_d.get("data", None) or "") + OVERHEAD
+
+        self.lock.acquire()
+        try:
+            events = self.channels.pop(key, None)
+            if events == None:
+                events = collections.deque()
+            events.append((mid, json_d, size))
+            self.channels[key] = events
+            self.bytes += size
+            while len(events) > self.count:
+                self.bytes -= events.popleft()[2]
+            self._evict()
+        finally:
+            self.lock.release()
+
+    def since(self, key, mid):
+        """
+        Retrieves the events of the channel sent after the one with
+        the provided mid, in the order they were sent.
+
+        In case the mid is not found in the buffer (eg: evicted, too
+        old) an invalid value is returned as the gap of events can't be
+        filled from memory.
+
+        :type key: Tuple
+        :param key: The key (app id and channel) of the channel.
+        :type mid: String
+        :param mid: The identifier of the last event seen by the client.
+        :rtype: List
+        :return: The events sent after the mid or an invalid value in
+        case it's not possible to determine them.
+        """
+
+        self.lock.acquire()
+        try:
+            events = list(self.channels.get(key, ()))
+        finally:
+            self.lock.release()
+
+        for index in range(len(events) - 1, -1, -1):
+            if not events[index][0] == mid:
+                continue
+            return [json_d for _mid, json_d, _size in events[index + 1 :]]
+        return None
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self.channels.clear()
+            self.bytes = 0
+        finally:
+            self.lock.release()
+
+    def _evict(self):
+        # removes the oldest events of the least recently written channels
+        # until the memory used by the buffer is under its limit, dropping
+        # the channels that are left without any event
+        while self.bytes > self.size and self.channels:
+            key, events = next(iter(self.channels.items()))
+            self.bytes -= events.popleft()[2]
+            if events:
+                continue
+            del self.channels[key]
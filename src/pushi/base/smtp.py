@@ -307,8 +307,9 @@ Data:
 
         return dict(success=True, recipients=sent_recipients)
 
-    def load(self):
-        subs = pushi.SMTP.find()
+    def load(self, subs=None):
+        if subs == None:
+            subs = pushi.SMTP.find()
         self.logger.info("Loading %d SMTP subscription(s)" % len(subs))
         for sub in subs:
             app_id = sub.app_id
@@ -323,7 +324,8 @@ Data:
     def add(self, app_id, email, event):
         events = self.subs.get(app_id, {})
         emails = events.get(event, [])
-        emails.append(email)
+        if not email in emails:
+            emails.append(email)
         events[event] = emails
         self.subs[app_id] = events
 
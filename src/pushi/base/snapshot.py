@@ -0,0 +1,89 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import os
+import json
+import zlib
+
+VERSION = 1
+""" The version of the snapshot format, snapshots with a different
+version are ignored (as if they did not exist) upon reading """
+
+
+def read(path):
+    """
+    Reads the (compressed) snapshot stored in the file with the
+    provided path, in case the file does not exist or is not valid
+    (eg: partial write, other version) an invalid value is returned.
+
+    :type path: String
+    :param path: The path to the file containing the snapshot.
+    :rtype: Dictionary
+    :return: The snapshot data or an invalid value if not available.
+    """
+
+    if not os.path.exists(path):
+        return None
+    try:
+        file = open(path, "rb")
+        try:
+            data = file.read()
+        finally:
+            file.close()
+        snapshot = json.loads(zlib.decompress(data).decode("utf-8"))
+    except Exception:
+        return None
+    if not snapshot.get("version", None) == VERSION:
+        return None
+    return snapshot
+
+
+def write(path, snapshot):
+    """
+    Writes the provided snapshot (JSON serializable) into the file
+    with the provided path, compressing it, the file is written to a
+    temporary path and then renamed so that a failure in the middle
+    of the write never leaves a corrupted snapshot.
+
+    :type path: String
+    :param path: The path to the file to store the snapshot.
+    :type snapshot: Dictionary
+    :param snapshot: The snapshot data to be written.
+    """
+
+    snapshot = dict(snapshot, version=VERSION)
+    data = zlib.compress(json.dumps(snapshot, separators=(",", ":")).encode("utf-8"))
+    path_t = path + ".tmp"
+    file = open(path_t, "wb")
+    try:
+        file.write(data)
+    finally:
+        file.close()
+    os.rename(path_t, path)
@@ -29,15 +29,19 @@ __license__ = "Apache License, Version 2.0"
 """ The license for the module """
 
 import os
+import atexit
+import signal
 import sys
 import time
 import json
 import hmac
 import uuid
-import copy
 import hashlib
+import copy
 import datetime
+import itertools
 import threading
+import collections
 
 base_dir = os.path.normpath((os.path.dirname(__file__) or ".") + "/../..")
 if not base_dir in sys.path:
@@ -47,10 +51,39 @@ import pushi
 import appier
 
 from pushi.base import apn
+from pushi.base import bus
+from pushi.base import broker
+from pushi.base import cache
+from pushi.base import metrics
+from pushi.base import ordered
+from pushi.base import ring
 from pushi.base import smtp
+from pushi.base import snapshot
 from pushi.base import web
 from pushi.base import web_push
 
+INVALID_COUNT = 128
+""" The maximum number of invalid maps (one per trigger) kept
+for the events relayed from the master (or other nodes), to avoid
+sending the same event twice to a socket subscribed to multiple
+channels of the same trigger """
+
+DRAIN_GRACE = 5
+""" The time in seconds given to the (drained) connections to be
+flushed and closed after the drain window, before the process exits """
+
+CHANNEL_TYPES = ("private", "presence", "personal", "peer", "conflated")
+""" The prefixes of the (non public) channel types, used to
+account the channel related metrics per type of channel """
+
+MEMBERS_PAGES = 16
+""" The maximum number of (encoded) member pages cached per presence
+channel, after which the cache of the channel is reset """
+
+INTERN = sys.intern if hasattr(sys, "intern") else intern
+""" The function used to intern the channel and socket identifiers
+kept in the indexes, so that a single copy of each is stored """
+
 
 class AppState(object):
     """
@@ -67,7 +100,109 @@ class AppState(object):
         self.socket_channels = {}
         self.channel_sockets = {}
         self.channel_info = {}
-        self.channel_socket_data = {}
+
+    def get_member(self, channel, socket_id):
+        """
+        Retrieves the member record of the socket in the provided
+        (presence) channel, in case the socket is not a member of
+        the channel an invalid value is returned.
+
+        :type channel: String
+        :param channel: The name of the presence channel.
+        :type socket_id: String
+        :param socket_id: The identifier of the socket.
+        :rtype: MemberInfo
+        :return: The member record shared by the sockets of the user.
+        """
+
+        info = self.channel_info.get(channel, None)
+        if not info:
+            return None
+        return info.sockets.get(socket_id, None)
+
+
+class ChannelInfo(object):
+    """
+    The (compact) record of a presence channel, with the members
+    indexed both by user identifier and by socket identifier (the
+    same member record is shared by all the sockets of the user).
+
+    The peer channels of the presence channel that have already
+    been addressed are indexed per user identifier (peer index) and
+    the membership changes waiting to be notified (coalesced) are
+    kept as a pair of added and removed members maps.
+
+    The (pages of the) members map are cached JSON encoded until the
+    membership of the channel changes (member snapshot).
+    """
+
+    __slots__ = ("members", "sockets", "conns", "peers", "changes", "encoded")
+
+    def __init__(self):
+        self.members = {}
+        self.sockets = {}
+        self.conns = ordered.OrderedSet()
+        self.peers = {}
+        self.changes = None
+        self.encoded = None
+
+    @property
+    def user_count(self):
+        return len(self.members)
+
+
+class MemberInfo(object):
+    """
+    The (compact) record of a member (user) of a presence channel,
+    holding the channel data of the user and its connections.
+    """
+
+    __slots__ = ("user_id", "channel_data", "conns")
+
+    def __init__(self, user_id, channel_data):
+        self.user_id = user_id
+        self.channel_data = channel_data
+        self.conns = ordered.OrderedSet()
+
+
+class Handoff(object):
+    """
+    The (pending) result of an operation handed off to the server
+    loop, allowing the caller to wait for the operation and to be
+    told about its failure (the exception is re-raised on wait).
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.exception = None
+
+    def wait(self, timeout=None):
+        if not self.event.wait(timeout):
+            raise RuntimeError("Timeout waiting for the handed off operation")
+        if self.exception:
+            raise self.exception
+        return self.result
+
+    def set_result(self, result):
+        self.result = result
+        self.event.set()
+
+    def set_exception(self, exception):
+        self.exception = exception
+        self.event.set()
+
+    @property
+    def done(self):
+        return self.event.is_set()
+
+
+def intern_s(value):
+    # only the native strings may be interned, the remaining values
+    # (eg: unicode strings under Python 2) are returned unchanged
+    if not type(value) == str:
+        return value
+    return INTERN(value)
 
 
 class State(appier.Mongo):
@@ -94,6 +229,36 @@ class State(appier.Mongo):
         self.handlers = []
         self.app_id_state = {}
         self.app_key_state = {}
+        self.bus = None
+        self.worker = None
+        self.broker = None
+        self.invalids = collections.OrderedDict()
+        self.interests = {}
+        self.interests_lock = threading.RLock()
+        self.snapshot_path = None
+        self.ring = ring.RingBuffer(
+            count=appier.conf("PUSHI_RESUME", 0, cast=int),
+            size=appier.conf("PUSHI_RESUME_BYTES", 16777216, cast=int),
+        )
+        self.history = cache.HistoryCache(
+            count=appier.conf("PUSHI_HISTORY", 0, cast=int),
+            size=appier.conf("PUSHI_HISTORY_CHANNELS", 10000, cast=int),
+        )
+        self.apps = cache.AppCache(
+            ttl=appier.conf("PUSHI_APP_TTL", 60.0, cast=float),
+            miss_ttl=appier.conf("PUSHI_APP_MISS_TTL", 5.0, cast=float),
+        )
+        self.pending = dict()
+        self.pending_lock = threading.Lock()
+        self.handoff_queue = collections.deque()
+        self.handoff_lock = threading.Lock()
+        self.handoff_pending = False
+        self.handoff_batch = appier.conf("PUSHI_HANDOFF_BATCH", 256, cast=int)
+        self.presence_window = appier.conf("PUSHI_PRESENCE_WINDOW", 0, cast=int)
+        self.presence_cap = appier.conf("PUSHI_PRESENCE_CAP", 0, cast=int)
+        self.local_presence = appier.conf("PUSHI_LOCAL_PRESENCE", False, cast=bool)
+        self.metrics = metrics.Metrics()
+        self.load_metrics()
 
     def load(self, app, server):
         # sets the references to both the app and the server in the
@@ -131,6 +296,7 @@ class State(appier.Mongo):
         SERVER_SSL = bool(int(os.environ.get("SERVER_SSL", "0")))
         SERVER_SSL_KEY = os.environ.get("SERVER_SSL_KEY", None)
         SERVER_SSL_CER = os.environ.get("SERVER_SSL_CER", None)
+        SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", "0"))
 
         # creates the named argument for both the app server and the proper
         # pushi server so that they are correctly initialized and bound to
@@ -151,46 +317,414 @@ class State(appier.Mongo):
             cer_file=SERVER_SSL_CER,
         )
 
+        # in case the workers mode is requested the pushi server processes
+        # are forked before any thread is started (forking a threaded process
+        # is unsafe) and the current (master) process only runs the app and
+        # the handlers, note that the workers never return from this call
+        if SERVER_WORKERS > 0:
+            self.fork(SERVER_WORKERS, server_kwargs)
+
         # creates the threads that will be used as containers for the app and
         # the pushi server and then starts them with the proper arguments
         threading.Thread(target=self.app.serve, kwargs=app_kwargs).start()
-        threading.Thread(target=self.server.serve, kwargs=server_kwargs).start()
+        if not self.bus:
+            threading.Thread(target=self.server.serve, kwargs=server_kwargs).start()
 
         # starts the loading process of the various (extra handlers) that are
         # going to be used in the pushi infra-structure (eg: apn, gcm, etc.)
-        self.load_handlers()
+        self.load_handlers(load=False)
+
+        # loads the (rebuildable) indexes of the infra-structure, the alias
+        # relations (personal channels) and the subscriptions of the handlers,
+        # from the snapshot if available or from the data source otherwise
+        self.load_indexes()
+
+        # loads the (inter-node) broker in case one is configured so that
+        # the events are relayed to the other nodes of the cluster
+        self.load_broker()
 
-        # loads the various alias relations for the current infra-structure so
-        # that the personal channels are able to correctly work
-        self.load_alias()
+        # registers the draining of the server upon termination, if enabled,
+        # so that the connections are gracefully moved to a new process
+        self.load_drain()
+
+    def load_metrics(self):
+        """
+        Registers the metrics of the pushi infra-structure in the metrics
+        registry of the state, to be exposed by the `/metrics` endpoint.
+
+        Please note that when running with workers each process has its
+        own metrics, and the connections live in the worker processes.
+        """
+
+        self.metrics.gauge(
+            "pushi_connections",
+            "Number of connections per app",
+            self.get_connections,
+            label="app",
+        )
+        self.metric_subscribes = self.metrics.counter(
+            "pushi_subscribes_total",
+            "Number of channel subscriptions per channel type",
+            label="type",
+        )
+        self.metric_unsubscribes = self.metrics.counter(
+            "pushi_unsubscribes_total",
+            "Number of channel unsubscriptions per channel type",
+            label="type",
+        )
+        self.metric_events = self.metrics.counter(
+            "pushi_events_total",
+            "Number of events triggered per channel type",
+            label="type",
+        )
+        self.metric_fanout = self.metrics.histogram(
+            "pushi_fanout_seconds",
+            "Time from the trigger of an event to its write to the sockets",
+        )
+        self.metric_delayed = self.metrics.counter(
+            "pushi_delayed_total",
+            "Number of operations added to the delayed queue",
+            label="queue",
+        )
+        self.metric_executed = self.metrics.counter(
+            "pushi_executed_total",
+            "Number of operations of the delayed queue executed",
+            label="queue",
+        )
+        self.metrics.gauge(
+            "pushi_delayed_depth",
+            "Number of operations waiting in the delayed queue",
+            self.get_depth,
+            label="queue",
+        )
+        self.metric_delay = self.metrics.histogram(
+            "pushi_delay_seconds",
+            "Time waited by the operations in the delayed queue",
+            label="queue",
+        )
+        self.metric_history = self.metrics.counter(
+            "pushi_history_total",
+            "Number of channel history reads per result (hit or miss)",
+            label="result",
+        )
+        self.metric_apps = self.metrics.counter(
+            "pushi_app_cache_total",
+            "Number of app lookups per cache result (hit or miss)",
+            label="result",
+        )
+
+    def fork(self, workers, server_kwargs):
+        """
+        Forks the provided number of worker processes, each of them
+        running its own pushi server on the same port (reuse port) so
+        that the WebSocket connections are balanced among the cores.
+
+        The master process keeps the app and the handlers and relays
+        the events to the workers using a bus (Unix sockets), as such
+        each worker only holds the state of its own connections.
+
+        :type workers: int
+        :param workers: The number of worker processes to be forked.
+        :type server_kwargs: Dictionary
+        :param server_kwargs: The named arguments to be used in the
+        serving of the pushi server of each worker.
+        """
+
+        if not hasattr(os, "fork"):
+            raise RuntimeError("Workers not supported by the system")
+
+        self.bus = bus.WorkerBus(workers)
+
+        for index in range(workers):
+            pid = os.fork()
+            if pid == 0:
+                self.run_worker(index, server_kwargs)
+
+        # the master does not serve connections but still runs the loop
+        # of the server, so that the operations coming from the other
+        # threads (HTTP, bus and broker) are handed off to a single one
+        self.bus.parent()
+        self.start_loop()
+        self.bus.listen(self.on_bus_master, close_callback=self.on_bus_close)
+
+    def run_worker(self, index, server_kwargs):
+        # marks the current process as the worker with the provided
+        # index and binds the bus to the worker side, the listening
+        # of the bus is only started with the server (requires a loop)
+        self.worker = index
+        self.bus.child(index)
+        self.server.reuse_port = True
+        self.server.bind("start", self.on_worker_start)
+
+        # runs the server in the current process, blocking it until
+        # the server is stopped, then exits the process immediately
+        # so that no code from the master flow is ever executed
+        try:
+            self.server.serve(**server_kwargs)
+        except Exception as exception:
+            self.app.logger.error(
+                "Problem running worker %d - %s"
+                % (index, appier.legacy.UNICODE(exception))
+            )
+            os._exit(1)
+        os._exit(0)
+
+    def on_worker_start(self, server):
+        self.bus.listen(self.on_bus_worker, close_callback=self.on_bus_close)
+
+    def start_loop(self):
+        """
+        Starts the event loop of the server in a (daemon) thread without
+        binding any service socket, returning once the loop is running.
+
+        To be used by the master of a set of workers, that does not serve
+        any connection, so that the operations coming from other threads
+        (eg: HTTP triggers) are handed off to the loop, just like in the
+        single process mode, instead of running concurrently.
+
+        :rtype: Thread
+        :return: The thread running the event loop of the server.
+        """
+
+        started = threading.Event()
+        self.server.delay(started.set)
+        thread = threading.Thread(target=self.server.start, name="PushiLoop")
+        thread.daemon = True
+        thread.start()
+        started.wait()
+        return thread
+
+    def on_bus_master(self, message):
+        # the messages of the workers are received in the bus threads
+        # and are handed off to the loop of the master (single thread)
+        self.handoff(self.on_bus, message)
+
+    def on_bus_worker(self, message):
+        # the messages are received in the bus thread and must be
+        # handled in the server loop (owner of the socket state)
+        self.server.delay(lambda: self.on_bus(message), safe=True)
+
+    def on_bus(self, message):
+        method = getattr(self, "bus_" + message["type"], None)
+        if not method:
+            return
+        method(message)
+
+    def on_bus_close(self):
+        # in case the current process is a worker the closing of the
+        # bus means that the master is gone and so must the worker
+        if not self.worker == None:
+            self.server.delay(self.server.stop, safe=True)
+            return
+
+        self.app.logger.warning("Worker bus closed, a worker has exited")
+
+    def bus_trigger(self, message):
+        self.trigger(**message["kwargs"])
+
+    def bus_send(self, message):
+        self.relay(message)
+
+    def bus_history(self, message):
+        for channel in message["channels"]:
+            self.history.add((message["app_id"], channel), message["event"])
+
+    def bus_interest(self, message):
+        if message["add"]:
+            self.add_interest(message["app_id"], message["channel"])
+        else:
+            self.remove_interest(message["app_id"], message["channel"])
+
+    def on_broker(self, message):
+        # the messages are received in the thread of the broker (eg: the
+        # thread of the publishing node for the loopback broker) and must
+        # be handled in the server loop (owner of the socket state)
+        if self.is_foreign():
+            self.handoff(self.on_broker, message)
+            return
+
+        # sends the event received from another node to the sockets of
+        # the current process and, in case this is the master of a set
+        # of workers, relays it to all of them using the bus
+        self.relay(message)
+        if self.bus:
+            self.bus.publish(message)
+
+    def relay(self, message):
+        # retrieves the invalid map associated with the trigger of the
+        # event so that a socket is not sent the same event twice
+        invalid = self.get_invalid(message.get("key", None))
+
+        self.send_local(
+            message["app_id"],
+            message["channel"],
+            message["json_d"],
+            echo=message["echo"],
+            owner_id=message["owner_id"],
+            invalid=invalid,
+        )
+
+    def bus_drain(self, message):
+        self.server.bind("drained", lambda server: server.stop())
+        self.server.drain(window=message.get("window", None))
+
+    def bus_alias(self, message):
+        method = self.add_alias if message["add"] else self.remove_alias
+        method(message["app_key"], message["channel"], message["alias"])
+
+    def load_drain(self):
+        PUSHI_DRAIN = appier.conf("PUSHI_DRAIN", False, cast=bool)
+        if not PUSHI_DRAIN:
+            return
+
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.drain())
+
+    def drain(self, window=None):
+        """
+        Drains the WebSocket server(s) of the current process (or of the
+        workers) spreading the reconnection of the clients over the drain
+        window, exiting the process once the window has elapsed (after
+        saving the snapshot, if enabled).
+
+        To be used in zero-downtime reloads, where a replacement process
+        bound to the same port (`PUSHI_REUSE_PORT`) is started before the
+        current one is terminated.
+
+        :type window: int
+        :param window: The window in seconds over which the connections
+        are closed, defaults to the server's drain window.
+        """
+
+        window = self.server.drain_window if window == None else window
+        if self.bus:
+            self.bus.publish(dict(type="drain", window=window))
+        else:
+            self.server.delay(lambda: self.server.drain(window=window), safe=True)
+
+        timer = threading.Timer(window + DRAIN_GRACE, self.exit)
+        timer.daemon = True
+        timer.start()
+
+    def exit(self, code=0):
+        try:
+            self.save_snapshot()
+        finally:
+            os._exit(code)
+
+    def load_broker(self):
+        PUSHI_BROKER = appier.conf("PUSHI_BROKER", None)
+        if not PUSHI_BROKER:
+            return
+
+        broker_c = broker.BROKERS.get(PUSHI_BROKER, None)
+        if not broker_c:
+            raise RuntimeError("Invalid broker '%s'" % PUSHI_BROKER)
+
+        self.set_broker(broker_c())
+
+    def set_broker(self, broker):
+        """
+        Sets the (inter-node) broker to be used to relay the events
+        to the other nodes of the cluster, registering the interests
+        of the current node for the channels it already holds.
 
-    def load_handlers(self):
+        :type broker: Broker
+        :param broker: The broker to be used for the relay of events,
+        or an invalid value to disable the cluster mode.
+        """
+
+        if self.broker:
+            self.broker.disconnect()
+        self.broker = broker
+        if not self.broker:
+            return
+
+        # the history cache can't be kept up to date with the events
+        # persisted by the other nodes of the cluster so it's disabled
+        self.history.count = 0
+        self.history.clear()
+
+        self.broker.connect(self.on_broker)
+        with self.interests_lock:
+            for app_id, channel in self.interests:
+                self.broker.interest(app_id, channel)
+
+    def add_interest(self, app_id, channel):
+        """
+        Registers the interest of the current node in the provided
+        channel (a socket has subscribed it), notifying the broker
+        only when the first socket of the node subscribes it.
+
+        In the workers mode the interests are counted in the master,
+        as that's the process that holds the broker.
+
+        :type app_id: String
+        :param app_id: The identifier of the app of the channel.
+        :type channel: String
+        :param channel: The name of the channel with a new socket.
+        """
+
+        if not self.worker == None:
+            self.bus.send(
+                dict(type="interest", app_id=app_id, channel=channel, add=True)
+            )
+            return
+
+        with self.interests_lock:
+            count = self.interests.get((app_id, channel), 0)
+            self.interests[(app_id, channel)] = count + 1
+            if count == 0 and self.broker:
+                self.broker.interest(app_id, channel)
+
+    def remove_interest(self, app_id, channel):
+        if not self.worker == None:
+            self.bus.send(
+                dict(type="interest", app_id=app_id, channel=channel, add=False)
+            )
+            return
+
+        with self.interests_lock:
+            count = self.interests.get((app_id, channel), 0)
+            if count > 1:
+                self.interests[(app_id, channel)] = count - 1
+                return
+            self.interests.pop((app_id, channel), None)
+            if count == 1 and self.broker:
+                self.broker.disinterest(app_id, channel)
+
+    def load_handlers(self, load=True):
         self.apn_handler = apn.APNHandler(self)
         self.smtp_handler = smtp.SMTPHandler(self)
         self.web_handler = web.WebHandler(self)
         self.web_push_handler = web_push.WebPushHandler(self)
 
-        self.apn_handler.load()
-        self.smtp_handler.load()
-        self.web_handler.load()
-        self.web_push_handler.load()
+        if load:
+            self.apn_handler.load()
+            self.smtp_handler.load()
+            self.web_handler.load()
+            self.web_push_handler.load()
 
         self.handlers.append(self.apn_handler)
         self.handlers.append(self.smtp_handler)
         self.handlers.append(self.web_handler)
         self.handlers.append(self.web_push_handler)
 
-    def load_alias(self):
+    def load_alias(self, subs=None):
         """
         Loads the complete set of alias (channels that represent) the
         same for the current context, this may be used for a variety
         of reasons including the personal channels.
+
+        :type subs: List
+        :param subs: The subscriptions to be loaded, if not provided
+        the complete set of subscriptions is loaded from the data source.
         """
 
         # retrieves the complete set of subscriptions from the currently
         # associated data source reference and then uses them to create
         # the complete personal to proper channel relation
-        subs = pushi.Subscription.find()
+        if subs == None:
+            subs = pushi.Subscription.find()
         for sub in subs:
             app_id = sub.app_id
             user_id = sub.user_id
@@ -198,11 +732,197 @@ class State(appier.Mongo):
             app_key = self.app_id_to_app_key(app_id)
             self.add_alias(app_key, "personal-" + user_id, event)
 
+    def load_indexes(self):
+        """
+        Loads the (rebuildable) indexes of the infra-structure, either
+        by restoring them from the snapshot file (`PUSHI_SNAPSHOT`) and
+        catching up with the changes made since it was taken, or by
+        loading them from the data source in case there's no snapshot.
+
+        In case the snapshot is enabled it's written periodically (every
+        `PUSHI_SNAPSHOT_INTERVAL` seconds) and on exit.
+        """
+
+        self.snapshot_path = appier.conf("PUSHI_SNAPSHOT", None)
+        snapshot_d = snapshot.read(self.snapshot_path) if self.snapshot_path else None
+
+        if snapshot_d:
+            self.restore_snapshot(snapshot_d)
+        else:
+            for _name, _model, loader, _dump, _restore in self.get_sources():
+                loader()
+
+        if not self.snapshot_path:
+            return
+
+        atexit.register(self.save_snapshot)
+
+        interval = appier.conf("PUSHI_SNAPSHOT_INTERVAL", 300, cast=int)
+        if not interval:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.save_snapshot()
+                except Exception as exception:
+                    self.app.logger.warning(
+                        "Problem saving snapshot - %s"
+                        % appier.legacy.UNICODE(exception)
+                    )
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+    def get_sources(self):
+        """
+        Retrieves the sources of the (rebuildable) indexes, as tuples
+        containing the name, the model from which the index is loaded,
+        and the load, dump and restore functions of the index.
+
+        :rtype: List
+        :return: The sequence of sources of the indexes.
+        """
+
+        sources = [
+            (
+                "alias",
+                pushi.Subscription,
+                self.load_alias,
+                self.dump_alias,
+                self.restore_alias,
+            )
+        ]
+        for handler, model in (
+            (self.apn_handler, pushi.APN),
+            (self.smtp_handler, pushi.SMTP),
+            (self.web_handler, pushi.Web),
+            (self.web_push_handler, pushi.WebPush),
+        ):
+            sources.append(
+                (handler.name, model, handler.load, handler.snapshot, handler.restore)
+            )
+        return sources
+
+    def save_snapshot(self):
+        """
+        Writes the snapshot of the (rebuildable) indexes to the snapshot
+        file, together with the last identifier and the number of entities
+        of each source so that the changes made since then are detected,
+        and the (modification) watermark, the time the save started.
+
+        Note that the last identifier is retrieved before the indexes are
+        dumped so that the entities created in the meantime are loaded
+        again upon restore (the loading of an entity is idempotent).
+
+        The indexes are copied in the server loop (that owns them) so
+        that they're not changed while being serialized, the (slower)
+        serialization and write of the copy run in the calling thread.
+        """
+
+        if not self.snapshot_path:
+            return
+
+        modified = int(time.time())
+        sources = dict()
+        for name, model, _loader, _dump, _restore in self.get_sources():
+            last = model.find(sort=[("id", -1)], limit=1)
+            last = last[0].id if last else 0
+            count = model.count()
+            sources[name] = dict(last=last, count=count)
+
+        dumps = self.call_loop(self.copy_sources)
+        for name, data in dumps.items():
+            sources[name]["data"] = data
+
+        snapshot.write(
+            self.snapshot_path,
+            dict(timestamp=time.time(), modified=modified, sources=sources),
+        )
+
+    def restore_snapshot(self, snapshot_d):
+        """
+        Restores the (rebuildable) indexes from the provided snapshot,
+        catching up with the entities created since the snapshot was
+        taken, in case entities have been removed or changed in the meantime
+        (not possible to catch up) the source is loaded from the data source.
+
+        An entity is considered changed if modified at or after the watermark
+        of the snapshot, as the previous values of the entity (eg: event) are
+        not known the stale index entry can't be removed, note that without a
+        watermark (older snapshot) the sources are always loaded.
+
+        :type snapshot_d: Dictionary
+        :param snapshot_d: The snapshot to restore the indexes from.
+        """
+
+        modified = snapshot_d.get("modified", None)
+        sources = snapshot_d.get("sources", {})
+        for name, model, loader, _dump, restore in self.get_sources():
+            source = sources.get(name, None)
+            if not source or modified == None:
+                loader()
+                continue
+
+            subs = model.find(id={"$gt": source["last"]}, sort=[("id", 1)])
+            if not model.count() == source["count"] + len(subs):
+                loader()
+                continue
+
+            changed = model.count(
+                id={"$lte": source["last"]}, modified={"$gte": modified}
+            )
+            if changed:
+                loader()
+                continue
+
+            restore(source["data"])
+            loader(subs=subs)
+
+    def copy_sources(self):
+        return dict(
+            (name, copy.deepcopy(dump()))
+            for name, _model, _loader, dump, _restore in self.get_sources()
+        )
+
+    def dump_alias(self):
+        return dict(
+            (app_id, [state.app_key, state.alias])
+            for app_id, state in list(self.app_id_state.items())
+            if state.alias
+        )
+
+    def restore_alias(self, data):
+        for app_id, (app_key, alias) in data.items():
+            state = self.app_id_state.get(app_id, None)
+            if not state:
+                state = AppState(app_id, app_key)
+                self.app_id_state[app_id] = state
+                self.app_key_state[app_key] = state
+
+            # restores the alias relations and rebuilds the inverted
+            # (alias to channel) relations from them, relaying them to
+            # the workers in case there are any
+            state.alias = alias
+            state.alias_i = dict()
+            for channel, aliases in alias.items():
+                for _alias in aliases:
+                    state.alias_i.setdefault(_alias, []).append(channel)
+                    self.publish_alias(app_key, channel, _alias, True)
+
     def add_alias(self, app_key, channel, alias):
+        if self.is_foreign():
+            self.handoff(self.add_alias, app_key, channel, alias)
+            return
+
         self.app.logger.debug(
             "Adding '%s' into '%s' for app key '%s'" % (alias, channel, app_key)
         )
 
+        self.publish_alias(app_key, channel, alias, True)
+
         state = self.get_state(app_key=app_key)
         alias_l = state.alias.get(channel, [])
         if alias in alias_l:
@@ -219,10 +939,16 @@ class State(appier.Mongo):
         state.alias_i[alias] = alias_l
 
     def remove_alias(self, app_key, channel, alias):
+        if self.is_foreign():
+            self.handoff(self.remove_alias, app_key, channel, alias)
+            return
+
         self.app.logger.debug(
             "Removing '%s' from '%s' for app key '%s'" % (alias, channel, app_key)
         )
 
+        self.publish_alias(app_key, channel, alias, False)
+
         state = self.get_state(app_key=app_key)
         alias_l = state.alias.get(channel, [])
         if not alias in alias_l:
@@ -240,6 +966,16 @@ class State(appier.Mongo):
         if not alias_l:
             del state.alias_i[alias]
 
+    def publish_alias(self, app_key, channel, alias, add):
+        # the alias relations are only changed in the master process
+        # (app) and must be relayed to the workers, as they are the
+        # ones running the subscription of the personal channels
+        if not self.bus or not self.worker == None:
+            return
+        self.bus.publish(
+            dict(type="alias", app_key=app_key, channel=channel, alias=alias, add=add)
+        )
+
     def connect(self, connection, app_key, socket_id):
         pass
 
@@ -264,8 +1000,8 @@ class State(appier.Mongo):
         # socket is subscribed and then unsubscribe it from them then
         # removes the reference of the socket in the socket channels map
         state = self.get_state(app_key=app_key)
-        channels = state.socket_channels.get(socket_id, [])
-        channels = copy.copy(channels)
+        channels = state.socket_channels.get(socket_id, ())
+        channels = list(channels)
         for channel in channels:
             self.unsubscribe(connection, app_key, socket_id, channel)
         if socket_id in state.socket_channels:
@@ -293,6 +1029,15 @@ class State(appier.Mongo):
         if is_private and not force:
             self.verify(app_key, socket_id, channel, auth)
 
+        # the membership of the presence channels (and of the peer ones
+        # built on top of them) only lives in the process serving the
+        # connection, so in a worker (or a node of a cluster) it would be
+        # partial, the channels are refused unless local presence is set
+        if self.is_local(channel) and not self.local_presence:
+            raise RuntimeError(
+                "Presence channel '%s' not supported with workers or cluster" % channel
+            )
+
         # verifies if the current channel is of type personal and in
         # case it's retrieves it's alias (channels) and subscribes to
         # all of them (as expected), then return immediately
@@ -318,6 +1063,10 @@ class State(appier.Mongo):
         if not is_presence:
             channel_data = None
 
+        # accounts for the subscription in the metrics, note that only the
+        # concrete channels are accounted (not the personal ones)
+        self.metric_subscribes.inc(self.get_type(channel))
+
         # verifies if the current connection (by socket id) is already
         # registered to the channel and in case it's unsubscribes the
         # connection from it (avoids duplicated registration)
@@ -326,30 +1075,37 @@ class State(appier.Mongo):
             self.unsubscribe(connection, app_key, socket_id, channel)
 
         # retrieves the global state structure for the provided API key
-        # and also creates the tuple that encapsulates both the channel
-        # and the socket id (unique identification)
+        # and interns both the channel and the socket id so that a single
+        # copy of them is kept in the indexes (across subscriptions)
         state = self.get_state(app_key=app_key)
-        channel_socket = (channel, socket_id)
+        channel = intern_s(channel)
+        socket_id = intern_s(socket_id)
 
         # retrieves the complete set of channels for the socket id and
         # adds the current channel to it (subscription) then updates the
         # association between the socket id and the channels
-        channels = state.socket_channels.get(socket_id, [])
+        channels = state.socket_channels.get(socket_id, None)
+        if channels == None:
+            channels = ordered.OrderedSet()
         subscribed = channel in channels
         if subscribed:
             raise RuntimeError("Channel already subscribed")
-        channels.append(channel)
+        channels.add(channel)
         state.socket_channels[socket_id] = channels
 
         # retrieves the complete set of sockets for the channels (inverted)
         # association and adds the current socket id to the list then
         # re-updates the inverted map with the sockets list
-        sockets = state.channel_sockets.get(channel, [])
+        sockets = state.channel_sockets.get(channel, None)
+        if sockets == None:
+            sockets = ordered.OrderedSet()
         subscribed = socket_id in sockets
         if subscribed:
             raise RuntimeError("Socket already subscribed")
-        sockets.append(socket_id)
+        sockets.add(socket_id)
         state.channel_sockets[channel] = sockets
+        if len(sockets) == 1:
+            self.add_interest(state.app_id, channel)
 
         # in case there's no channel data to be used to change
         # metadata and in additional processing must return
@@ -358,99 +1114,59 @@ class State(appier.Mongo):
         if not channel_data:
             return
 
-        # unpacks the information from the channel data, defaulting
-        # some of the values to their fallback values
-        user_id = channel_data["user_id"]
+        # interns the keys of the channel data, so that the keys decoded
+        # for every subscription are shared among the member records and
+        # then unpacks the information from it, defaulting some of the
+        # values to their fallback values
+        channel_data = dict(
+            (intern_s(key), value) for key, value in channel_data.items()
+        )
+        user_id = intern_s(channel_data["user_id"])
         is_peer = channel_data.get("peer", False)
 
-        # "saves" the channel data for the channel socket tuple in the
-        # appropriate data structure to be used latter
-        state.channel_socket_data[channel_socket] = channel_data
-
-        # retrieves the channel info for the channel that is going to be
-        # subscribed and "unpacks" the complete state information from it
-        # so that it may be used and updated
-        info = state.channel_info.get(channel, {})
-        users = info.get("users", {})
-        members = info.get("members", {})
-        conns = info.get("conns", [])
-        user_count = info.get("user_count", 0)
-
-        # adds the current connection to the list of connection for the
-        # the current channel (state information update)
-        conns.append(connection)
-
-        # retrieves the list of connection to the current user id that is
-        # going to be used and adds the current connection, then re-updates
-        # the user connections list and the channel data
-        user_conns = users.get(user_id, [])
-        user_conns.append(connection)
-        users[user_id] = user_conns
-        members[user_id] = channel_data
+        # retrieves the channel record for the channel that is going to be
+        # subscribed (creating it if required) and adds the connection to
+        # the set of connections of the channel
+        info = state.channel_info.get(channel, None)
+        if not info:
+            info = ChannelInfo()
+            state.channel_info[channel] = info
+        info.conns.add(connection)
+
+        # retrieves the member record of the user (shared by all of its
+        # sockets) adding the current connection to it and updating the
+        # channel data of the user, the socket is then associated with
+        # the member record so that it's possible to find it by socket
+        member = info.members.get(user_id, None)
+        if not member:
+            member = MemberInfo(user_id, channel_data)
+            info.members[user_id] = member
+            info.encoded = None
+        if not member.channel_data == channel_data:
+            member.channel_data = channel_data
+            info.encoded = None
+        member.conns.add(connection)
+        info.sockets[socket_id] = member
 
         # verifies if the current subscription is going to create a new user
         # subscription (that must be logger) this is the case if the number
         # of connection currently subscribed is one
-        is_new = len(user_conns) == 1
-        if is_new:
-            user_count += 1
-
-        # updates the info dictionary with the new complete set of values for
-        # the channel information
-        info["users"] = users
-        info["members"] = members
-        info["conns"] = conns
-        info["user_count"] = user_count
-        state.channel_info[channel] = info
-
-        # subscribes all of the peer channels associated with the current
-        # presence channel that is being subscribed, this may represent some
-        # overhead but provides peer to peer communication
+        is_new = len(member.conns) == 1
+
+        # subscribes the peer channels of the user that have already been
+        # addressed (as the remaining ones are only created once addressed)
+        # so that the connection is able to communicate with its peers
         if is_peer:
-            self.subscribe_peer_all(app_key, connection, channel)
+            self.subscribe_peers(app_key, connection, channel, user_id)
 
         # in case the connection does not represent a new user logging in must
         # return immediately, because there's nothing remaining to be done
         if not is_new:
             return
 
-        # creates the JSON dictionary containing the event to be sent to all
-        # of the socket in the channel indicating the presence change for the
-        # "new" user that has just logged in (member added)
-        json_d = dict(
-            event="pusher:member_added",
-            member=json.dumps(channel_data),
-            channel=channel,
-        )
-
-        # iterates over the complete set of connections currently subscribed
-        # to the channel, in order to be notify them about the member added
-        for _connection in conns:
-            if _connection == connection:
-                continue
-            _connection.send_pushi(json_d)
-
-            # in case the connection is not of type peer there's nothing
-            # else to be done related with the other connections
-            if not is_peer:
-                continue
-
-            # retrieves the socket id of the current connection in iteration
-            # and uses it to construct the channel socket id tuple to try to
-            # retrieve the channel data for the socket in case it does not
-            # exists skips the current step, no need to subscribe to chat
-            # specific channel (because there's no channel data)
-            _socket_id = _connection.socket_id
-            _channel_socket = (channel, _socket_id)
-            _channel_data = state.channel_socket_data.get(_channel_socket)
-            if not _channel_data:
-                continue
-
-            # retrieves the user id of the current channel data for the user
-            # in iteration and the uses this value to subscribe it for the
-            # peer channel with the current member (that was just added)
-            _user_id = _channel_data["user_id"]
-            self.subscribe_peer(app_key, _connection, channel, user_id, _user_id)
+        # notifies the complete set of connections currently subscribed to
+        # the channel about the "new" user that has just logged in
+        self.notify_presence(app_key, channel, info, member, True, connection)
 
     def unsubscribe(self, connection, app_key, socket_id, channel):
         # checks if the current channel is a private one and in case
@@ -467,84 +1183,57 @@ class State(appier.Mongo):
         # current channel, meaning that in case the current socket
         # is not subscribed to the channel an exception will be raised
         self.validate(connection, app_key, socket_id, channel)
+        self.metric_unsubscribes.inc(self.get_type(channel))
 
         # uses the provided app key to retrieve the state of the
-        # app and then creates the channel socket tuple that is
-        # going to be used for unique identification
+        # app that is going to be updated by the unsubscription
         state = self.get_state(app_key=app_key)
-        channel_socket = (channel, socket_id)
 
         # retrieves the list of channels for which the provided socket
         # id is currently subscribed and removes the current channel
         # from that list in case it exists there
-        channels = state.socket_channels.get(socket_id, [])
+        channels = state.socket_channels.get(socket_id, ())
         if channel in channels:
             channels.remove(channel)
 
         # retrieves the list of sockets that are subscribed to the defined
         # channel and removes the current socket from it
-        sockets = state.channel_sockets.get(channel, [])
+        sockets = state.channel_sockets.get(channel, ())
         if socket_id in sockets:
             sockets.remove(socket_id)
-
-        # tries to retrieve the channel data for the channel socket
-        # tuple in case there's none available there's nothing else
-        # remaining to be done in the unsubscribe process
-        channel_data = state.channel_socket_data.get(channel_socket)
-        if not channel_data:
+            if not sockets:
+                self.remove_interest(state.app_id, channel)
+
+        # tries to retrieve the member record of the socket in the channel
+        # in case there's none available there's nothing else remaining
+        # to be done in the unsubscribe process
+        member = state.get_member(channel, socket_id)
+        if not member:
             return
 
-        # deletes the channel socket tuple reference from the channel
-        # socket data list, no longer going to be required
-        del state.channel_socket_data[channel_socket]
+        # retrieves the user id associated with the member record
+        user_id = member.user_id
 
-        # retrieves both the information on the user id associated with
-        # the channel data and the is peer (channel) boolean flag
-        user_id = channel_data["user_id"]
-        is_peer = channel_data.get("peer", False)
+        # unsubscribes the connection from the peer channels of the user
+        # that have been addressed (and so subscribed) in the meantime
+        self.unsubscribe_peers(app_key, connection, channel, user_id)
 
-        # gather information on the channel from the global state object
-        # this would include the amount of users the members, current
-        # connections and more
-        info = state.channel_info.get(channel, {})
-        users = info.get("users", {})
-        members = info.get("members", {})
-        conns = info.get("conns", [])
-        user_count = info.get("user_count", 0)
-
-        # removes the current connection from the list of connection currently
-        # active for the channel, because it's no longer available
-        conns.remove(connection)
-
-        # retrieves the currently active connections registered under the user id
-        # of the connection to be unregistered then removes the current connection
-        # from the list of connections and re-sets the connections list
-        user_conns = users.get(user_id, [])
-        user_conns.remove(connection)
-        users[user_id] = user_conns
+        # removes the association of the socket with the member record, the
+        # current connection from the set of connection currently active for
+        # the channel and from the connections of the member
+        info = state.channel_info[channel]
+        del info.sockets[socket_id]
+        info.conns.remove(connection)
+        member.conns.remove(connection)
 
         # verifies if the current connection is old, a connection is considered
         # old when no more connections exist for a certain user id in the channel
         # for this situations additional housekeeping must be performed
-        is_old = len(user_conns) == 0
+        is_old = len(member.conns) == 0
         if is_old:
-            del users[user_id]
-            del members[user_id]
-            user_count -= 1
-
-        # updates the various attributes of the channel information structure
-        # so that it remains updated according to the unsubscribe operation
-        info["users"] = users
-        info["members"] = members
-        info["conns"] = conns
-        info["user_count"] = user_count
-        state.channel_info[channel] = info
-
-        # unsubscribes from the complete set of peer channels associated with
-        # the current presence channel, this is an expensive operation controlled
-        # by the peer flat that may be set in the channel data structure
-        if is_peer:
-            self.unsubscribe_peer_all(app_key, connection, channel)
+            del info.members[user_id]
+            info.peers.pop(user_id, None)
+            info.encoded = None
 
         # verifies if the current connection is old in case it's not no operation
         # remain for the unsubscribe operation and so the function may return
@@ -553,49 +1242,149 @@ class State(appier.Mongo):
 
         # verifies if the current set of connection is empty (count is zero) so that
         # it's possible to know if the channel info for the channel should be removed
-        is_empty = len(conns) == 0
+        is_empty = len(info.conns) == 0
         if is_empty:
             del state.channel_info[channel]
 
-        # creates the map that is going to be used in the event to be sent to the set
-        # sockets subscribed to the channel indicating that the member has been removed
-        json_d = dict(
-            event="pusher:member_removed",
-            member=json.dumps(channel_data),
-            channel=channel,
-        )
+        # notifies the complete set of connections subscribed to the channel
+        # about the member that has been removed from the channel
+        self.notify_presence(app_key, channel, info, member, False, connection)
 
-        # iterates over the complete set of connections subscribed to the channel to notify
-        # them about the member that has been removed from the channel
-        for _connection in conns:
-            # in case the current connection in iteration is the same as the
-            # connection in subscription skips the current iteration otherwise
-            # send the "member removed" message to the connection
-            if _connection == connection:
-                continue
-            _connection.send_pushi(json_d)
+    def notify_presence(self, app_key, channel, info, member, added, connection):
+        """
+        Notifies the connections of the presence channel about the
+        provided member being added to (or removed from) the channel.
 
-            # in case the current subscription does not have the peer "mode" enabled
-            # there's no need to continue as the rest of the iteration is dedicated
-            # to the subscription of the peer channels
-            if not is_peer:
-                continue
+        In case the presence window is set the changes are coalesced
+        in the window and sent as a single `pusher:member_diff` event
+        per channel, and above the presence cap (number of users) only
+        the member count is sent, using the `pusher:member_count` event.
+
+        The events are encoded once and shared by every connection.
+
+        :type app_key: String
+        :param app_key: The key of the app of the channel.
+        :type channel: String
+        :param channel: The name of the presence channel.
+        :type info: ChannelInfo
+        :param info: The record of the presence channel.
+        :type member: MemberInfo
+        :param member: The member that has been added or removed.
+        :type added: bool
+        :param added: If the member has been added to the channel.
+        :type connection: PushiConnection
+        :param connection: The connection that caused the change, not
+        notified about it (in the diff no connection is notified about
+        the addition of its own user).
+        """
+
+        # in case the presence window is set the change is added to the
+        # ones pending for the channel (a change cancelling a previous one
+        # in the same window is dropped) and the flush of them is scheduled
+        # for the end of the window when this is the first change
+        if self.presence_window:
+            if info.changes == None:
+                info.changes = (collections.OrderedDict(), collections.OrderedDict())
+                self.server.delay(
+                    lambda: self.flush_presence(app_key, channel),
+                    timeout=self.presence_window / 1000.0,
+                    safe=True,
+                )
+            _added, _removed = info.changes
+            if added:
+                _removed.pop(member.user_id, None)
+                _added[member.user_id] = member.channel_data
+            elif _added.pop(member.user_id, None) == None:
+                _removed[member.user_id] = member.channel_data
+            return
+
+        # builds the event for the change, in case the channel is above
+        # the cap only the count of members is sent, otherwise the legacy
+        # event for the member added or removed is used
+        if self.presence_cap and info.user_count > self.presence_cap:
+            json_d = dict(
+                event="pusher:member_count",
+                data=json.dumps(dict(count=info.user_count)),
+                channel=channel,
+            )
+        else:
+            json_d = dict(
+                event="pusher:member_added" if added else "pusher:member_removed",
+                member=json.dumps(member.channel_data),
+                channel=channel,
+            )
+
+        self.send_presence(info, json_d, exclude=(connection,))
 
-            # retrieves the socket id of the current connection in iteration
-            # and uses it to construct the channel socket id tuple to try to
-            # retrieve the channel data for the socket in case it does not
-            # exists skips the current step, no need to subscribe to chat
-            # specific channel (because there's no channel data)
-            _socket_id = _connection.socket_id
-            _channel_socket = (channel, _socket_id)
-            _channel_data = state.channel_socket_data.get(_channel_socket)
-            if not _channel_data:
+    def flush_presence(self, app_key, channel):
+        # retrieves the record of the channel and the changes pending for
+        # it, in case the channel is gone or there's no change (as they
+        # cancelled each other) there's nothing to be notified
+        state = self.get_state(app_key=app_key)
+        info = state.channel_info.get(channel, None)
+        if not info or not info.changes:
+            return
+        added, removed = info.changes
+        info.changes = None
+        if not added and not removed:
+            return
+
+        # above the cap only the count of members is sent, and to every
+        # connection of the channel (including the ones that joined)
+        if self.presence_cap and info.user_count > self.presence_cap:
+            json_d = dict(
+                event="pusher:member_count",
+                data=json.dumps(dict(count=info.user_count)),
+                channel=channel,
+            )
+            self.send_presence(info, json_d)
+            return
+
+        # the connections of the members added in the window are not to
+        # be notified about the addition of their own user (as with the
+        # legacy member added event), so they're excluded from the diff
+        # shared by the other connections of the channel
+        joined = []
+        for connection in list(info.conns):
+            member = info.sockets.get(connection.socket_id, None)
+            if not member or not member.user_id in added:
                 continue
+            joined.append((connection, member.user_id))
+
+        # builds the diff event with the members added and removed in the
+        # window and sends it to every connection of the channel except the
+        # ones of the members added, that receive a diff without their own
+        # addition (if there's anything else to be notified)
+        self.send_presence(
+            info,
+            self.build_diff(channel, info, added.values(), removed.values()),
+            exclude=[connection for connection, _user_id in joined],
+        )
+        for connection, user_id in joined:
+            _added = [value for key, value in added.items() if not key == user_id]
+            if not _added and not removed:
+                continue
+            json_d = self.build_diff(channel, info, _added, removed.values())
+            connection.send_message(pushi.PushiMessage(json_d))
+
+    def build_diff(self, channel, info, added, removed):
+        return dict(
+            event="pusher:member_diff",
+            data=json.dumps(
+                dict(added=list(added), removed=list(removed), count=info.user_count)
+            ),
+            channel=channel,
+        )
 
-            # retrieves the user id for the connection in iteration for the current
-            # channel and uses it to subscribe the connection to the peer channel
-            _user_id = _channel_data["user_id"]
-            self.unsubscribe_peer(app_key, _connection, channel, user_id, _user_id)
+    def send_presence(self, info, json_d, exclude=()):
+        # creates the message for the event once so that its encoding is
+        # shared by the complete set of connections of the channel, note
+        # that the set is copied as sending may close a connection
+        message = pushi.PushiMessage(json_d)
+        for connection in list(info.conns):
+            if connection in exclude:
+                continue
+            connection.send_message(message)
 
     def validate(self, connection, app_key, socket_id, channel):
         # verifies that the current socket is subscribed of eligible for
@@ -606,153 +1395,121 @@ class State(appier.Mongo):
         if not is_subscribed and not is_eligible:
             raise RuntimeError("Not subscribed/eligible to channel")
 
-    def subscribe_peer_all(self, app_key, connection, channel):
-        # creates the channel socket tuple with the channel name and the
-        # socket identifier for the current connection
+    def subscribe_peers(self, app_key, connection, channel, user_id):
+        # retrieves the peer channels of the user in the presence channel
+        # that have already been addressed (peer index) and subscribes the
+        # connection to each of them, note that the remaining peer channels
+        # are only going to be subscribed once they are addressed
         state = self.get_state(app_key=app_key)
-        channel_socket = (channel, connection.socket_id)
-
-        # retrieves the channel data information for the current channel
-        # socket and in case there's none returns immediately
-        channel_data = state.channel_socket_data.get(channel_socket)
-        if not channel_data:
+        info = state.channel_info.get(channel, None)
+        if not info:
             return
-
-        # retrieves the user identifier from the channel data of the current
-        # connection in the channel
-        user_id = channel_data["user_id"]
-
-        # uses the channel information to retrieve the list of currently
-        # registered connections for the channel, these are going to be
-        # used in the subscription iteration
-        info = state.channel_info.get(channel, {})
-        conns = info.get("conns", [])
-
-        # creates the list that will hold the list of user identifier
-        # that have already been visited so that no more that one peer
-        # subscription is done by type
-        visited = []
-
-        # iterates over all the connections subscribed for the current channel
-        # to be able to register for each of the peer channels
-        for _connection in conns:
-            # in case the current connection in iteration is the connection
-            # that is used for the subscription (own connection) skips the
-            # current loop as there's nothing to be done
-            if _connection == connection:
+        for peer_channel in list(info.peers.get(user_id, ())):
+            if self.is_subscribed(app_key, connection.socket_id, peer_channel):
                 continue
+            self.subscribe(
+                connection, app_key, connection.socket_id, peer_channel, force=True
+            )
 
-            # creates the channel socket tuple containing the channel name
-            # and the socket identifier for the current connection in iteration
-            # and then uses it to retrieve the channel data for it, in case none
-            # is retrieve must skip the current loop
-            _channel_socket = (channel, _connection.socket_id)
-            _channel_data = state.channel_socket_data.get(_channel_socket)
-            if not _channel_data:
+    def unsubscribe_peers(self, app_key, connection, channel, user_id):
+        # retrieves the peer channels of the user in the presence channel
+        # that have been addressed and unsubscribes the connection from the
+        # ones it's subscribed to (the subscription may have been cancelled)
+        state = self.get_state(app_key=app_key)
+        info = state.channel_info.get(channel, None)
+        if not info:
+            return
+        for peer_channel in list(info.peers.get(user_id, ())):
+            if not self.is_subscribed(app_key, connection.socket_id, peer_channel):
                 continue
+            self.unsubscribe(connection, app_key, connection.socket_id, peer_channel)
 
-            # retrieves the user identifier for the current channel data in
-            # case the user identifier is the same as the current channel's
-            # identifiers ignores it (no need to subscribe to our own channel)
-            # and then in case it has already been visited also ignores it
-            _user_id = _channel_data["user_id"]
-            if _user_id == user_id:
-                continue
-            if _user_id in visited:
-                continue
+    def open_peer(self, app_id, channel, socket_id=None):
+        """
+        Opens the provided peer channel, subscribing the connections of
+        both of its users (with the peer mode enabled) to it, in case it
+        has not yet been addressed for the users.
 
-            # subscribes for the peer channel for the user id pair and adds
-            # the current user id to the list of visited ids (avoid duplicated
-            # subscriptions of channels)
-            self.subscribe_peer(app_key, connection, channel, user_id, _user_id)
-            visited.append(_user_id)
+        The peer channels are created lazily (when first addressed) and
+        registered in the peer index of the presence channel, so that the
+        connections of the users that subscribe later are subscribed too.
+        The channel is only opened in case both of its users are members
+        of the presence channel and, for a (client) sender, in case it's
+        one of such users, invalid channel names are ignored.
 
-    def unsubscribe_peer_all(self, app_key, connection, channel):
-        # creates the channel socket tuple with the channel name and the
-        # socket identifier for the current connection
-        state = self.get_state(app_key=app_key)
-        channel_socket = (channel, connection.socket_id)
+        :type app_id: String
+        :param app_id: The identifier of the app of the channel.
+        :type channel: String
+        :param channel: The name of the peer channel to be opened, in
+        the `peer-<name>:<user_id>&<user_id>` format (sorted user ids).
+        :type socket_id: String
+        :param socket_id: The identifier of the socket that is sending
+        to the channel, in case it's a client one (untrusted).
+        """
 
-        # retrieves the channel data information for the current channel
-        # socket and in case there's none returns immediately
-        channel_data = state.channel_socket_data.get(channel_socket)
-        if not channel_data:
+        # verifies that the channel name is a valid (canonical) one, with
+        # exactly two distinct and sorted user ids, just like the ones
+        # created by the subscription of the peers, ignoring it otherwise
+        if not ":" in channel:
+            return
+        base_channel, peers = self.get_peer(channel)
+        if not len(peers) == 2 or not peers[0] or not peers[0] < peers[1]:
             return
 
-        # retrieves the user identifier from the channel data of the current
-        # connection in the channel
-        user_id = channel_data["user_id"]
-
-        # uses the channel information to retrieve the list of currently
-        # registered connections for the channel, these are going to be
-        # used in the unsubscription iteration
-        info = state.channel_info.get(channel, {})
-        conns = info.get("conns", [])
-
-        # creates the list that will hold the list of user identifier
-        # that have already been visited so that no more that one peer
-        # unsubscription is done by type
-        visited = []
-
-        # iterates over all the connections subscribed for the current channel
-        # to be able to unregister for each of the peer channels
-        for _connection in conns:
-            # in case the current connection in iteration is the connection
-            # that is used for the subscription (own connection) skips the
-            # current loop as there's nothing to be done
-            if _connection == connection:
-                continue
+        # both users must be (current) members of the presence channel, so
+        # that the peer index is bounded by the members of the channel and
+        # is cleaned up once they leave it
+        state = self.get_state(app_id=app_id)
+        info = state.channel_info.get(base_channel, None)
+        if not info:
+            return
+        members = [info.members.get(user_id, None) for user_id in peers]
+        if not all(members):
+            return
 
-            # creates the channel socket tuple containing the channel name
-            # and the socket identifier for the current connection in iteration
-            # and then uses it to retrieve the channel data for it, in case none
-            # is retrieve must skip the current loop
-            _channel_socket = (channel, _connection.socket_id)
-            _channel_data = state.channel_socket_data.get(_channel_socket)
-            if not _channel_data:
+        # in case the sender is a client socket it must be a member of the
+        # presence channel and one of the users of the peer channel, so that
+        # no third party is able to open (and subscribe) the peer channel
+        if socket_id:
+            member = state.get_member(base_channel, socket_id)
+            if not member or not member.user_id in peers:
+                return
+
+        for user_id, member in zip(peers, members):
+            # verifies if the peer channel has already been addressed for
+            # the user (the peer index already contains it) and if that's
+            # the case skips it, otherwise adds it to the peer index
+            user_peers = info.peers.get(user_id, None)
+            if user_peers == None:
+                user_peers = ordered.OrderedSet()
+                info.peers[user_id] = user_peers
+            if channel in user_peers:
                 continue
+            user_peers.add(intern_s(channel))
 
-            # retrieves the user identifier for the current channel data in
-            # case the user identifier is the same as the current channel's
-            # identifiers ignores it (no need to unsubscribe to our own channel)
-            # and then in case it has already been visited also ignores it
-            _user_id = _channel_data["user_id"]
-            if _user_id == user_id:
-                continue
-            if _user_id in visited:
+            # subscribes the connections of the user to the peer channel in
+            # case the user has the peer mode enabled
+            if not member.channel_data.get("peer", False):
                 continue
+            for connection in list(member.conns):
+                if self.is_subscribed(state.app_key, connection.socket_id, channel):
+                    continue
+                self.subscribe(
+                    connection,
+                    state.app_key,
+                    connection.socket_id,
+                    channel,
+                    force=True,
+                )
 
-            # unsubscribes from the peer channel for the user id pair and adds
-            # the current user id to the list of visited ids (avoid duplicated
-            # subscriptions of channels)
-            self.unsubscribe_peer(app_key, connection, channel, user_id, _user_id)
-            visited.append(_user_id)
-
-    def subscribe_peer(self, app_key, connection, channel, first_id, second_id):
-        # in case the id of both parts is the same, must return immediately
-        # as this is considered to be an invalid channel, for peer basis
-        if first_id == second_id:
-            return
-
-        base = [first_id, second_id]
-        base.sort()
-        base_s = "&".join(base)
-        base_channel = channel[9:]
-        _channel = "peer-" + base_channel + ":" + base_s
-        self.subscribe(connection, app_key, connection.socket_id, _channel, force=True)
-
-    def unsubscribe_peer(self, app_key, connection, channel, first_id, second_id):
-        # in case the id of both parts is the same, must return immediately
-        # as this is considered to be an invalid channel, for peer basis
-        if first_id == second_id:
-            return
-
-        base = [first_id, second_id]
-        base.sort()
-        base_s = "&".join(base)
-        base_channel = channel[9:]
-        _channel = "peer-" + base_channel + ":" + base_s
-        self.unsubscribe(connection, app_key, connection.socket_id, _channel)
+    def get_peer(self, channel):
+        # splits the peer channel into the base and tail parts and then
+        # extracts both the base (presence) channel name and the peers
+        # list, note that the base name itself may contain the separator
+        base, tail = channel.rsplit(":", 1)
+        base_channel = "presence-" + base.split("-", 1)[1]
+        peers = tail.split("&", 1)
+        return base_channel, peers
 
     def is_subscribed(self, app_key, socket_id, channel):
         """
@@ -792,25 +1549,21 @@ class State(appier.Mongo):
         if not channel.startswith("peer-"):
             return False
 
-        # splits the channel into the base and tail parts and then extracts
-        # both the base channel name and the peers list for processing
-        base, tail = channel.split(":", 1)
-        base_channel = "presence-" + base.split("-", 1)[1]
-        peers = tail.split("&", 1)
+        # extracts both the base channel name and the peers list from
+        # the peer channel for processing
+        base_channel, peers = self.get_peer(channel)
 
         # retrieves the required app state from the provided app key, it's
         # going to be used for channel data related operations
         state = self.get_state(app_key=app_key)
 
-        # constructs the channel socket tuple and uses it to retrieve the
-        # the channel data value for the base channel so that the user
-        # identification is retrieved for verification, note that in no
-        # channel data exists the socket is considered not eligible
-        channel_socket = (base_channel, socket_id)
-        channel_data = state.channel_socket_data.get(channel_socket)
-        if not channel_data:
+        # retrieves the member record of the socket for the base channel
+        # so that the user identification is retrieved for verification,
+        # note that in no member exists the socket is considered not eligible
+        member = state.get_member(base_channel, socket_id)
+        if not member:
             return False
-        user_id = channel_data["user_id"]
+        user_id = member.user_id
 
         # returns the final boolean value for the presence testing of the
         # user id value in the peers list (as expected)
@@ -828,6 +1581,25 @@ class State(appier.Mongo):
         owner_id=None,
         verify=True,
     ):
+        # in case the trigger comes from a thread other than the one
+        # running the server loop (eg: HTTP request handler) it is handed
+        # off to the loop, so that the state and the sockets are only
+        # ever changed by a single thread and the caller returns at once
+        if self.is_foreign():
+            return self.handoff(
+                self.trigger,
+                app_id,
+                event,
+                data,
+                channels=channels,
+                echo=echo,
+                persist=persist,
+                json_d=json_d,
+                owner_id=owner_id,
+                verify=verify,
+            )
+            return
+
         if not channels:
             channels = ("global",)
 
@@ -835,7 +1607,30 @@ class State(appier.Mongo):
         if not channels_t in (list, tuple):
             channels = (channels,)
 
+        # in case the current process is a worker the trigger is verified
+        # locally (the socket state only lives here) and then forwarded
+        # to the master process that persists the event and relays it to
+        # the complete set of workers (including the current one)
+        if not self.worker == None:
+            if owner_id and verify:
+                for channel in channels:
+                    self.verify_presence(app_id, owner_id, channel)
+            kwargs = dict(
+                app_id=app_id,
+                event=event,
+                data=data,
+                channels=list(channels),
+                echo=echo,
+                persist=persist,
+                json_d=json_d,
+                owner_id=owner_id,
+                verify=False,
+            )
+            self.bus.send(dict(type="trigger", kwargs=kwargs))
+            return
+
         invalid = dict()
+        key = str(uuid.uuid4()) if self.bus or self.broker else None
 
         for channel in channels:
             self.trigger_c(
@@ -849,6 +1644,7 @@ class State(appier.Mongo):
                 owner_id=owner_id,
                 verify=verify,
                 invalid=invalid,
+                key=key,
             )
 
     def trigger_c(
@@ -864,7 +1660,12 @@ class State(appier.Mongo):
         verify=True,
         delayed=True,
         invalid={},
+        key=None,
     ):
+        # stores the time of the trigger so that the time it takes until
+        # the event is written to the sockets is measured (fan-out)
+        triggered = time.time()
+
         # retrieves the data type of the provided data of the event and
         # depending on the kind of structure it may dump the result as
         # a plain based string serialized using JSON
@@ -901,6 +1702,12 @@ class State(appier.Mongo):
             json_d["mid"] = event_s.mid
             json_d["timestamp"] = event_s.timestamp
 
+        # otherwise in case the resume of connections is enabled a transient
+        # mid is generated so that the event may be referenced by the client
+        # as the last one seen, when re-subscribing the channel
+        elif self.ring.count > 0 and not "mid" in json_d:
+            json_d["mid"] = str(uuid.uuid4())
+
         # runs the process of sending the event through the channel,
         # note that the process will also be run for the complete set
         # of handlers registered for the current infra-structure
@@ -913,8 +1720,12 @@ class State(appier.Mongo):
             verify=verify,
             delayed=delayed,
             invalid=invalid,
+            key=key,
         )
 
+        self.metric_events.inc(self.get_type(channel))
+        self.metric_fanout.observe(time.time() - triggered)
+
     def get_subscriptions(self, app_id, channel):
         subscriptions = pushi.Subscription.find(instance=app_id, event=channel)
         return subscriptions
@@ -949,8 +1760,10 @@ class State(appier.Mongo):
             event.save()
 
             # extracts the mid from the event so that it's does not need
-            # to be extracted in every iteration
+            # to be extracted in every iteration, the channels that receive
+            # the event are gathered to be updated in the history cache
             mid = event.mid
+            channels = [channel]
 
             # retrieves the complete set of subscriptions for the
             # provided channel and under the current app id to be
@@ -963,12 +1776,17 @@ class State(appier.Mongo):
                 assoc = pushi.Association(instance=app_id, mid=mid, user_id=user_id)
                 assoc.save()
                 invalid[user_id] = True
+                channels.append("personal-" + user_id)
+
+            # updates the history (cache) of the channels with the event that
+            # has just been persisted (write-through) so that it's visible
+            self.add_history(app_id, channels, event)
 
         # delays the persistence of the event data and subscription so
         # that the current control flow is not blocked with the data
         # store operations that are going to be performed, in case the
         # delayed flag is not set the operation is executed immediately
-        self.app.delay(persist) if delayed else persist()
+        self.delay("persist", persist) if delayed else persist()
 
         # returns the final generated event structure that may be used
         # to retrieve some persistent related information (eg: mid)
@@ -984,30 +1802,39 @@ class State(appier.Mongo):
         verify=True,
         delayed=True,
         invalid={},
+        key=None,
     ):
         # tries to retrieve the value of the flag that controls if the
         # "custom" handlers should be used for the channel handling
         use_handlers = appier.conf("PUSHI_HANDLERS", True, cast=bool)
 
-        # retrieves the state of the current app to be used in the sending and
         # verifies that the owner (socket) identifier is present in the channel
         # (but only in case the verify flag is present)
-        state = self.get_state(app_id=app_id)
         if owner_id and verify:
             self.verify_presence(app_id, owner_id, channel)
 
-        # retrieves the complete set of sockets associated with the channel
-        # and sends the JSON data through the socket, avoiding sending the
-        # data through the same socket that originated the event, unless the
-        # echo flag is set (meaning re-sending to channel)
-        sockets = state.channel_sockets.get(channel, [])
-        for socket_id in sockets:
-            if socket_id in invalid:
-                continue
-            if socket_id == owner_id and not echo:
-                continue
-            self.send_socket(socket_id, json_d)
-            invalid[socket_id] = True
+        # sends the event to the sockets of the current process and then,
+        # in case this is the master of a set of workers, relays it to all
+        # of them using the bus and to the other (interested) nodes of the
+        # cluster using the broker, the key identifies the trigger so that
+        # they're able to avoid duplicated sends (just like invalid)
+        self.send_local(
+            app_id, channel, json_d, echo=echo, owner_id=owner_id, invalid=invalid
+        )
+        if self.worker == None and (self.bus or self.broker):
+            message = dict(
+                type="send",
+                app_id=app_id,
+                channel=channel,
+                json_d=json_d,
+                echo=echo,
+                owner_id=owner_id,
+                key=key or str(uuid.uuid4()),
+            )
+            if self.bus:
+                self.bus.publish(message)
+            if self.broker:
+                self.broker.publish(app_id, self.get_route(channel), message)
 
         # in case the handlers should not be used for custom handling the
         # control flow should be returned immediately as expected
@@ -1020,7 +1847,8 @@ class State(appier.Mongo):
         for handler in self.handlers:
             try:
                 if delayed:
-                    self.app.delay(
+                    self.delay(
+                        "handler",
                         handler.send,
                         args=(app_id, channel, json_d),
                         kwargs=dict(invalid=invalid),
@@ -1033,9 +1861,228 @@ class State(appier.Mongo):
                     % (handler.name, appier.legacy.UNICODE(exception))
                 )
 
+    def delay(self, queue, method, args=[], kwargs={}):
+        """
+        Delays the execution of the provided method using the (execution)
+        manager of the app, accounting for the depth of the queue and for
+        the time waited by the method in it.
+
+        :type queue: String
+        :param queue: The name of the queue for the metrics (eg: persist).
+        :type method: Function
+        :param method: The method to be executed.
+        :type args: List
+        :param args: The (unnamed) arguments to be passed to the method.
+        :type kwargs: Dictionary
+        :param kwargs: The named arguments to be passed to the method.
+        """
+
+        delayed = time.time()
+
+        def execute():
+            with self.pending_lock:
+                self.pending[queue] -= 1
+            self.metric_delay.observe(time.time() - delayed, queue)
+            try:
+                method(*args, **kwargs)
+            finally:
+                self.metric_executed.inc(queue)
+
+        with self.pending_lock:
+            self.pending[queue] = self.pending.get(queue, 0) + 1
+        self.metric_delayed.inc(queue)
+        self.app.delay(execute)
+
+    def handoff(self, method, *args, **kwargs):
+        """
+        Hands off the execution of the provided method to the thread
+        running the server loop, using a (single consumer) queue that
+        is drained in batches by the loop.
+
+        Only the first operation added to an empty queue wakes up the
+        loop, the remaining ones are picked up by the same drain.
+
+        In case there's no server loop running in another thread (eg: no
+        server, the current thread is the loop) the method is called
+        directly, so that its result and exceptions reach the caller.
+
+        :type method: Function
+        :param method: The method to be executed in the server loop.
+        :rtype: Handoff
+        :return: The pending result of the operation, that may be waited
+        for, re-raising the exception in case the operation failed.
+        """
+
+        handoff = Handoff()
+        if not self.is_foreign():
+            handoff.set_result(method(*args, **kwargs))
+            return handoff
+
+        self.metric_delayed.inc("handoff")
+        with self.handoff_lock:
+            self.handoff_queue.append((time.time(), method, args, kwargs, handoff))
+            pending = self.handoff_pending
+            self.handoff_pending = True
+        if not pending:
+            self.server.delay(self.flush_handoff, safe=True)
+        return handoff
+
+    def flush_handoff(self):
+        # pops the next batch of operations from the queue under the lock
+        # and in case there are still operations pending re-schedules the
+        # drain for the next tick (instead of releasing the pending flag)
+        # so that the loop is able to handle I/O in between batches
+        with self.handoff_lock:
+            count = min(len(self.handoff_queue), self.handoff_batch)
+            batch = [self.handoff_queue.popleft() for _index in range(count)]
+            self.handoff_pending = True if self.handoff_queue else False
+
+        for queued, method, args, kwargs, handoff in batch:
+            self.metric_delay.observe(time.time() - queued, "handoff")
+            try:
+                handoff.set_result(method(*args, **kwargs))
+            except Exception as exception:
+                self.app.logger.warning(
+                    "Problem running handed off operation: %s" % exception
+                )
+                handoff.set_exception(exception)
+            finally:
+                self.metric_executed.inc("handoff")
+
+        if self.handoff_pending:
+            self.server.delay(self.flush_handoff)
+
+    def call_loop(self, method, timeout=30.0):
+        """
+        Calls the provided method in the thread running the server loop,
+        waiting (blocking) for its result, in case the loop is not running
+        or the current thread is the one running it the call is inline.
+
+        The call is queued after the operations already handed off, so
+        that it sees the changes they make (eg: handler subscriptions).
+
+        :type method: Function
+        :param method: The method to be called in the server loop.
+        :type timeout: float
+        :param timeout: The maximum time (in seconds) to wait for the
+        server loop to run the method.
+        :rtype: Object
+        :return: The result of the method call.
+        """
+
+        if not self.is_foreign() or not self.server.is_running():
+            return method()
+
+        return self.handoff(method).wait(timeout)
+
+    def is_foreign(self):
+        # the operation is considered foreign in case the server loop is
+        # running and the current thread is not the one running it, note
+        # that before the server is started everything runs inline
+        if not self.server:
+            return False
+        return not self.server.is_main()
+
+    def send_local(
+        self, app_id, channel, json_d, echo=False, owner_id=None, invalid={}
+    ):
+        # stores the event in the (in-memory) ring buffer of the channel
+        # so that it may be replayed to the clients that resume their
+        # subscription after a disconnection (missed events)
+        self.ring.add((app_id, channel), json_d)
+
+        # in case the channel is a peer one it's opened (subscribing the
+        # connections of its users) as it may be addressed for the first time
+        if channel.startswith("peer-"):
+            self.open_peer(app_id, channel)
+
+        # retrieves the complete set of sockets associated with the channel
+        # and gathers the ones that should receive the JSON data, avoiding
+        # the socket that originated the event, unless the echo flag is set
+        # (meaning re-sending to channel), then sends the data to all of them
+        # at once so that the message is only encoded once (fan-out)
+        state = self.get_state(app_id=app_id)
+        sockets = state.channel_sockets.get(channel, [])
+        targets = []
+        for socket_id in sockets:
+            if socket_id in invalid:
+                continue
+            if socket_id == owner_id and not echo:
+                continue
+            targets.append(socket_id)
+            invalid[socket_id] = True
+        if targets:
+            self.send_sockets(targets, json_d)
+
+    def resume(self, app_key, channel, mid, mids=None):
+        """
+        Retrieves the events sent to the channel after the one with
+        the provided mid, using only the in-memory ring buffer, so that
+        they can be replayed to a client resuming its subscription.
+
+        As the events of a personal channel are sent through its alias
+        channels, each of them is resumed from its own mid (mids map),
+        the personal channel is only resumed if all of them are.
+
+        :type app_key: String
+        :param app_key: The key of the app that owns the channel.
+        :type channel: String
+        :param channel: The name of the channel being resumed.
+        :type mid: String
+        :param mid: The identifier of the last event seen by the client.
+        :type mids: Dictionary
+        :param mids: The identifiers of the last events seen by the client
+        in each of the alias channels (personal channels only).
+        :rtype: List
+        :return: The events missed by the client or an invalid value in
+        case the gap is no longer available in memory.
+        """
+
+        state = self.get_state(app_key=app_key)
+        if not channel.startswith("personal-"):
+            return self.ring.since((state.app_id, channel), mid)
+
+        events = []
+        mids = mids or {}
+        for alias in self.get_alias(app_key, channel):
+            _mid = mids.get(alias, None)
+            since = self.ring.since((state.app_id, alias), _mid) if _mid else None
+            if since == None:
+                return None
+            events.extend(since)
+        return events
+
+    def get_invalid(self, key):
+        """
+        Retrieves the invalid map associated with the trigger identified
+        by the provided key, creating a new one if required.
+
+        The number of maps kept is bounded as there's no message marking
+        the end of a trigger, the older ones are discarded first.
+
+        :type key: String
+        :param key: The key that identifies the trigger of the event.
+        :rtype: Dictionary
+        :return: The invalid map (sockets already sent) of the trigger.
+        """
+
+        invalid = self.invalids.get(key, None) if key else None
+        if not invalid == None:
+            return invalid
+
+        invalid = dict()
+        if key:
+            self.invalids[key] = invalid
+        while len(self.invalids) > INVALID_COUNT:
+            self.invalids.popitem(last=False)
+        return invalid
+
     def send_socket(self, socket_id, json_d):
         self.server.send_socket(socket_id, json_d)
 
+    def send_sockets(self, socket_ids, json_d):
+        self.server.send_sockets(socket_ids, json_d)
+
     def get_state(self, app_id=None, app_key=None):
         # sets the initial value of the state value as invalid so
         # that by default the returned value is invalid
@@ -1082,17 +2129,73 @@ class State(appier.Mongo):
         # (this state object has just been created)
         return state
 
-    def get_channel(self, app_key, channel, skip=0, count=10, limit=True):
-        members = self.get_members(app_key, channel)
+    def get_channel(self, app_key, channel, skip=0, count=10, limit=True, members=True):
         alias = self.get_alias(app_key, channel)
         events = self.get_events(app_key, channel, skip=skip, count=count, limit=limit)
-        return dict(name=channel, members=members, alias=alias, events=events)
+        data = dict(name=channel, alias=alias, events=events)
+        if members:
+            data["members"] = self.get_members(app_key, channel)
+        return data
 
     def get_members(self, app_key, channel):
         state = self.get_state(app_key=app_key)
-        info = state.channel_info.get(channel, {})
-        members = info.get("members", {})
-        return members
+        info = state.channel_info.get(channel, None)
+        if not info:
+            return {}
+        return dict(
+            (user_id, member.channel_data) for user_id, member in info.members.items()
+        )
+
+    def get_members_s(self, app_key, channel, skip=0, count=0):
+        """
+        Retrieves the JSON encoded map of members of the presence channel
+        (or a page of it), the encoded map is cached in the channel record
+        until the membership of the channel changes, so that the joining
+        connections share the same encoding of the members.
+
+        :type app_key: String
+        :param app_key: The key of the app of the channel.
+        :type channel: String
+        :param channel: The name of the presence channel.
+        :type skip: int
+        :param skip: The number of members to be skipped (page offset).
+        :type count: int
+        :param count: The maximum number of members of the page, zero
+        means the complete set of members.
+        :rtype: String
+        :return: The JSON encoded map associating the user identifiers
+        with their channel data.
+        """
+
+        state = self.get_state(app_key=app_key)
+        info = state.channel_info.get(channel, None)
+        if not info:
+            return "{}"
+
+        # tries to retrieve the page from the cache of the channel, bounding
+        # the number of pages cached (as they're requested by the clients)
+        key = (skip, count)
+        if info.encoded == None or len(info.encoded) >= MEMBERS_PAGES:
+            info.encoded = dict()
+        members_s = info.encoded.get(key, None)
+        if not members_s == None:
+            return members_s
+
+        items = itertools.islice(
+            info.members.items(), skip, skip + count if count else None
+        )
+        members_s = json.dumps(
+            collections.OrderedDict(
+                (user_id, member.channel_data) for user_id, member in items
+            )
+        )
+        info.encoded[key] = members_s
+        return members_s
+
+    def get_member_count(self, app_key, channel):
+        state = self.get_state(app_key=app_key)
+        info = state.channel_info.get(channel, None)
+        return info.user_count if info else 0
 
     def get_alias(self, app_key, channel):
         state = self.get_state(app_key=app_key)
@@ -1107,6 +2210,9 @@ class State(appier.Mongo):
         if not is_personal and limit:
             return []
 
+        if map and self.history.count > 0:
+            return self.get_events_cached(app_key, channel, skip=skip, count=count)
+
         if is_personal:
             return self.get_events_personal(
                 app_key, channel, skip=skip, count=count, map=map
@@ -1116,6 +2222,72 @@ class State(appier.Mongo):
                 app_key, channel, skip=skip, count=count, map=map
             )
 
+    def get_events_cached(self, app_key, channel, skip=0, count=10):
+        """
+        Retrieves the (mapped) events of the channel using the history
+        cache, in case of a miss the newest events are loaded from the
+        data source into the cache (as long as the page fits in it).
+
+        :type app_key: String
+        :param app_key: The key of the app that owns the channel.
+        :type channel: String
+        :param channel: The name of the channel to retrieve the events.
+        :type skip: int
+        :param skip: The number of (newest) events to be skipped.
+        :type count: int
+        :param count: The maximum number of events to be retrieved.
+        :rtype: List
+        :return: The events of the channel, from the newest to the oldest.
+        """
+
+        is_personal = channel.startswith("personal-")
+        method = self.get_events_personal if is_personal else self.get_events_global
+
+        app_id = self.app_key_to_app_id(app_key)
+        key = (app_id, channel)
+        events = self.history.get(key, skip=skip, count=count)
+        if not events == None:
+            self.metric_history.inc("hit")
+            return events
+
+        self.metric_history.inc("miss")
+        if skip + count > self.history.count:
+            return method(app_key, channel, skip=skip, count=count)
+
+        # the version of the channel is retrieved before the read so that
+        # the fill is discarded in case an event was persisted meanwhile
+        version = self.history.version(key)
+        events = method(app_key, channel, count=self.history.count)
+        self.history.fill(key, events, version=version)
+        return events[skip : skip + count]
+
+    def add_history(self, app_id, channels, event):
+        """
+        Adds the persisted event to the history cache of the provided
+        channels, relaying it to the workers (if any) as they serve the
+        history of the channels from their own cache.
+
+        :type app_id: String
+        :param app_id: The identifier of the app that owns the channels.
+        :type channels: List
+        :param channels: The channels that have received the event.
+        :type event: PushiEvent
+        :param event: The event that has just been persisted.
+        """
+
+        if self.history.count < 1:
+            return
+
+        event = event.map()
+        event.pop("_id", None)
+        for channel in channels:
+            self.history.add((app_id, channel), event)
+
+        if self.worker == None and self.bus:
+            self.bus.publish(
+                dict(type="history", app_id=app_id, channels=channels, event=event)
+            )
+
     def get_events_global(self, app_key, channel, skip=0, count=10, map=True):
         app_id = self.app_key_to_app_id(app_key)
         events = pushi.PushiEvent.find(
@@ -1148,12 +2320,110 @@ class State(appier.Mongo):
         return events
 
     def get_app(self, app_id=None, app_key=None, raise_e=True):
+        # tries to retrieve the app from the (in-process) cache, avoiding
+        # a round-trip to the data source on the hot paths (eg: handlers)
+        app = self.apps.get(app_id=app_id, app_key=app_key)
+        if app:
+            self.metric_apps.inc("hit")
+            return app
+
+        # in case the app is known not to exist (negative entry, eg: an
+        # invalid key) the data source is not queried again for a while
+        if self.apps.is_missing(app_id=app_id, app_key=app_key):
+            self.metric_apps.inc("hit")
+            if raise_e:
+                raise appier.NotFoundError(message="App not found", code=404)
+            return None
+
+        self.metric_apps.inc("miss")
+
+        # retrieves the app from the data source and adds it to the cache,
+        # the generation prevents a concurrent update from being overridden
+        # by the (possibly stale) app that has just been retrieved
+        generation = self.apps.generation
         if app_id:
             app = pushi.App.get(ident=app_id, raise_e=raise_e)
         if app_key:
             app = pushi.App.get(key=app_key, raise_e=raise_e)
+        if app:
+            self.apps.put(app, generation=generation)
+        else:
+            self.apps.put_missing(app_id=app_id, app_key=app_key, generation=generation)
         return app
 
+    def invalidate_app(self, app_id=None, app_key=None):
+        """
+        Invalidates the cached app record for the provided identifier
+        and key values, so that the next lookup retrieves it from the
+        data source, should be called upon any change of the app.
+
+        :type app_id: String
+        :param app_id: The identifier of the app to be invalidated.
+        :type app_key: String
+        :param app_key: The key of the app to be invalidated.
+        """
+
+        self.apps.invalidate(app_id=app_id, app_key=app_key)
+
+    def get_settings(self, app_key):
+        """
+        Retrieves the map of connection settings defined for the app
+        with the provided key, only the settings that are set in the
+        app are returned so that the server defaults apply otherwise.
+
+        :type app_key: String
+        :param app_key: The key of the app to retrieve the settings.
+        :rtype: Dictionary
+        :return: The map containing the settings defined for the app.
+        """
+
+        app = self.get_app(app_key=app_key, raise_e=False)
+        return self.build_settings(app)
+
+    def get_settings_cached(self, app_key):
+        """
+        Retrieves the map of connection settings of the app with the
+        provided key only in case the app is cached (no query to the
+        data source is performed), to be used in the event loop.
+
+        :type app_key: String
+        :param app_key: The key of the app to retrieve the settings.
+        :rtype: Dictionary
+        :return: The map containing the settings defined for the app or
+        an invalid value in case the app is not cached.
+        """
+
+        app = self.apps.get(app_key=app_key)
+        if app:
+            return self.build_settings(app)
+        if self.apps.is_missing(app_key=app_key):
+            return dict()
+        return None
+
+    def build_settings(self, app):
+        settings = dict()
+        if not app:
+            return settings
+        for name in (
+            "queue_bytes",
+            "queue_messages",
+            "queue_policy",
+            "coalesce",
+            "coalesce_channels",
+            "conflate_channels",
+            "max_connections",
+            "members_limit",
+            "connection_rate",
+            "connection_burst",
+            "message_rate",
+            "message_burst",
+        ):
+            value = getattr(app, name, None)
+            if value in (None, ""):
+                continue
+            settings[name] = value
+        return settings
+
     def has_app(self, app_id=None, app_key=None):
         # verifies if state is currently defined for the
         # provided app values and if that's the case returns
@@ -1246,6 +2516,13 @@ class State(appier.Mongo):
             raise RuntimeError("Invalid signature")
 
     def verify_presence(self, app_id, socket_id, channel):
+        # the peer channels are only subscribed once addressed, so the
+        # channel is opened in case it's a peer one and it's the first
+        # time it's addressed (eg: the owner is its first sender), note
+        # that it's only opened in case the owner is one of its users
+        if channel.startswith("peer-"):
+            self.open_peer(app_id, channel, socket_id=socket_id)
+
         state = self.get_state(app_id=app_id)
         channels = state.socket_channels.get(socket_id, [])
         if not channel in channels:
@@ -1253,6 +2530,46 @@ class State(appier.Mongo):
                 "Socket '%s' is not allowed for '%s'" % (socket_id, channel)
             )
 
+    def is_local(self, channel):
+        # verifies if the channel is a presence one (or a peer one) and
+        # the process only holds part of the connections, either as a
+        # worker or as a node of a cluster (connected through a broker)
+        is_presence = channel.startswith("presence-") or channel.startswith("peer-")
+        is_partial = not self.worker == None or bool(self.broker)
+        return is_presence and is_partial
+
+    def get_route(self, channel):
+        # the events of the peer channels are routed (in the cluster) as
+        # events of their presence channel, as the nodes only open the peer
+        # channels (and so become interested in them) once they're addressed
+        if channel.startswith("peer-"):
+            return self.get_peer(channel)[0]
+        return channel
+
+    def get_type(self, channel):
+        for prefix in CHANNEL_TYPES:
+            if channel.startswith(prefix + "-"):
+                return prefix
+        return "public"
+
+    def get_connections(self):
+        connections = dict()
+        if not self.server:
+            return connections
+        for app_key, count in list(self.server.app_sockets.items()):
+            state = self.app_key_state.get(app_key, None)
+            connections[state.app_id if state else app_key] = count
+        return connections
+
+    def get_depth(self):
+        # the depth of the delayed queues is the number of operations
+        # added but not yet started (kept under lock) and the one of
+        # the hand-off queue is the length of the queue itself
+        with self.pending_lock:
+            depth = dict(self.pending)
+        depth["handoff"] = len(self.handoff_queue)
+        return depth
+
     def app_id_to_app_key(self, app_id):
         state = self.get_state(app_id=app_id)
         return state.app_key
@@ -1330,9 +2647,13 @@ class State(appier.Mongo):
 
 
 if __name__ == "__main__":
+    SERVER_BACKEND = os.environ.get("SERVER_BACKEND", "netius")
     state = State()
     app = pushi.PushiApp(state)
-    server = pushi.PushiServer(state)
+    if SERVER_BACKEND == "asyncio":
+        server = pushi.AsyncioServer(state)
+    else:
+        server = pushi.PushiServer(state)
     state.load(app, server)
 else:
     __path__ = []
@@ -203,8 +203,9 @@ class WebHandler(handler.Handler):
 
         return dict(success=True, urls=sent_urls, method=method)
 
-    def load(self):
-        subs = pushi.Web.find()
+    def load(self, subs=None):
+        if subs == None:
+            subs = pushi.Web.find()
         for sub in subs:
             app_id = sub.app_id
             url = sub.url
@@ -214,7 +215,8 @@ class WebHandler(handler.Handler):
     def add(self, app_id, url, event):
         events = self.subs.get(app_id, {})
         urls = events.get(event, [])
-        urls.append(url)
+        if not url in urls:
+            urls.append(url)
         events[event] = urls
         self.subs[app_id] = events
 
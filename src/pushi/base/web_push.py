@@ -358,16 +358,21 @@ class WebPushHandler(handler.Handler):
 
         return dict(success=True, endpoints=sent_endpoints)
 
-    def load(self):
+    def load(self, subs=None):
         """
         Loads all Web Push subscriptions from the database and
         populates the in-memory subscription map.
 
         Called during handler initialization to preload subscriptions
         into memory for fast lookup during message sending.
+
+        :type subs: List
+        :param subs: The subscriptions to be loaded, if not provided
+        the complete set of subscriptions is loaded from the database.
         """
 
-        subs = pushi.WebPush.find()
+        if subs == None:
+            subs = pushi.WebPush.find()
         for sub in subs:
             app_id = sub.app_id
             subscription_id = sub.id
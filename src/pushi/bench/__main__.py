@@ -0,0 +1,82 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import sys
+import json
+
+import appier
+
+from . import backend
+from . import base
+from . import binary
+from . import deflate
+from . import e2e
+from . import fanout
+from . import inbound
+from . import memory
+from . import peer
+from . import subscribe
+from . import trigger
+
+E2E_KWARGS = dict(
+    connections=appier.conf("BENCH_CONNECTIONS", 100, cast=int),
+    channels=appier.conf("BENCH_CHANNELS", 10, cast=int),
+    events=appier.conf("BENCH_EVENTS", 1000, cast=int),
+    size=appier.conf("BENCH_SIZE", 64, cast=int),
+    persist=appier.conf("BENCH_PERSIST", False, cast=bool),
+    mongo=appier.conf("BENCH_MONGO", None),
+)
+""" The parameters of the end-to-end benchmarks, set using
+the `BENCH_*` configuration values """
+
+BENCHES = dict(
+    backend=lambda: backend.run(**E2E_KWARGS),
+    binary=binary.run,
+    deflate=deflate.run,
+    e2e=lambda: e2e.run(backend=appier.conf("BENCH_BACKEND", "netius"), **E2E_KWARGS),
+    fanout=fanout.run,
+    inbound=inbound.run,
+    memory=memory.run,
+    peer=peer.run,
+    subscribe=subscribe.run,
+    trigger=trigger.run,
+)
+""" The map associating the name of each benchmark with the
+callable that runs it """
+
+names = sys.argv[1:] or sorted(BENCHES.keys())
+results = [BENCHES[name]() for name in names]
+
+output = appier.conf("BENCH_OUTPUT", None)
+if output:
+    with open(output, "w") as file:
+        json.dump(results, file, indent=4)
+else:
+    base.dump(results)
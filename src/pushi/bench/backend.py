@@ -0,0 +1,69 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import multiprocessing
+
+from . import base
+from . import e2e
+
+
+def measure(queue, backend, kwargs):
+    queue.put(e2e.run(backend=backend, **kwargs))
+
+
+def run(backends=("netius", "asyncio"), **kwargs):
+    """
+    Runs the end-to-end benchmark for each of the server backends,
+    side by side and with the same parameters, so that they can be
+    compared in throughput, latency and memory per connection.
+
+    :type backends: Tuple
+    :param backends: The names of the backends to be measured.
+    :rtype: Dictionary
+    :return: The results of the end-to-end benchmark per backend.
+    """
+
+    # each backend is measured in its own process so that the (client)
+    # event loop and the memory of one run do not affect the other one
+    results = []
+    for backend in backends:
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=measure, args=(queue, backend, kwargs))
+        process.start()
+        results.append(queue.get())
+        process.join()
+
+    return dict(name="backend", results=results)
+
+
+if __name__ == "__main__":
+    base.dump(run())
+else:
+    __path__ = []
@@ -0,0 +1,107 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import time
+import json
+
+import netius
+
+import pushi
+
+timer = getattr(time, "process_time", time.time)
+""" The timer function to be used in the measurement of the
+CPU time spent in the benchmarks, falls back to the wall time
+in case the process time is not available (eg: Python 2) """
+
+
+class BenchConnection(pushi.PushiConnection):
+    """
+    Connection to be used in benchmarks, no socket is associated
+    with it and the data that is sent is discarded, only the amount
+    of bytes (that would be on the wire) is accounted.
+    """
+
+    def __init__(self, *args, **kwargs):
+        pushi.PushiConnection.__init__(self, *args, **kwargs)
+        self.status = netius.OPEN
+        self.sent_bytes = 0
+
+    def send(self, data, *args, **kwargs):
+        data_l = len(data)
+        self.sent_bytes += data_l
+        return data_l
+
+
+class BenchServer(pushi.PushiServer):
+    def build_connection(self, socket, address, ssl=False):
+        return BenchConnection(self, socket, address, ssl=ssl)
+
+
+def build_server(count, state=None):
+    """
+    Builds a server with the provided number of (fake) connections
+    registered in it, ready to be used in fan-out benchmarks.
+
+    :type count: int
+    :param count: The number of connections to be registered.
+    :type state: State
+    :param state: The optional state to be associated with the server.
+    :rtype: BenchServer
+    :return: The server with the connections registered.
+    """
+
+    server = BenchServer(state=state)
+    for index in range(count):
+        connection = server.build_connection(None, ("127.0.0.1", index))
+        server.sockets[connection.socket_id] = connection
+    return server
+
+
+def measure(callable, iterations=10):
+    """
+    Measures the average CPU time (in seconds) taken by the provided
+    callable, running it the provided number of iterations.
+
+    :type callable: Function
+    :param callable: The callable to be measured.
+    :type iterations: int
+    :param iterations: The number of times the callable is run.
+    :rtype: float
+    :return: The average CPU time per call in seconds.
+    """
+
+    start = timer()
+    for _index in range(iterations):
+        callable()
+    return (timer() - start) / float(iterations)
+
+
+def dump(result):
+    print(json.dumps(result, indent=4))
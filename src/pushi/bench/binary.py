@@ -0,0 +1,106 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import json
+
+import netius
+
+import pushi
+
+from . import base
+from . import deflate
+
+
+def run(sizes=(32, 128, 512, 2048, 8192), iterations=1000):
+    """
+    Runs the binary subprotocol benchmark comparing for each payload
+    size the frame size and the encode (server) and decode (client)
+    CPU cost of the JSON text frames against the MessagePack ones.
+
+    :type sizes: Tuple
+    :param sizes: The various payload sizes to be measured.
+    :type iterations: int
+    :param iterations: The number of messages encoded/decoded per
+    measurement.
+    :rtype: Dictionary
+    :return: The results of the benchmark for each payload size.
+    """
+
+    if not pushi.net.server.msgpack:
+        raise netius.NetiusError("MessagePack not available for benchmark")
+
+    results = []
+
+    for size in sizes:
+        json_d = dict(event="tick", channel="prices", data=deflate.build_payload(size))
+        message = pushi.PushiMessage(json_d)
+        text = message.data()
+        packed = pushi.net.server.encode_binary(json_d)
+
+        # the text decode includes the (nested) decoding of the data
+        # document, as that's what the clients are required to do
+        def decode_text():
+            json_d = json.loads(text)
+            json.loads(json_d["data"])
+
+        text_encode_t = base.measure(
+            lambda: pushi.PushiMessage(json_d).frame(), iterations=iterations
+        )
+        binary_encode_t = base.measure(
+            lambda: pushi.PushiMessage(json_d).binary(), iterations=iterations
+        )
+        text_decode_t = base.measure(decode_text, iterations=iterations)
+        binary_decode_t = base.measure(
+            lambda: pushi.net.server.decode_binary(packed), iterations=iterations
+        )
+
+        text_b = len(message.frame())
+        binary_b = len(message.binary())
+
+        results.append(
+            dict(
+                size=len(text),
+                text_bytes=text_b,
+                binary_bytes=binary_b,
+                binary_ratio=round(binary_b / float(text_b), 3),
+                text_encode_us=round(text_encode_t * 1000000.0, 3),
+                binary_encode_us=round(binary_encode_t * 1000000.0, 3),
+                text_decode_us=round(text_decode_t * 1000000.0, 3),
+                binary_decode_us=round(binary_decode_t * 1000000.0, 3),
+            )
+        )
+
+    return dict(name="binary", iterations=iterations, results=results)
+
+
+if __name__ == "__main__":
+    base.dump(run())
+else:
+    __path__ = []
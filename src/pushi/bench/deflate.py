@@ -0,0 +1,144 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import json
+import zlib
+
+from . import base
+
+
+def build_payload(size):
+    """
+    Builds a JSON payload (of approximately the provided size) with the
+    typical repetitive structure of the events sent through the channels.
+
+    :type size: int
+    :param size: The approximate size in bytes of the payload.
+    :rtype: String
+    :return: The JSON serialized payload.
+    """
+
+    items = []
+    index = 0
+    while len(json.dumps(items)) < size:
+        items.append(
+            dict(
+                symbol="SYM%d" % (index % 16),
+                price=100.0 + index * 0.25,
+                volume=1000 + index * 7,
+                status="active",
+            )
+        )
+        index += 1
+    return json.dumps(items)
+
+
+def configure(server, deflate=True, takeover=False):
+    for connection in server.sockets.values():
+        connection.deflate = deflate
+        connection.deflater = (
+            zlib.compressobj(server.deflate_level, zlib.DEFLATED, -15)
+            if takeover
+            else None
+        )
+        connection.sent_bytes = 0
+
+
+def run(sizes=(32, 128, 512, 2048, 8192), subscribers=1000, iterations=10):
+    """
+    Runs the permessage-deflate benchmark measuring for each payload
+    size the bytes on the wire and the fan-out CPU cost of the plain
+    frames, the shared (no context takeover) compressed frames and
+    the per connection (context takeover) compressed frames.
+
+    :type sizes: Tuple
+    :param sizes: The various payload sizes to be measured.
+    :type subscribers: int
+    :param subscribers: The number of subscribers in the fan-out.
+    :type iterations: int
+    :param iterations: The number of events sent per measurement.
+    :rtype: Dictionary
+    :return: The results of the benchmark for each payload size.
+    """
+
+    results = []
+
+    for size in sizes:
+        json_d = dict(event="tick", channel="prices", data=build_payload(size))
+
+        server = base.build_server(subscribers)
+        server.deflate_min = 0
+        socket_ids = list(server.sockets.keys())
+
+        def fanout():
+            server.send_sockets(socket_ids, json_d)
+
+        # measures the plain (uncompressed) frames, the shared compressed
+        # frames and the per connection compressed frames, configuring
+        # the connections accordingly before each of the measurements
+        configure(server, deflate=False)
+        plain_t = base.measure(fanout, iterations=iterations)
+        configure(server, deflate=True)
+        shared_t = base.measure(fanout, iterations=iterations)
+        configure(server, deflate=True, takeover=True)
+        takeover_t = base.measure(fanout, iterations=iterations)
+        takeover_b = sum(c.sent_bytes for c in server.sockets.values())
+
+        message = server.send_sockets([], json_d)
+        plain_b = len(message.frame())
+        shared_b = len(message.deflated(level=server.deflate_level))
+        takeover_b = takeover_b / float(subscribers * iterations)
+
+        results.append(
+            dict(
+                size=len(message.data()),
+                plain_bytes=plain_b,
+                shared_bytes=shared_b,
+                takeover_bytes=round(takeover_b, 1),
+                shared_ratio=round(shared_b / float(plain_b), 3),
+                takeover_ratio=round(takeover_b / float(plain_b), 3),
+                plain_ms=round(plain_t * 1000.0, 3),
+                shared_ms=round(shared_t * 1000.0, 3),
+                takeover_ms=round(takeover_t * 1000.0, 3),
+            )
+        )
+
+    return dict(
+        name="deflate",
+        subscribers=subscribers,
+        iterations=iterations,
+        results=results,
+    )
+
+
+if __name__ == "__main__":
+    base.dump(run())
+else:
+    __path__ = []
@@ -0,0 +1,315 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import os
+import sys
+import json
+import time
+import socket
+import threading
+import multiprocessing
+
+import appier
+import netius
+
+import pushi
+
+from . import base
+
+
+def serve(app_port, server_port, backend="netius", mongo=None):
+    """
+    Runs a complete pushi infra-structure (state, app and server) in
+    the current process, using an in-memory data source unless a Mongo
+    URL is provided, blocking the current thread forever.
+
+    :type app_port: int
+    :param app_port: The port to be used by the HTTP app.
+    :type server_port: int
+    :param server_port: The port to be used by the WebSocket server.
+    :type backend: String
+    :param backend: The backend of the server (netius or asyncio).
+    :type mongo: String
+    :param mongo: The URL of the Mongo server to be used, if any.
+    """
+
+    if mongo:
+        appier.conf_s("MONGOHQ_URL", mongo)
+    else:
+        appier.conf_s("ADAPTER", "tiny")
+        appier.conf_s("TINY_STORAGE", "memory")
+    appier.conf_s("PUSHI_HANDLERS", False)
+    os.environ["APP_PORT"] = str(app_port)
+    os.environ["SERVER_PORT"] = str(server_port)
+
+    state = pushi.State()
+    app = pushi.PushiApp(state)
+    if backend == "asyncio":
+        server = pushi.AsyncioServer(state)
+    else:
+        server = pushi.PushiServer(state)
+    state.load(app, server)
+
+    while True:
+        time.sleep(1.0)
+
+
+def run(
+    connections=100,
+    channels=10,
+    events=1000,
+    size=64,
+    persist=False,
+    backend="netius",
+    mongo=None,
+):
+    """
+    Runs the end-to-end benchmark, starting a local pushi infra-structure
+    in a child process, opening the provided number of (Python) clients
+    subscribed across the channels and triggering the events through
+    the HTTP API, measuring the time from the trigger to the reception.
+
+    The memory per connection is the growth of the resident memory of
+    the server process while the connections are opened, only available
+    on platforms exposing it (`/proc`).
+
+    :type connections: int
+    :param connections: The number of clients to be connected.
+    :type channels: int
+    :param channels: The number of channels the clients are spread on.
+    :type events: int
+    :param events: The number of events to be triggered.
+    :type size: int
+    :param size: The size in bytes of the padding of each event.
+    :type persist: bool
+    :param persist: If the events should be persisted in the data source.
+    :type backend: String
+    :param backend: The backend of the server (netius or asyncio).
+    :type mongo: String
+    :param mongo: The URL of the Mongo server to be used, by default an
+    in-memory data source is used instead.
+    :rtype: Dictionary
+    :return: The results of the benchmark.
+    """
+
+    # the in-memory data source is only safe for the app thread, as
+    # such the persistence of the events (delayed) requires Mongo
+    if persist and not mongo:
+        raise RuntimeError("Persistence requires a Mongo server")
+
+    app_port, server_port = _port(), _port()
+    process = multiprocessing.Process(
+        target=serve,
+        args=(app_port, server_port),
+        kwargs=dict(backend=backend, mongo=mongo),
+    )
+    process.daemon = True
+    process.start()
+
+    try:
+        _wait(app_port, process)
+        _wait(server_port, process)
+
+        # creates the app to be used in the benchmark using the HTTP API
+        # so that all the data source access is made by the app thread
+        api = pushi.API(base_url="http://127.0.0.1:%d/" % app_port)
+        app_m = api.create_app("bench-%d" % int(time.time()))
+        api.app_id = app_m["ident"]
+        api.app_key = app_m["key"]
+        api.app_secret = app_m["secret"]
+
+        result = _bench(
+            api, process.pid, server_port, connections, channels, events, size, persist
+        )
+    finally:
+        process.terminate()
+        process.join()
+
+    return dict(
+        name="e2e",
+        timestamp=int(time.time()),
+        python=sys.version.split(" ")[0],
+        connections=connections,
+        channels=channels,
+        events=events,
+        size=size,
+        persist=persist,
+        backend=backend,
+        **result
+    )
+
+
+def _bench(api, pid, port, connections, channels, events, size, persist, timeout=60.0):
+    # creates the complete set of clients in the same event loop, each
+    # subscribing one of the channels (round robin), once every client
+    # is subscribed the events are triggered through the HTTP API in a
+    # separate thread (blocking calls) while the loop receives them, the
+    # sending time is carried in the data for the latency measurement
+    state = dict(loop=None, subscribed=0, latencies=[], triggered=None)
+    url = "ws://127.0.0.1:%d/" % port
+    padding = "x" * size
+    subscribers = [
+        len(range(index, connections, channels)) for index in range(channels)
+    ]
+    expected = sum(subscribers[index % channels] for index in range(events))
+    memory_s = _memory(pid)
+
+    def on_message(protocol, data, channel, mid=None, timestamp=None):
+        state["latencies"].append(time.time() - json.loads(data)["time"])
+
+    def on_subscribe(channel, data):
+        state["subscribed"] += 1
+
+    def on_connect(protocol):
+        channel = "bench-%d" % (protocol.index % channels)
+        protocol.subscribe_pushi(channel, callback=on_subscribe)
+
+    def trigger():
+        for index in range(events):
+            data = json.dumps(dict(time=time.time(), padding=padding))
+            api.trigger_event(
+                channel="bench-%d" % (index % channels),
+                data=data,
+                event="bench",
+                persist=persist,
+            )
+        state["triggered"] = time.time()
+
+    protocols = []
+    for index in range(connections):
+        loop, protocol = pushi.PushiClient.connect_pushi_s(
+            url=url,
+            client_key=api.app_key,
+            reconnect=False,
+            callback=on_connect,
+            loop=state["loop"],
+        )
+        protocol.index = index
+        protocol.bind("bench", on_message)
+        protocols.append(protocol)
+        state["loop"] = loop
+
+    loop = netius.compat_loop(state["loop"])
+    expire = time.time() + timeout
+
+    def verify():
+        if time.time() > expire:
+            loop.stop()
+            return
+
+        if not "start" in state and state["subscribed"] >= connections:
+            state["memory"] = _memory(pid)
+            state["start"] = time.time()
+            thread = threading.Thread(target=trigger)
+            thread.daemon = True
+            thread.start()
+
+        if len(state["latencies"]) >= expected:
+            state["end"] = time.time()
+            loop.stop()
+            return
+
+        loop.call_later(0.01, verify)
+
+    loop.call_soon(verify)
+    loop.run_forever()
+
+    for protocol in protocols:
+        protocol.close()
+
+    start = state.get("start", None)
+    end = state.get("end", time.time())
+    triggered = state["triggered"]
+    memory_e = state.get("memory", None)
+    latencies = sorted(state["latencies"])
+
+    return dict(
+        expected=expected,
+        received=len(latencies),
+        trigger_rate=int(events / (triggered - start)) if triggered else None,
+        throughput=int(len(latencies) / (end - start)) if start else None,
+        latency_ms=dict(
+            p50=_percentile(latencies, 0.5),
+            p99=_percentile(latencies, 0.99),
+            p999=_percentile(latencies, 0.999),
+            max=_percentile(latencies, 1.0),
+        ),
+        memory_connection=(
+            int((memory_e - memory_s) / connections)
+            if memory_s and memory_e and connections
+            else None
+        ),
+    )
+
+
+def _percentile(values, ratio):
+    if not values:
+        return None
+    index = min(int(len(values) * ratio), len(values) - 1)
+    return round(values[index] * 1000.0, 3)
+
+
+def _memory(pid):
+    # retrieves the resident memory (in bytes) of the process, using
+    # the proc filesystem, not available on every platform
+    path = "/proc/%d/statm" % pid
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as file:
+        pages = int(file.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def _port():
+    _socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        _socket.bind(("127.0.0.1", 0))
+        return _socket.getsockname()[1]
+    finally:
+        _socket.close()
+
+
+def _wait(port, process, timeout=30.0):
+    # waits for the port to be accepting connections, failing immediately
+    # in case the process exits before (eg: data source not available)
+    expire = time.time() + timeout
+    while time.time() < expire and process.is_alive():
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1.0).close()
+            return
+        except socket.error:
+            time.sleep(0.1)
+    raise RuntimeError("Port %d not available" % port)
+
+
+if __name__ == "__main__":
+    base.dump(run())
+else:
+    __path__ = []
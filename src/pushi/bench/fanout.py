@@ -0,0 +1,86 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import json
+
+from . import base
+
+
+def run(counts=(100, 1000, 10000, 20000), iterations=10, size=256):
+    """
+    Runs the fan-out benchmark comparing the per event CPU cost of
+    the legacy path (one JSON encode and one frame per subscriber)
+    with the shared path (one JSON encode and one frame per event).
+
+    :type counts: Tuple
+    :param counts: The various subscriber counts to be measured.
+    :type iterations: int
+    :param iterations: The number of events sent per measurement.
+    :type size: int
+    :param size: The size in bytes of the data of the event.
+    :rtype: Dictionary
+    :return: The results of the benchmark for each subscriber count.
+    """
+
+    json_d = dict(event="message", channel="global", data="x" * size)
+    results = []
+
+    for count in counts:
+        server = base.build_server(count)
+        socket_ids = list(server.sockets.keys())
+
+        def legacy():
+            for socket_id in socket_ids:
+                connection = server.sockets[socket_id]
+                connection.send_ws(json.dumps(json_d))
+
+        def shared():
+            server.send_sockets(socket_ids, json_d)
+
+        legacy_t = base.measure(legacy, iterations=iterations)
+        shared_t = base.measure(shared, iterations=iterations)
+
+        results.append(
+            dict(
+                subscribers=count,
+                legacy_ms=round(legacy_t * 1000.0, 3),
+                shared_ms=round(shared_t * 1000.0, 3),
+                shared_ns_socket=round(shared_t * 1e9 / count, 1),
+                speedup=round(legacy_t / shared_t, 2) if shared_t else None,
+            )
+        )
+
+    return dict(name="fanout", size=size, iterations=iterations, results=results)
+
+
+if __name__ == "__main__":
+    base.dump(run())
+else:
+    __path__ = []
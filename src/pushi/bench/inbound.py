@@ -0,0 +1,110 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import json
+
+import pushi
+
+from . import base
+
+
+def dispatch_legacy(server, connection, data):
+    """
+    Dispatches the inbound message using the legacy (per message)
+    strategy, resolving the handler method from the name of the
+    event, used as the baseline of the benchmark.
+    """
+
+    json_d = json.loads(data.decode("utf-8"))
+    event = json_d.get("event", None)
+    event = event.replace(":", "_")
+
+    method_name = "handle_" + event
+    has_method = hasattr(server, method_name)
+    if has_method:
+        method = getattr(server, method_name)
+    else:
+        method = server.handle_event
+    method(connection, json_d)
+
+
+def run(iterations=100000):
+    """
+    Runs the inbound dispatch benchmark measuring the number of
+    (client) messages that are decoded and dispatched per second
+    on a single core, for both the legacy and the table strategies.
+
+    The handlers are replaced by no-op ones so that only the cost
+    of the decoding and of the dispatching is measured.
+
+    :type iterations: int
+    :param iterations: The number of messages dispatched per
+    measurement.
+    :rtype: Dictionary
+    :return: The results of the benchmark for each event.
+    """
+
+    server = base.BenchServer()
+    connection = server.build_connection(None, ("127.0.0.1", 0))
+    noop = lambda connection, json_d: None
+    server.handle_event = noop
+    server.handle_pusher_subscribe = noop
+    for event in pushi.PushiServer.HANDLERS:
+        server.register(event, noop)
+
+    results = []
+
+    for event in ("pusher:subscribe", "client-move"):
+        data = json.dumps(
+            dict(event=event, channel="global", data=dict(x=1, y=2))
+        ).encode("utf-8")
+
+        legacy_t = base.measure(
+            lambda: dispatch_legacy(server, connection, data), iterations=iterations
+        )
+        table_t = base.measure(
+            lambda: server.on_data_ws(connection, data), iterations=iterations
+        )
+
+        results.append(
+            dict(
+                event=event,
+                legacy_mps=int(1.0 / legacy_t) if legacy_t else None,
+                table_mps=int(1.0 / table_t) if table_t else None,
+            )
+        )
+
+    return dict(name="inbound", iterations=iterations, results=results)
+
+
+if __name__ == "__main__":
+    base.dump(run())
+else:
+    __path__ = []
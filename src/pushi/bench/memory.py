@@ -0,0 +1,118 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import gc
+import json
+
+import pushi
+
+from . import base
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def run(counts=(10000, 50000), members=10, devices=2):
+    """
+    Runs the memory benchmark measuring the bytes retained by the
+    state per presence subscription, with the subscriptions spread
+    over channels of `members` users each, connected from `devices`
+    sockets per user (sharing the same member record).
+
+    The subscription messages are decoded from JSON so that, as it
+    happens with the ones received from the wire, each one of them
+    carries its own copy of the channel name and channel data.
+
+    :type counts: Tuple
+    :param counts: The various subscription counts to be measured.
+    :type members: int
+    :param members: The number of users per presence channel.
+    :type devices: int
+    :param devices: The number of sockets per user.
+    :rtype: Dictionary
+    :return: The results of the benchmark for each subscription count.
+    """
+
+    if not tracemalloc:
+        raise RuntimeError("Memory benchmark requires tracemalloc")
+
+    results = []
+
+    for count in counts:
+        state = pushi.State()
+        app_state = pushi.AppState("app_id", "app_key")
+        state.app_id_state["app_id"] = app_state
+        state.app_key_state["app_key"] = app_state
+        state.server = base.build_server(count, state=state)
+        connections = list(state.server.sockets.values())
+
+        gc.collect()
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+
+        for index, connection in enumerate(connections):
+            user = index // devices
+            message = json.dumps(
+                dict(
+                    channel="presence-room-%d" % (user // members),
+                    channel_data=dict(user_id="user-%d" % user, name="User %d" % user),
+                )
+            )
+            data = json.loads(message)
+            state.subscribe(
+                connection,
+                "app_key",
+                connection.socket_id,
+                data["channel"],
+                channel_data=data["channel_data"],
+                force=True,
+            )
+
+        gc.collect()
+        used = tracemalloc.get_traced_memory()[0] - start
+        tracemalloc.stop()
+
+        results.append(
+            dict(
+                subscriptions=count,
+                bytes=used,
+                bytes_subscription=round(used / float(count), 1),
+            )
+        )
+
+    return dict(name="memory", members=members, devices=devices, results=results)
+
+
+if __name__ == "__main__":
+    base.dump(run())
+else:
+    __path__ = []
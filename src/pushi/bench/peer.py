@@ -0,0 +1,113 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import pushi
+
+from . import base
+
+
+def run(counts=(100, 500, 2000), iterations=50):
+    """
+    Runs the peer benchmark measuring the CPU cost of the joining of
+    a member to a peer enabled presence channel with a growing number
+    of members and the cost of addressing one of its peer channels
+    (eg: a direct message between two members).
+
+    As the peer channels are only created once addressed, the peer
+    subscriptions are expected to grow with the addressed channels
+    and not with the square of the number of members.
+
+    :type counts: Tuple
+    :param counts: The various member counts to be measured.
+    :type iterations: int
+    :param iterations: The number of peer channels addressed, must
+    not be greater than half of the smallest member count.
+    :rtype: Dictionary
+    :return: The results of the benchmark for each member count.
+    """
+
+    results = []
+
+    for count in counts:
+        state = pushi.State()
+        app_state = pushi.AppState("app_id", "app_key")
+        state.app_id_state["app_id"] = app_state
+        state.app_key_state["app_key"] = app_state
+        state.server = base.build_server(count, state=state)
+        connections = list(state.server.sockets.values())
+
+        def join():
+            for index, connection in enumerate(connections):
+                state.subscribe(
+                    connection,
+                    "app_key",
+                    connection.socket_id,
+                    "presence-room",
+                    channel_data=dict(user_id="user-%d" % index, peer=True),
+                    force=True,
+                )
+
+        join_t = base.measure(join, iterations=1)
+
+        def address():
+            for index in range(iterations):
+                peers = sorted(["user-%d" % index, "user-%d" % (index + count // 2)])
+                state.send_local(
+                    "app_id",
+                    "peer-room:" + "&".join(peers),
+                    dict(event="message", data="hello"),
+                )
+
+        address_t = base.measure(address, iterations=1)
+
+        peers = sum(
+            len(sockets)
+            for channel, sockets in state.get_state(
+                app_id="app_id"
+            ).channel_sockets.items()
+            if channel.startswith("peer-")
+        )
+
+        results.append(
+            dict(
+                members=count,
+                join_us_member=round(join_t * 1e6 / count, 1),
+                address_us=round(address_t * 1e6 / iterations, 1),
+                peer_subscriptions=peers,
+            )
+        )
+
+    return dict(name="peer", iterations=iterations, results=results)
+
+
+if __name__ == "__main__":
+    base.dump(run())
+else:
+    __path__ = []
@@ -0,0 +1,95 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import pushi
+
+from . import base
+
+
+def run(counts=(100, 1000, 10000, 50000), iterations=1000):
+    """
+    Runs the subscription benchmark measuring the CPU cost of the
+    subscribe and unsubscribe operations of a socket in a channel
+    with a growing number of subscribers, and the cost per socket
+    of draining the complete channel (eg: disconnect storm).
+
+    The cost of the operations is expected to stay flat as the
+    channel grows, as the indexes are O(1) membership structures.
+
+    :type counts: Tuple
+    :param counts: The various subscriber counts to be measured.
+    :type iterations: int
+    :param iterations: The number of subscribe and unsubscribe
+    operations run per measurement.
+    :rtype: Dictionary
+    :return: The results of the benchmark for each subscriber count.
+    """
+
+    results = []
+
+    for count in counts:
+        state = pushi.State()
+        app_state = pushi.AppState("app_id", "app_key")
+        state.app_id_state["app_id"] = app_state
+        state.app_key_state["app_key"] = app_state
+        state.server = base.build_server(count + 1, state=state)
+        connections = list(state.server.sockets.values())
+        connection, others = connections[0], connections[1:]
+
+        for other in others:
+            state.subscribe(other, "app_key", other.socket_id, "global")
+
+        def subscribe():
+            state.subscribe(connection, "app_key", connection.socket_id, "global")
+            state.unsubscribe(connection, "app_key", connection.socket_id, "global")
+
+        cycle_t = base.measure(subscribe, iterations=iterations)
+
+        def drain():
+            for other in others:
+                state.disconnect(other, "app_key", other.socket_id)
+
+        drain_t = base.measure(drain, iterations=1)
+
+        results.append(
+            dict(
+                subscribers=count,
+                cycle_ns=round(cycle_t * 1e9, 1),
+                drain_ns_socket=round(drain_t * 1e9 / count, 1),
+            )
+        )
+
+    return dict(name="subscribe", iterations=iterations, results=results)
+
+
+if __name__ == "__main__":
+    base.dump(run())
+else:
+    __path__ = []
@@ -0,0 +1,138 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+""" The license for the module """
+
+import time
+import logging
+
+import pushi
+
+from . import base
+
+
+class BenchOwner(object):
+    """
+    Web app (owner of the state) to be used in benchmarks, only
+    the logger used by the handlers is provided.
+    """
+
+    logger = logging.getLogger("pushi.bench")
+
+
+class BenchApp(object):
+    """
+    App record to be used in benchmarks, with the values that are
+    used by the handlers when sending an event (no APN, SMTP or
+    Web Push configuration).
+    """
+
+    def __init__(self, ident, key):
+        self.ident = ident
+        self.key = key
+        self.secret = "secret"
+        self.apn_key = None
+        self.apn_cer = None
+        self.apn_sandbox = False
+        self.smtp_url = None
+        self.vapid_key = None
+        self.vapid_email = None
+
+
+def run(events=1000, latency=0.0005, ttls=(0.0, 60.0)):
+    """
+    Runs the trigger benchmark measuring the (wall clock) number of
+    events triggered per second with the handlers (APN, SMTP, Web and
+    Web Push) enabled, with and without the caching of the app records.
+
+    The data source is replaced by a counted lookup that takes the
+    provided latency (round-trip) to resolve each app, so that the
+    number of queries per event is measured as well.
+
+    :type events: int
+    :param events: The number of events triggered per measurement.
+    :type latency: float
+    :param latency: The time in seconds taken by each app lookup.
+    :type ttls: Tuple
+    :param ttls: The TTL values of the app cache to be measured, zero
+    disables the cache (previous behaviour).
+    :rtype: Dictionary
+    :return: The results of the benchmark for each TTL value.
+    """
+
+    app = BenchApp("app_id", "app_key")
+    queries = [0]
+
+    def get(*args, **kwargs):
+        queries[0] += 1
+        time.sleep(latency)
+        return app
+
+    results = []
+    _get = pushi.App.get
+    pushi.App.get = get
+
+    try:
+        for ttl in ttls:
+            state = pushi.State()
+            state.app = BenchOwner()
+            state.apps = pushi.AppCache(ttl=ttl)
+            app_state = pushi.AppState("app_id", "app_key")
+            state.app_id_state["app_id"] = app_state
+            state.app_key_state["app_key"] = app_state
+            state.server = base.build_server(0, state=state)
+            state.load_handlers(load=False)
+            queries[0] = 0
+
+            start = time.time()
+            for _index in range(events):
+                state.trigger_c(
+                    "app_id", "global", "message", False, False, "hello", delayed=False
+                )
+            elapsed = time.time() - start
+            hits = state.metric_apps.values.get("hit", 0)
+
+            results.append(
+                dict(
+                    ttl=ttl,
+                    events_s=round(events / elapsed, 1) if elapsed else None,
+                    queries_event=round(queries[0] / float(events), 3),
+                    hit_rate=round(hits / float(hits + queries[0]), 3),
+                )
+            )
+    finally:
+        pushi.App.get = _get
+
+    return dict(name="trigger", events=events, latency=latency, results=results)
+
+
+if __name__ == "__main__":
+    base.dump(run())
+else:
+    __path__ = []
@@ -25,8 +25,14 @@ __copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
 __license__ = "Apache License, Version 2.0"
 """ The license for the module """
 
+from . import aio
+from . import bucket
 from . import client
 from . import server
+from . import wheel
 
+from .aio import AsyncioConnection, AsyncioProtocol, AsyncioServer
+from .bucket import TokenBucket
 from .client import PushiClient
-from .server import PushiServer
+from .server import PushiBatch, PushiConnection, PushiMessage, PushiServer
+from .wheel import TimerWheel
@@ -0,0 +1,292 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import ssl
+import threading
+
+import netius
+
+from . import server
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+Protocol = asyncio.Protocol if asyncio else object
+""" The base class of the (transport level) protocol, an invalid
+(plain object) one in case asyncio is not available (Python 2) """
+
+
+class AsyncioConnection(server.PushiConnection):
+    """
+    Connection of the asyncio backend, the pushi (protocol) logic is
+    the same as the netius one, only the writing and the closing of
+    the connection are done through the asyncio transport.
+
+    The amount of data pending in the transport is kept in the pending
+    size so that the outbound queues behave as in the netius backend.
+    """
+
+    def __init__(self, owner, transport, address, ssl=False):
+        server.PushiConnection.__init__(self, owner, None, address, ssl=ssl)
+        self.transport = transport
+        self.status = netius.OPEN
+
+    def send(self, data, address=None, delay=True, force=False, callback=None):
+        data = netius.legacy.bytes(data) if data else data
+        data_l = len(data) if data else 0
+        if not self.status == netius.OPEN:
+            return 0
+
+        # the transport may only be used from the event loop thread, in
+        # case the send comes from another thread (eg: app) the write is
+        # scheduled to be performed in the event loop
+        if not self.owner.is_loop():
+            self.owner.loop.call_soon_threadsafe(
+                lambda: self.send(data, callback=callback)
+            )
+            return data_l
+
+        self.transport.write(data)
+        self.pending_s = self.transport.get_write_buffer_size()
+        if callback:
+            callback(self)
+        return data_l
+
+    def close(self, flush=False, destroy=True, reason=None, error=None):
+        if self.status == netius.CLOSED:
+            return
+        self.status = netius.CLOSED
+        self.pending_s = 0
+
+        # in case the flush flag is set the transport is closed once its
+        # buffer has been flushed, otherwise it's closed immediately
+        if flush:
+            self.transport.close()
+        else:
+            self.transport.abort()
+
+        if self in self.owner.connections:
+            self.owner.connections.remove(self)
+        self.owner.on_connection_d(self)
+
+    def on_unpend(self, connection):
+        self.pending_s = self.transport.get_write_buffer_size()
+        server.PushiConnection.on_unpend(self, connection)
+
+
+class AsyncioProtocol(Protocol):
+    """
+    The asyncio protocol that bridges the events of the transport
+    (connection, data, flow control) with the (pushi) server, one
+    instance is created for each accepted connection.
+    """
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.connection = None
+
+    def connection_made(self, transport):
+        transport.set_write_buffer_limits(high=self.owner.write_window)
+        address = transport.get_extra_info("peername")
+        ssl = bool(transport.get_extra_info("sslcontext"))
+        self.connection = AsyncioConnection(self.owner, transport, address, ssl=ssl)
+        self.owner.connections.append(self.connection)
+        self.owner.on_connection_c(self.connection)
+
+    def connection_lost(self, exception):
+        self.connection.close()
+
+    def data_received(self, data):
+        # runs the (pushi) data handling for the connection, in case
+        # there's an error in the handling the connection is closed
+        # as its state is no longer considered valid
+        try:
+            self.owner.on_data(self.connection, data)
+        except Exception as exception:
+            self.owner.warning(
+                "Closing connection due to error: %s" % netius.legacy.UNICODE(exception)
+            )
+            self.connection.close()
+
+    def pause_writing(self):
+        pass
+
+    def resume_writing(self):
+        self.connection.trigger("unpend", self.connection)
+
+
+class AsyncioServer(server.PushiServer):
+    """
+    Alternative backend of the pushi server built on top of asyncio
+    (using uvloop when available), with the same protocol behavior as
+    the (default) netius backend, as only the event loop and the I/O
+    of the connections are replaced.
+
+    Selected using the `SERVER_BACKEND=asyncio` configuration.
+    """
+
+    def __init__(self, *args, **kwargs):
+        server.PushiServer.__init__(self, *args, **kwargs)
+        self.uvloop = netius.conf("PUSHI_UVLOOP", True, cast=bool) and bool(uvloop)
+        self.loop = None
+        self.service = None
+        self.delayed_a = []
+
+    def serve(
+        self,
+        host="127.0.0.1",
+        port=9090,
+        ssl=False,
+        key_file=None,
+        cer_file=None,
+        **kwargs
+    ):
+        if not asyncio:
+            raise netius.NetiusError("asyncio not available for the server")
+
+        self.host = host
+        self.port = port
+        self.ssl = ssl
+        self.open_loop()
+
+        context = self._ssl_context(key_file, cer_file) if ssl else None
+        self.service = self.loop.run_until_complete(
+            self.loop.create_server(
+                lambda: AsyncioProtocol(self),
+                host=host,
+                port=port,
+                ssl=context,
+                reuse_port=self.reuse_port or None,
+            )
+        )
+
+        self.info("Serving '%s' (asyncio) on %s:%d ..." % (self.name, host, port))
+        self.on_serve()
+        self.run_loop()
+
+    def start(self):
+        """
+        Runs the event loop in the current thread without binding any
+        service socket, blocking until the server is stopped, this is
+        used by the master of a set of workers (no connections served).
+        """
+
+        if not asyncio:
+            raise netius.NetiusError("asyncio not available for the server")
+
+        self.open_loop()
+        self.run_loop()
+
+    def open_loop(self):
+        # creates the event loop bound to the current thread and then
+        # schedules the callables delayed before the loop existed, so
+        # that they run as soon as the loop is started
+        self.loop = uvloop.new_event_loop() if self.uvloop else asyncio.new_event_loop()
+        self.tid = threading.current_thread().ident
+        asyncio.set_event_loop(self.loop)
+        for callable, timeout in self.delayed_a:
+            self.delay(callable, timeout=timeout)
+        del self.delayed_a[:]
+
+    def run_loop(self):
+        # triggers the start event (eg: listening of the bus of a worker)
+        # and runs the event loop until it's stopped, closing the service
+        # and the remaining connections afterwards
+        self.on_start()
+        try:
+            self.loop.run_forever()
+        finally:
+            if self.service:
+                self.service.close()
+            for connection in list(self.connections):
+                connection.close()
+            self.loop.close()
+            self.on_stop()
+
+    def stop(self):
+        self.delay(lambda: self.loop.stop(), safe=True)
+
+    def delay(
+        self, callable, timeout=None, immediately=False, verify=False, safe=False
+    ):
+        # in case the event loop is not yet running the delay is kept to be
+        # scheduled upon serving, otherwise in case the delay comes from a
+        # thread other than the one of the event loop (or is marked as safe)
+        # it must be scheduled using the thread safe method, note that
+        # in case the loop is already closed the callable is discarded
+        if not self.loop:
+            self.delayed_a.append((callable, timeout))
+            return
+        if self.loop.is_closed():
+            return
+        if safe or not self.is_loop():
+            try:
+                self.loop.call_soon_threadsafe(
+                    lambda: self.delay(callable, timeout=timeout)
+                )
+            except RuntimeError:
+                pass
+            return
+        if timeout:
+            self.loop.call_later(timeout, callable)
+        else:
+            self.loop.call_soon(callable)
+
+    def drain(self, window=None):
+        # stops accepting new connections (closes the service sockets)
+        # before the draining of the existing ones
+        if self.service and not self.draining:
+            self.service.close()
+        server.PushiServer.drain(self, window=window)
+
+    def is_running(self):
+        return bool(self.loop) and self.loop.is_running()
+
+    def is_loop(self):
+        return threading.current_thread().ident == self.tid
+
+    def _ssl_context(self, key_file, cer_file):
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(cer_file, keyfile=key_file)
+        return context
+
+
+if __name__ == "__main__":
+    _server = AsyncioServer()
+    _server.serve()
+else:
+    __path__ = []
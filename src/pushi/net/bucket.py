@@ -0,0 +1,86 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import time
+
+
+class TokenBucket(object):
+    """
+    Token bucket implementation to be used in the rate limiting
+    of operations (eg: connections, messages), the bucket is filled
+    at a constant rate up to its (burst) capacity and each operation
+    consumes a token, being rejected if there's none available.
+
+    The refill is computed lazily upon each consumption so that no
+    timer is required, making the bucket O(1) in time and memory.
+    """
+
+    def __init__(self, rate, burst=None, timestamp=None):
+        self.configure(rate, burst=burst)
+        self.tokens = float(self.burst)
+        self.timestamp = time.time() if timestamp == None else timestamp
+
+    def configure(self, rate, burst=None):
+        """
+        Changes the rate and the capacity of the bucket, the capacity
+        defaults to the rate (one second of operations), with a minimum
+        of one token so that operations are possible.
+
+        :type rate: float
+        :param rate: The number of tokens added to the bucket per second.
+        :type burst: int
+        :param burst: The maximum number of tokens in the bucket.
+        """
+
+        self.rate = float(rate)
+        self.burst = max(burst or self.rate, 1)
+
+    def consume(self, count=1, timestamp=None):
+        """
+        Tries to consume the provided number of tokens from the bucket,
+        refilling it first according to the time elapsed.
+
+        :type count: int
+        :param count: The number of tokens to be consumed.
+        :type timestamp: float
+        :param timestamp: The current timestamp, defaults to now.
+        :rtype: bool
+        :return: If the tokens were consumed (operation admitted).
+        """
+
+        if timestamp == None:
+            timestamp = time.time()
+        elapsed = max(timestamp - self.timestamp, 0)
+        self.tokens = min(self.tokens + elapsed * self.rate, self.burst)
+        self.timestamp = timestamp
+        if self.tokens < count:
+            return False
+        self.tokens -= count
+        return True
@@ -30,8 +30,16 @@ __license__ = "Apache License, Version 2.0"
 
 import json
 
+import netius.common
 import netius.clients
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from . import server
+
 
 class PushiChannel(netius.observer.Observable):
     def __init__(self, owner, name):
@@ -39,13 +47,15 @@ class PushiChannel(netius.observer.Observable):
         self.owner = owner
         self.name = name
         self.data = None
+        self.mid = None
         self.subscribed = False
 
     def set_subscribe(self, data):
+        # the alias channels are kept (if existing) so that both their
+        # bindings and the mid of their last event survive a re-connection
         alias = data["alias"] if data else []
         for name in alias:
-            channel = PushiChannel(self.owner, name)
-            self.owner.channels[name] = channel
+            self.owner._ensure_channel(name)
             self.owner.on_subscribe_pushi(name, {})
 
         self.data = data
@@ -63,7 +73,12 @@ class PushiChannel(netius.observer.Observable):
     def set_latest(self, data):
         self.trigger("latest", self, data)
 
+    def set_members(self, data):
+        self.trigger("members", self, data)
+
     def set_message(self, event, data, mid=None, timestamp=None):
+        if mid:
+            self.mid = mid
         self.trigger(event, self, data, mid=mid, timestamp=timestamp)
 
     def send(self, event, data, persist=True):
@@ -75,12 +90,23 @@ class PushiChannel(netius.observer.Observable):
     def latest(self, skip=0, count=10, callback=None):
         self.owner.latest_pushi(self.name, skip=skip, count=count, callback=callback)
 
+    def members(self, skip=0, count=0, callback=None):
+        self.owner.members_pushi(self.name, skip=skip, count=count, callback=callback)
+
 
 class PushiProtocol(netius.clients.WSProtocol):
     PUXIAPP_URL = "wss://puxiapp.com/"
     """ The default PuxiApp URL that is going to be used
     to establish new client's connections """
 
+    RETRY_TIMEOUT = 1.0
+    """ The initial time in seconds to wait before re-connecting
+    after the loss of the connection, doubled on each failed try """
+
+    RETRY_MAX = 60.0
+    """ The maximum time in seconds to wait before re-connecting,
+    the upper bound of the (exponential) back-off """
+
     def __init__(self, *args, **kwargs):
         netius.clients.WSProtocol.__init__(self, *args, **kwargs)
         self.base_url = None
@@ -90,25 +116,114 @@ class PushiProtocol(netius.clients.WSProtocol):
         self.state = "disconnected"
         self.socket_id = None
         self.channels = dict()
+        self.subprotocol = None
+        self.binary = False
+        self.subscriptions = dict()
+        self.reconnect = False
+        self.reconnecting = False
+        self.retries = 0
 
     def connect_pushi(
-        self, url=None, client_key=None, api=None, callback=None, loop=None
+        self,
+        url=None,
+        client_key=None,
+        api=None,
+        callback=None,
+        loop=None,
+        binary=False,
+        reconnect=False,
     ):
         cls = self.__class__
 
+        if binary and not msgpack:
+            raise netius.NetiusError("MessagePack not available for binary protocol")
+
         self.base_url = url or cls.PUXIAPP_URL
         self.client_key = client_key
         self.api = api
         self.url = self.base_url + self.client_key
+        self.subprotocol = server.BINARY_PROTOCOL if binary else None
+        self.reconnect = reconnect
 
         if callback:
             self.bind("connect_pushi", callback, oneshot=True)
 
         return self.connect_ws(self.url, loop=loop)
 
+    def connection_made(self, transport):
+        # in case no subprotocol is going to be offered the default
+        # handshake request is used, otherwise the request is re-built
+        # with the extra subprotocol header
+        if not self.subprotocol:
+            return netius.clients.WSProtocol.connection_made(self, transport)
+
+        netius.StreamProtocol.connection_made(self, transport)
+        data = (
+            "GET %s HTTP/1.1\r\n" % self.path
+            + "Upgrade: websocket\r\n"
+            + "Connection: Upgrade\r\n"
+            + "Host: %s\r\n" % self.host
+            + "Origin: http://%s\r\n" % self.host
+            + "Sec-WebSocket-Key: %s\r\n" % self.key
+            + "Sec-WebSocket-Protocol: %s\r\n" % self.subprotocol
+            + "Sec-WebSocket-Version: 13\r\n\r\n"
+        )
+        self.send(data)
+
+    def connection_lost(self, exception):
+        # in case the connection was lost without being closed by the
+        # client (eg: network failure, server drain) and re-connection is
+        # enabled a new connection is scheduled, the bindings are kept
+        # (no destroy) so that the channels are resumed transparently
+        loop = self._loop
+        self.reconnecting = self.reconnect and not self.is_closed_or_closing()
+        netius.clients.WSProtocol.connection_lost(self, exception)
+        if not self.reconnecting:
+            return
+
+        cls = self.__class__
+        timeout = min(cls.RETRY_TIMEOUT * 2**self.retries, cls.RETRY_MAX)
+        self.retries += 1
+        if hasattr(loop, "delay"):
+            loop.delay(lambda: self.reconnect_pushi(loop=loop), timeout=timeout)
+        else:
+            loop.call_later(timeout, lambda: self.reconnect_pushi(loop=loop))
+
+    def destroy(self):
+        if self.reconnecting:
+            return
+        netius.clients.WSProtocol.destroy(self)
+
+    def reconnect_pushi(self, loop=None):
+        """
+        Re-connects the protocol to the pushi server after the loss of
+        the connection, the channels that were subscribed are subscribed
+        again once connected, with the mid of the last event received so
+        that the events missed in the meantime are replayed (resume).
+
+        :type loop: EventLoop
+        :param loop: The event loop to be used in the new connection.
+        """
+
+        self.reconnecting = False
+        self.state = "disconnected"
+        self.socket_id = None
+        self.handshake = False
+        self.buffer_l = []
+        self.headers = {}
+        return self.connect_ws(self.url, loop=loop)
+
+    def on_handshake(self):
+        protocol = self.headers.get("sec-websocket-protocol", None)
+        self.binary = bool(self.subprotocol) and protocol == self.subprotocol
+        netius.clients.WSProtocol.on_handshake(self)
+
     def receive_ws(self, data):
-        data = data.decode("utf-8")
-        data_j = json.loads(data)
+        if self.binary:
+            data_j = msgpack.unpackb(data, raw=False)
+        else:
+            data = data.decode("utf-8")
+            data_j = json.loads(data)
 
         is_connected = (
             self.state == "disconnected"
@@ -116,16 +231,31 @@ class PushiProtocol(netius.clients.WSProtocol):
         )
 
         if is_connected:
-            data = json.loads(data_j["data"])
+            data = self._load(data_j["data"])
             self.on_connect_pushi(data)
+        elif data_j["event"] == "pusher:ping":
+            self.send_event("pusher:pong", "{}")
+        elif self.state == "connected" and data_j["event"] == server.BATCH_EVENT:
+            for item in data_j["data"]:
+                self.on_message_pushi(item)
         elif self.state == "connected":
             self.on_message_pushi(data_j)
 
     def on_connect_pushi(self, data):
         self.socket_id = data["socket_id"]
         self.state = "connected"
+        self.retries = 0
         self.trigger("connect_pushi", self)
 
+        # re-subscribes the channels that were subscribed before the
+        # connection was lost (if any), providing the mid of the last
+        # event received in each of them so that the gap is replayed
+        for name, channel_data in list(self.subscriptions.items()):
+            channel = self.channels.get(name, None)
+            mid = channel.mid if channel else None
+            mids = self._mids(channel) if channel else None
+            self._subscribe(name, channel_data=channel_data, mid=mid, mids=mids)
+
     def on_disconnect_pushi(self, data):
         self.socket_id = None
         self.channels = dict()
@@ -154,25 +284,36 @@ class PushiProtocol(netius.clients.WSProtocol):
             return
 
         if event == "pusher_internal:subscription_succeeded":
-            data = json.loads(data_j["data"])
+            data = self._load(data_j["data"])
             self.on_subscribe_pushi(channel, data)
 
         elif event == "pusher_internal:unsubscription_succeeded":
-            data = json.loads(data_j["data"])
+            data = self._load(data_j["data"])
             self.on_unsubscribe_pushi(channel, data)
 
         elif event == "pusher_internal:latest":
-            data = json.loads(data_j["data"])
+            data = self._load(data_j["data"])
             self.on_latest_pushi(channel, data)
 
+        elif event == "pusher_internal:members":
+            data = self._load(data_j["data"])
+            self.on_members_pushi(channel, data)
+
         elif event == "pusher:member_added":
-            member = json.loads(data_j["member"])
+            member = self._load(data_j["member"])
             self.on_member_added_pushi(channel, member)
 
         elif event == "pusher:member_removed":
-            member = json.loads(data_j["member"])
+            member = self._load(data_j["member"])
             self.on_member_removed_pushi(channel, member)
 
+        elif event == "pusher:member_diff":
+            data = self._load(data_j["data"])
+            for member in data.get("added", []):
+                self.on_member_added_pushi(channel, member)
+            for member in data.get("removed", []):
+                self.on_member_removed_pushi(channel, member)
+
         self.trigger(event, self, data, channel, mid=mid, timestamp=timestamp)
         if _channel:
             _channel.set_message(event, data, mid=mid, timestamp=timestamp)
@@ -182,6 +323,23 @@ class PushiProtocol(netius.clients.WSProtocol):
         _channel.set_subscribe(data)
         self.trigger("subscribe", self, channel, data)
 
+        # in case the channel could not be resumed (the gap of events is
+        # no longer available in the server) the fallback is used instead
+        if data and data.get("resumed", None) == False:
+            self.on_resume_failed_pushi(channel)
+
+    def on_resume_failed_pushi(self, channel):
+        # drops the (stale) mids of the channel and of its alias channels
+        # so that they're not used again and requests the latest events
+        # of the channel, to be handled as a regular latest response
+        _channel = self.channels[channel]
+        alias = _channel.data.get("alias", []) if _channel.data else []
+        for name in [channel] + list(alias):
+            if name in self.channels:
+                self.channels[name].mid = None
+        self.trigger("resume_failed", self, channel)
+        self.latest_pushi(channel)
+
     def on_unsubscribe_pushi(self, channel, data):
         _channel = self.channels[channel]
         del self.channels[channel]
@@ -193,6 +351,11 @@ class PushiProtocol(netius.clients.WSProtocol):
         _channel.set_latest(data)
         self.trigger("latest", self, channel, data)
 
+    def on_members_pushi(self, channel, data):
+        _channel = self.channels[channel]
+        _channel.set_members(data)
+        self.trigger("members", self, channel, data)
+
     def on_member_added_pushi(self, channel, member):
         pass
 
@@ -204,11 +367,8 @@ class PushiProtocol(netius.clients.WSProtocol):
         if exists and not force:
             return
 
-        is_private = self._is_private(channel)
-        if is_private:
-            self._subscribe_private(channel, channel_data=channel_data)
-        else:
-            self._subscribe_public(channel)
+        self._subscribe(channel, channel_data=channel_data)
+        self.subscriptions[channel] = channel_data
 
         name = channel
         channel = PushiChannel(self, name)
@@ -225,6 +385,7 @@ class PushiProtocol(netius.clients.WSProtocol):
             return
 
         self._unsubscribe(channel)
+        self.subscriptions.pop(channel, None)
 
         name = channel
         channel = self.channels[name]
@@ -249,6 +410,20 @@ class PushiProtocol(netius.clients.WSProtocol):
 
         return channel
 
+    def members_pushi(self, channel, skip=0, count=0, callback=None):
+        exists = channel in self.channels
+        if not exists:
+            return
+
+        self._members(channel, skip=skip, count=count)
+
+        channel = self.channels[channel]
+
+        if callback:
+            channel.bind("members", callback, oneshot=True)
+
+        return channel
+
     def send_event(self, event, data, echo=False, persist=True, callback=None):
         json_d = dict(event=event, data=data, echo=echo, persist=persist)
         self.send_pushi(json_d, callback=callback)
@@ -262,9 +437,20 @@ class PushiProtocol(netius.clients.WSProtocol):
         self.send_pushi(json_d, callback=callback)
 
     def send_pushi(self, json_d, callback=None):
+        if self.binary:
+            data = msgpack.packb(json_d, use_bin_type=True)
+            encoded = netius.common.encode_ws(data, opcode=0x02, mask=True)
+            return self.send(encoded, callback=callback)
         data = json.dumps(json_d)
         self.send_ws(data, callback=callback)
 
+    def _load(self, value):
+        # the nested JSON documents are only encoded as strings in the
+        # text (JSON) protocol, in the binary one they're structures
+        if netius.legacy.is_string(value):
+            return json.loads(value)
+        return value
+
     def _ensure_channel(self, name):
         if name in self.channels:
             return self.channels[name]
@@ -272,17 +458,44 @@ class PushiProtocol(netius.clients.WSProtocol):
         self.channels[name] = channel
         return channel
 
-    def _subscribe_public(self, channel):
-        self.send_event("pusher:subscribe", dict(channel=channel))
+    def _mids(self, channel):
+        # the events of a personal channel are received through its alias
+        # channels, so its resume requires the mid of each one of them
+        if not channel.name.startswith("personal-") or not channel.data:
+            return None
+        mids = dict()
+        for name in channel.data.get("alias", []):
+            alias = self.channels.get(name, None)
+            if not alias or not alias.mid:
+                continue
+            mids[name] = alias.mid
+        return mids or None
+
+    def _subscribe(self, channel, channel_data=None, mid=None, mids=None):
+        is_private = self._is_private(channel)
+        if is_private:
+            self._subscribe_private(
+                channel, channel_data=channel_data, mid=mid, mids=mids
+            )
+        else:
+            self._subscribe_public(channel, mid=mid)
 
-    def _subscribe_private(self, channel, channel_data=None):
+    def _subscribe_public(self, channel, mid=None):
+        data = dict(channel=channel)
+        if mid:
+            data["mid"] = mid
+        self.send_event("pusher:subscribe", data)
+
+    def _subscribe_private(self, channel, channel_data=None, mid=None, mids=None):
         if not self.api:
             raise RuntimeError("No private app available")
         auth = self.api.authenticate(channel, self.socket_id)
-        self.send_event(
-            "pusher:subscribe",
-            dict(channel=channel, auth=auth, channel_data=channel_data),
-        )
+        data = dict(channel=channel, auth=auth, channel_data=channel_data)
+        if mid:
+            data["mid"] = mid
+        if mids:
+            data["mids"] = mids
+        self.send_event("pusher:subscribe", data)
 
     def _unsubscribe(self, channel):
         self.send_event("pusher:unsubscribe", dict(channel=channel))
@@ -290,6 +503,9 @@ class PushiProtocol(netius.clients.WSProtocol):
     def _latest(self, channel, skip=0, count=10):
         self.send_event("pusher:latest", dict(channel=channel, skip=skip, count=count))
 
+    def _members(self, channel, skip=0, count=0):
+        self.send_event("pusher:members", dict(channel=channel, skip=skip, count=count))
+
     def _is_private(self, channel):
         return (
             channel.startswith("private-")
@@ -303,11 +519,24 @@ class PushiClient(netius.clients.WSClient):
 
     @classmethod
     def connect_pushi_s(
-        cls, url=None, client_key=None, api=None, callback=None, loop=None
+        cls,
+        url=None,
+        client_key=None,
+        api=None,
+        callback=None,
+        loop=None,
+        binary=False,
+        reconnect=False,
     ):
         protocol = cls.protocol()
         return protocol.connect_pushi(
-            url=url, client_key=client_key, api=api, callback=callback, loop=loop
+            url=url,
+            client_key=client_key,
+            api=api,
+            binary=binary,
+            reconnect=reconnect,
+            callback=callback,
+            loop=loop,
         )
 
 
@@ -28,11 +28,198 @@ __copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
 __license__ = "Apache License, Version 2.0"
 """ The license for the module """
 
+import time
+import zlib
+import socket
 import uuid
+import random
 import json
+import struct
+import collections
 
+import netius.pool
+import netius.common
 import netius.servers
 
+from . import bucket
+from . import wheel
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+DEFLATE_TAIL = b"\x00\x00\xff\xff"
+""" The tail of an empty deflate block that is removed from
+the compressed messages and re-added when inflating them,
+as defined by the permessage-deflate (RFC 7692) extension """
+
+DEFLATE_PARAMS = (
+    "server_no_context_takeover",
+    "client_no_context_takeover",
+    "server_max_window_bits",
+    "client_max_window_bits",
+)
+""" The sequence of parameters of the permessage-deflate extension
+that are known, offers with other parameters are declined """
+
+QUEUE_POLICIES = ("drop_oldest", "drop_newest", "disconnect")
+""" The policies that may be applied to a connection whose outbound
+queue goes over its limits, either dropping the oldest or the newest
+queued messages or disconnecting the (slow) connection """
+
+BINARY_PROTOCOL = "pushi.msgpack"
+""" The name of the WebSocket subprotocol that carries the events
+as MessagePack binary frames instead of JSON text frames """
+
+NESTED_KEYS = ("data", "member")
+""" The keys of the Pusher envelope whose values are JSON documents
+encoded as strings, that are decoded in the binary subprotocol so
+that no nested string encoding is sent through the wire """
+
+CONFLATED_PREFIX = "conflated-"
+""" The prefix of the channels whose events are conflated, meaning
+that only the most recent undelivered event of the channel is kept
+for each of the (slow) connections, replacing the older ones """
+
+BATCH_EVENT = "pusher:batch"
+""" The name of the event that bundles the events coalesced in
+a window for a connection, its data is the list of events """
+
+CLOSE_OVERFLOW = 4100
+""" The close code sent to the connections that are disconnected for
+going over their limits (eg: outbound queue, connections of the app),
+according to the Pusher protocol this code means that the client should
+reconnect after backing off """
+
+CLOSE_RECONNECT = 4200
+""" The close code sent to the connections that are closed while the
+server is draining, according to the Pusher protocol this code means
+that the client should reconnect immediately (to other server) """
+
+ERROR_RATE = 4301
+""" The code of the error sent to the connections whose messages are
+rejected for going over the message rate limit of the connection """
+
+
+class PushiMessage(object):
+    """
+    Message that is going to be sent to one or more connections,
+    the serialization of the JSON payload and the encoding of the
+    WebSocket frame are computed only once (lazily) and then shared
+    by every connection the message is sent to.
+
+    The frame bytes are immutable so the same buffer is handed to
+    the pending queue of every connection, avoiding the (costly)
+    encode per subscriber in broadcast (fan-out) operations.
+    """
+
+    __slots__ = ("json_d", "_data", "_frame", "_frames", "_packed", "_binary")
+
+    def __init__(self, json_d):
+        self.json_d = json_d
+        self._data = None
+        self._frame = None
+        self._frames = None
+        self._packed = None
+        self._binary = None
+
+    def data(self):
+        if self._data == None:
+            self._data = json.dumps(self.json_d)
+        return self._data
+
+    def frame(self):
+        if self._frame == None:
+            self._frame = netius.common.encode_ws(self.data(), mask=False)
+        return self._frame
+
+    def deflated(self, bits=15, level=zlib.Z_DEFAULT_COMPRESSION):
+        """
+        Retrieves the frame for the message compressed according to
+        the permessage-deflate extension (RFC 7692) without context
+        takeover, meaning that the same compressed frame may be shared
+        by every connection that negotiated the extension.
+
+        :type bits: int
+        :param bits: The (base two logarithm) of the window size to be
+        used in the compression, as negotiated with the client.
+        :type level: int
+        :param level: The zlib compression level to be used.
+        :rtype: String
+        :return: The compressed WebSocket frame for the message.
+        """
+
+        if self._frames == None:
+            self._frames = dict()
+        frame = self._frames.get(bits, None)
+        if frame == None:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -bits)
+            frame = encode_deflate(self.data(), compressor)
+            self._frames[bits] = frame
+        return frame
+
+    def packed(self):
+        if self._packed == None:
+            self._packed = encode_binary(self.json_d)
+        return self._packed
+
+    def binary(self):
+        if self._binary == None:
+            self._binary = netius.common.encode_ws(
+                self.packed(), opcode=0x02, mask=False
+            )
+        return self._binary
+
+
+class PushiBatch(PushiMessage):
+    """
+    Message that bundles the sequence of messages coalesced by a
+    connection into a single `pusher:batch` event, whose data is
+    the list of the bundled events.
+
+    The serialization of each of the bundled messages is re-used
+    (and shared with the other connections), only the envelope of
+    the batch is specific to the connection.
+    """
+
+    __slots__ = ("messages",)
+
+    def __init__(self, messages):
+        PushiMessage.__init__(self, None)
+        self.messages = messages
+
+    def data(self):
+        if self._data == None:
+            self._data = '{"event": "%s", "data": [%s]}' % (
+                BATCH_EVENT,
+                ", ".join(message.data() for message in self.messages),
+            )
+        return self._data
+
+    def packed(self):
+        if self._packed == None:
+            packer = msgpack.Packer(use_bin_type=True)
+            self._packed = (
+                packer.pack_map_header(2)
+                + packer.pack("event")
+                + packer.pack(BATCH_EVENT)
+                + packer.pack("data")
+                + packer.pack_array_header(len(self.messages))
+                + b"".join(message.packed() for message in self.messages)
+            )
+        return self._packed
+
 
 class PushiConnection(netius.servers.WSConnection):
     def __init__(self, *args, **kwargs):
@@ -41,13 +228,440 @@ class PushiConnection(netius.servers.WSConnection):
         self.socket_id = str(uuid.uuid4())
         self.channels = []
         self.count = 0
+        self.binary = False
+        self.deflate = False
+        self.deflate_bits = 15
+        self.deflater = None
+        self.inflater = None
+        self.queue = collections.deque()
+        self.queue_s = 0
+        self.queue_bytes = self.owner.queue_bytes
+        self.queue_messages = self.owner.queue_messages
+        self.queue_policy = self.owner.queue_policy
+        self.evictions = 0
+        self.overflown = False
+        self.latest = collections.OrderedDict()
+        self.conflations = 0
+        self.conflate_channels = None
+        self.coalesce = self.owner.coalesce
+        self.coalesce_channels = None
+        self.members_limit = self.owner.members_limit
+        self.batch = []
+        self.activity = time.time()
+        self.pinged = None
+        self.admitted = False
+        self.admitting = False
+        self.rejected = False
+        self.bucket = None
+        self.throttled = False
+        self.bind("unpend", self.on_unpend)
+
+    def configure(self, settings):
+        """
+        Configures the connection according to the provided (app level)
+        settings, overriding the server defaults for the settings that
+        are defined in the provided map.
+
+        :type settings: Dictionary
+        :param settings: The map of settings for the app of the connection.
+        """
+
+        self.queue_bytes = settings.get("queue_bytes", self.queue_bytes)
+        self.queue_messages = settings.get("queue_messages", self.queue_messages)
+        self.queue_policy = settings.get("queue_policy", self.queue_policy)
+        self.coalesce = settings.get("coalesce", self.coalesce)
+        self.coalesce_channels = settings.get(
+            "coalesce_channels", self.coalesce_channels
+        )
+        self.conflate_channels = settings.get(
+            "conflate_channels", self.conflate_channels
+        )
+        self.members_limit = settings.get("members_limit", self.members_limit)
+        message_rate = settings.get("message_rate", self.owner.message_rate)
+        message_burst = settings.get("message_burst", self.owner.message_burst)
+        if message_rate:
+            self.bucket = bucket.TokenBucket(message_rate, burst=message_burst)
 
     def send_pushi(self, json_d):
-        data = json.dumps(json_d)
-        self.send_ws(data)
+        message = PushiMessage(json_d)
+        self.send_message(message)
+
+    def send_message(self, message):
+        # in case the message is meant to be coalesced it's added to the
+        # batch of the connection, to be sent at the end of the window
+        # (scheduled with the first message of the batch), otherwise the
+        # pending batch is flushed first to keep the order of the messages
+        # in case the message belongs to a conflated channel an older message
+        # of the same channel that is still in the batch is replaced by it
+        conflated = self.get_conflated(message)
+        if self.coalesce and self.is_coalesced(message):
+            scheduled = bool(self.batch)
+            if conflated:
+                self.batch = [
+                    item
+                    for item in self.batch
+                    if not item.json_d.get("channel", None) == conflated
+                ]
+            self.batch.append(message)
+            if not scheduled:
+                self.owner.delay(
+                    self.flush_batch, timeout=self.coalesce / 1000.0, safe=True
+                )
+        else:
+            if self.batch:
+                self.flush_batch()
+            self.send_frame(self.encode(message), conflated=conflated)
+
         self.count += 1
         self.owner.count += 1
 
+    def is_coalesced(self, message):
+        """
+        Determines if the provided message should be coalesced, only the
+        channel events (not the protocol ones) are coalesced and, in case
+        a set of channel prefixes is defined, only the ones of channels
+        starting with one of such prefixes.
+
+        :type message: PushiMessage
+        :param message: The message to be verified.
+        :rtype: bool
+        :return: If the message should be added to the batch.
+        """
+
+        channel = message.json_d.get("channel", None)
+        if not channel:
+            return False
+        event = message.json_d.get("event", None) or ""
+        if event.startswith("pusher"):
+            return False
+        if not self.coalesce_channels:
+            return True
+        for prefix in self.coalesce_channels:
+            if channel.startswith(prefix):
+                return True
+        return False
+
+    def get_conflated(self, message):
+        """
+        Retrieves the name of the channel of the provided message in case
+        its events are conflated, either because the channel is of the
+        conflated class (prefix) or because it's configured as such.
+
+        :type message: PushiMessage
+        :param message: The message to be verified.
+        :rtype: String
+        :return: The name of the conflated channel of the message or an
+        invalid value in case the message is not conflated.
+        """
+
+        channel = message.json_d.get("channel", None)
+        if not channel:
+            return None
+        event = message.json_d.get("event", None) or ""
+        if event.startswith("pusher"):
+            return None
+        if channel.startswith(CONFLATED_PREFIX):
+            return channel
+        for prefix in self.conflate_channels or ():
+            if channel.startswith(prefix):
+                return channel
+        return None
+
+    def flush_batch(self):
+        # swaps the current batch with an empty one and sends the batched
+        # messages, a single message is sent as is (no batch envelope)
+        batch, self.batch = self.batch, []
+        if not batch:
+            return
+        if not self.status == netius.OPEN:
+            return
+        message = batch[0] if len(batch) == 1 else PushiBatch(batch)
+        self.send_frame(self.encode(message))
+
+    def send_frame(self, frame, conflated=None):
+        """
+        Sends the provided frame through the connection, in case the
+        connection is congested (too much data pending in the socket)
+        the frame is added to the outbound queue of the connection, that
+        is bounded by the connection limits (bytes and messages).
+
+        Frames of conflated channels are not queued, instead only the
+        most recent one of each channel is kept (replacing the older one)
+        and sent after the queue, so that the memory used by a slow
+        connection is bounded by the number of its conflated channels.
+
+        :type frame: String
+        :param frame: The encoded WebSocket frame to be sent.
+        :type conflated: String
+        :param conflated: The name of the (conflated) channel of the frame,
+        in case the frame belongs to a conflated channel.
+        """
+
+        # the frames of a rejected connection are dropped as they would
+        # otherwise be sent after the close frame
+        if self.rejected:
+            return
+
+        if (
+            not self.queue
+            and not self.latest
+            and self.pending_s < self.owner.write_window
+        ):
+            self.send(frame)
+            return
+
+        frame_l = len(frame)
+
+        if conflated:
+            previous = self.latest.pop(conflated, None)
+            if previous:
+                previous_l = len(previous)
+                self.queue_s -= previous_l
+                self.owner.queued_s -= previous_l
+                self.conflations += 1
+                self.owner.conflations += 1
+            self.latest[conflated] = frame
+            self.queue_s += frame_l
+            self.owner.queued_s += frame_l
+            return
+
+        self.queue.append(frame)
+        self.queue_s += frame_l
+        self.owner.queued_s += frame_l
+        self.bound()
+
+    def bound(self):
+        """
+        Ensures that the outbound queue of the connection is within the
+        configured limits, applying the overflow policy otherwise, either
+        by dropping messages from the queue or disconnecting the connection.
+        """
+
+        while self.queue and (
+            self.queue_s > self.queue_bytes or len(self.queue) > self.queue_messages
+        ):
+            if self.queue_policy == "disconnect":
+                self.overflow()
+                break
+            if self.queue_policy == "drop_newest":
+                frame = self.queue.pop()
+            else:
+                frame = self.queue.popleft()
+            frame_l = len(frame)
+            self.queue_s -= frame_l
+            self.owner.queued_s -= frame_l
+            self.evictions += 1
+            self.owner.evictions += 1
+
+    def overflow(self):
+        """
+        Disconnects the connection for going over its outbound queue
+        limits, the queue is discarded and a close frame is sent, then
+        the connection is closed on the next tick of the event loop to
+        avoid changing the state in the middle of a fan-out operation.
+        """
+
+        if self.overflown:
+            return
+        self.overflown = True
+        self.clear_queue()
+        self.owner.disconnects += 1
+        self.reject(CLOSE_OVERFLOW, b"Over capacity")
+
+    def reject(self, code, reason):
+        """
+        Sends a close frame with the provided code and reason to the
+        connection, closing it on the next tick of the event loop after
+        the frame has been flushed.
+
+        The frames still pending in the batch and in the outbound queue
+        of the connection are flushed before the close frame, so that
+        no event is lost (eg: upon draining). From this moment the
+        connection is considered rejected, any data received through it
+        (eg: pipelined after the handshake) is dropped, so that it never
+        reaches the state, and no more frames are sent through it.
+
+        :type code: int
+        :param code: The close code to be sent (eg: 4100).
+        :type reason: String
+        :param reason: The (bytes) reason of the closing.
+        """
+
+        if self.rejected:
+            return
+        if self.batch:
+            self.flush_batch()
+        self.flush_queue(force=True)
+        if self.rejected:
+            return
+        self.rejected = True
+        code = struct.pack("!H", code) + reason
+        self.send(netius.common.encode_ws(code, opcode=0x08, mask=False))
+        self.owner.delay(lambda: self.close(flush=True), safe=True)
+
+    def flush_queue(self, force=False):
+        while self.queue and (force or self.pending_s < self.owner.write_window):
+            frame = self.queue.popleft()
+            frame_l = len(frame)
+            self.queue_s -= frame_l
+            self.owner.queued_s -= frame_l
+            self.send(frame)
+
+        # sends the latest frames of the conflated channels only after
+        # the queue has been flushed, these are sent in the order of
+        # their (latest) update
+        while (
+            not self.queue
+            and self.latest
+            and (force or self.pending_s < self.owner.write_window)
+        ):
+            _channel, frame = self.latest.popitem(last=False)
+            frame_l = len(frame)
+            self.queue_s -= frame_l
+            self.owner.queued_s -= frame_l
+            self.send(frame)
+
+    def clear_queue(self):
+        self.owner.queued_s -= self.queue_s
+        self.queue.clear()
+        self.latest.clear()
+        self.queue_s = 0
+        del self.batch[:]
+
+    def on_unpend(self, connection):
+        if not self.queue and not self.latest:
+            return
+        self.flush_queue()
+
+    def encode(self, message):
+        """
+        Encodes the provided message into the frame that is going to be
+        sent through this connection, taking into account the extensions
+        negotiated (eg: permessage-deflate) for the connection.
+
+        Whenever possible the returned frame is shared with the other
+        connections, only the context takeover mode requires a frame
+        that is specific to this connection.
+
+        :type message: PushiMessage
+        :param message: The message to be encoded.
+        :rtype: String
+        :return: The WebSocket frame to be sent through the connection.
+        """
+
+        if self.binary:
+            return message.binary()
+        if not self.deflate:
+            return message.frame()
+        if len(message.data()) < self.owner.deflate_min:
+            return message.frame()
+        if self.deflater:
+            return encode_deflate(message.data(), self.deflater)
+        return message.deflated(bits=self.deflate_bits, level=self.owner.deflate_level)
+
+    def decode(self, data):
+        if self.binary:
+            return decode_binary(data)
+        return loads(data)
+
+    def inflate(self, data):
+        if not self.inflater:
+            raise netius.DataError("Compressed frame without permessage-deflate")
+        return self.inflater.decompress(data + DEFLATE_TAIL)
+
+    def negotiate(self):
+        """
+        Negotiates the extensions offered by the client in the handshake
+        request, at the moment only the permessage-deflate (RFC 7692)
+        extension is supported, the first acceptable offer is used.
+
+        Unless the context takeover mode is enabled in the server the
+        server no context takeover parameter is always set, so that the
+        compressed frames may be shared among connections.
+
+        :rtype: String
+        :return: The value of the extensions header to be sent in the
+        handshake response or an invalid value if none was accepted.
+        """
+
+        if not self.owner.deflate:
+            return None
+
+        header = self.headers.get("sec-websocket-extensions", None)
+        if not header:
+            return None
+
+        for offer in header.split(","):
+            parts = [part.strip() for part in offer.split(";")]
+            if not parts[0] == "permessage-deflate":
+                continue
+
+            params = dict()
+            for part in parts[1:]:
+                key, _sep, value = part.partition("=")
+                params[key.strip()] = value.strip().strip('"') or None
+
+            is_valid = all(key in DEFLATE_PARAMS for key in params)
+            if not is_valid:
+                continue
+
+            bits = 15
+            has_bits = "server_max_window_bits" in params
+            if has_bits:
+                try:
+                    bits = int(params["server_max_window_bits"])
+                except (TypeError, ValueError):
+                    continue
+                if bits < 9 or bits > 15:
+                    continue
+
+            takeover = self.owner.deflate_takeover
+            if "server_no_context_takeover" in params:
+                takeover = False
+
+            self.deflate = True
+            self.deflate_bits = bits
+            self.deflater = (
+                zlib.compressobj(self.owner.deflate_level, zlib.DEFLATED, -bits)
+                if takeover
+                else None
+            )
+            self.inflater = zlib.decompressobj(-15)
+
+            response = ["permessage-deflate"]
+            if not takeover:
+                response.append("server_no_context_takeover")
+            if has_bits:
+                response.append("server_max_window_bits=%d" % bits)
+            return "; ".join(response)
+
+        return None
+
+    def negotiate_protocol(self):
+        """
+        Negotiates the subprotocol offered by the client in the handshake
+        request, in case the binary (MessagePack) subprotocol is offered
+        and supported by the server the connection is set as binary.
+
+        :rtype: String
+        :return: The name of the accepted subprotocol to be sent in the
+        handshake response or an invalid value if none was accepted.
+        """
+
+        if not self.owner.binary:
+            return None
+
+        header = self.headers.get("sec-websocket-protocol", None)
+        if not header:
+            return None
+
+        protocols = [value.strip() for value in header.split(",")]
+        if not BINARY_PROTOCOL in protocols:
+            return None
+
+        self.binary = True
+        return BINARY_PROTOCOL
+
     def load_app(self):
         app_key = self.path.rsplit("/", 1)[-1]
         is_unicode = netius.legacy.is_unicode(app_key)
@@ -63,20 +677,97 @@ class PushiConnection(netius.servers.WSConnection):
 class PushiServer(netius.servers.WSServer):
     WS_CLOSE_FRAME = b"\x03\xe9"
 
+    HANDLERS = {
+        "pusher:subscribe": "handle_pusher_subscribe",
+        "pusher:unsubscribe": "handle_pusher_unsubscribe",
+        "pusher:latest": "handle_pusher_latest",
+        "pusher:members": "handle_pusher_members",
+        "pusher:ping": "handle_pusher_ping",
+        "pusher:pong": "handle_pusher_pong",
+    }
+    """ The map associating the (inbound) protocol events with the
+    name of the methods that handle them, any other event is handled
+    by its `handle_<event>` method (if any) or as a client event,
+    subclasses may extend this map """
+
     def __init__(self, state=None, *args, **kwargs):
         netius.servers.WSServer.__init__(self, *args, **kwargs)
         self.state = state
+        self.dispatch = self.__class__.get_dispatch()
+        self.dispatchers = dict()
         self.sockets = {}
         self.count = 0
+        self.deflate = netius.conf("PUSHI_DEFLATE", False, cast=bool)
+        self.deflate_min = netius.conf("PUSHI_DEFLATE_MIN", 128, cast=int)
+        self.deflate_level = netius.conf(
+            "PUSHI_DEFLATE_LEVEL", zlib.Z_DEFAULT_COMPRESSION, cast=int
+        )
+        self.deflate_takeover = netius.conf("PUSHI_DEFLATE_TAKEOVER", False, cast=bool)
+        self.binary = netius.conf("PUSHI_BINARY", False, cast=bool) and bool(msgpack)
+        self.coalesce = netius.conf("PUSHI_COALESCE", 0, cast=int)
+        self.write_window = netius.conf("PUSHI_WRITE_WINDOW", 65536, cast=int)
+        self.queue_bytes = netius.conf("PUSHI_QUEUE_BYTES", 1048576, cast=int)
+        self.queue_messages = netius.conf("PUSHI_QUEUE_MESSAGES", 1000, cast=int)
+        self.queue_policy = netius.conf("PUSHI_QUEUE_POLICY", "drop_oldest")
+        if not self.queue_policy in QUEUE_POLICIES:
+            raise netius.NetiusError("Invalid queue policy '%s'" % self.queue_policy)
+        self.reuse_port = netius.conf("PUSHI_REUSE_PORT", False, cast=bool)
+        self.queued_s = 0
+        self.evictions = 0
+        self.conflations = 0
+        self.disconnects = 0
+        self.ping_interval = netius.conf("PUSHI_PING_INTERVAL", 0, cast=int)
+        self.ping_timeout = netius.conf("PUSHI_PING_TIMEOUT", 30, cast=int)
+        self.wheel = wheel.TimerWheel()
+        self.reaped = 0
+        self.max_connections = netius.conf("PUSHI_MAX_CONNECTIONS", 0, cast=int)
+        self.connection_rate = netius.conf("PUSHI_CONNECTION_RATE", 0.0, cast=float)
+        self.connection_burst = netius.conf("PUSHI_CONNECTION_BURST", 0, cast=int)
+        self.message_rate = netius.conf("PUSHI_MESSAGE_RATE", 0.0, cast=float)
+        self.message_burst = netius.conf("PUSHI_MESSAGE_BURST", 0, cast=int)
+        self.members_limit = netius.conf("PUSHI_MEMBERS_LIMIT", 0, cast=int)
+        self.app_sockets = dict()
+        self.app_buckets = dict()
+        self.refused = 0
+        self.throttles = 0
+        self.drain_window = netius.conf("PUSHI_DRAIN_WINDOW", 30, cast=int)
+        self.draining = False
+        self.resolve_threads = netius.conf("PUSHI_RESOLVE_THREADS", 4, cast=int)
+        self.resolver = None
+        self.resolving = dict()
 
     def info_dict(self):
         info = netius.servers.WSServer.info_dict(self)
         info["count"] = self.count
+        info["queued_bytes"] = self.queued_s
+        info["evictions"] = self.evictions
+        info["conflations"] = self.conflations
+        info["disconnects"] = self.disconnects
+        info["reaped"] = self.reaped
+        info["refused"] = self.refused
+        info["throttles"] = self.throttles
         return info
 
+    def socket_tcp(self, *args, **kwargs):
+        _socket = netius.servers.WSServer.socket_tcp(self, *args, **kwargs)
+
+        # in case the port is meant to be shared among multiple processes
+        # (workers) the reuse port option is (re-)set in the socket, this
+        # is required so that the kernel balances the connections among the
+        # workers listening on the same port
+        if self.reuse_port:
+            reuse_port = getattr(socket, "SO_REUSEPORT", None)
+            if reuse_port == None:
+                raise netius.NetiusError("Reuse port not supported by the system")
+            _socket.setsockopt(socket.SOL_SOCKET, reuse_port, 1)
+
+        return _socket
+
     def on_connection_c(self, connection):
         netius.servers.WSServer.on_connection_c(self, connection)
         self.sockets[connection.socket_id] = connection
+        if self.ping_interval:
+            self.wheel.add(connection.socket_id, self.ping_interval)
         self.trigger(
             "connect",
             connection=connection,
@@ -86,7 +777,10 @@ class PushiServer(netius.servers.WSServer):
 
     def on_connection_d(self, connection):
         netius.servers.WSServer.on_connection_d(self, connection)
+        connection.clear_queue()
         del self.sockets[connection.socket_id]
+        self.wheel.remove(connection.socket_id)
+        self.release(connection)
         self.trigger(
             "disconnect",
             connection=connection,
@@ -94,51 +788,464 @@ class PushiServer(netius.servers.WSServer):
             socket_id=connection.socket_id,
         )
 
+    def on_data(self, connection, data):
+        netius.StreamServer.on_data(self, connection, data)
+
+        # marks the connection as active, note that the heartbeat wheel
+        # is not touched (for performance), the idle time is verified
+        # once the connection expires in the wheel
+        connection.activity = time.time()
+
+        self.parse(connection, data)
+
+    def parse(self, connection, data):
+        # iterates while there's still data pending to be parsed, this
+        # is a re-implementation of the websockets server logic that takes
+        # the negotiated extensions into account (eg: compressed frames)
+        while data:
+            # the data received after the rejection of the connection (eg:
+            # pipelined frames after a refused handshake) is dropped
+            if connection.rejected:
+                break
+
+            # the data received while the connection is being admitted (the
+            # settings of its app are being resolved) is buffered, to be
+            # parsed once the connection has been admitted
+            if connection.admitting:
+                connection.add_buffer(data)
+                break
+
+            if connection.handshake:
+                # joins the pending buffer with the received data and tries
+                # to decode a frame from it, in case there's not enough data
+                # for a complete frame the data is buffered for latter
+                buffer = connection.get_buffer()
+                data = buffer + data
+                first = netius.legacy.ord(data[0])
+                try:
+                    decoded, data = netius.common.decode_ws(data)
+                except netius.DataError:
+                    connection.add_buffer(data)
+                    break
+
+                # in case the first reserved bit is set the frame is compressed
+                # according to the permessage-deflate extension and must be
+                # inflated before being handled
+                if first & 0x40:
+                    decoded = connection.inflate(decoded)
+                self.on_data_ws(connection, decoded, opcode=first & 0x0F)
+
+            else:
+                # buffers the data and tries to run the handshake, in case
+                # there's not enough data the handshake is delayed until the
+                # next data chunk is received
+                connection.add_buffer(data)
+                try:
+                    connection.do_handshake()
+                except netius.DataError:
+                    return
+
+                # computes the accept key and negotiates both the extensions
+                # and the subprotocol that have been offered by the client,
+                # sending the response of the handshake to the client with the
+                # accepted extensions and subprotocol
+                accept_key = connection.accept_key()
+                extensions = connection.negotiate()
+                protocol = connection.negotiate_protocol()
+                response = self._handshake_response(
+                    accept_key, extensions=extensions, protocol=protocol
+                )
+                connection.send(response)
+
+                # notifies the handshake and then takes the data that is still
+                # pending in the connection buffer for processing
+                self.on_handshake(connection)
+                data = connection.get_buffer()
+
+    def on_serve(self):
+        netius.servers.WSServer.on_serve(self)
+        if self.ping_interval:
+            self.delay(self.on_heartbeat, timeout=self.wheel.resolution)
+
+    @classmethod
+    def get_dispatch(cls):
+        """
+        Retrieves the dispatch table of the class, mapping the (normalized)
+        name of the inbound events to the name of their handler methods,
+        built once per class from the `handle_<event>` methods (including
+        the ones of the subclasses) and the explicit `HANDLERS` map.
+
+        :rtype: Dictionary
+        :return: The dispatch table of the class, keyed by the name of the
+        event with the colons replaced by underscores.
+        """
+
+        # the table is kept in the dictionary of the class itself (not
+        # inherited) so that each subclass builds its own table
+        dispatch = cls.__dict__.get("_dispatch", None)
+        if not dispatch == None:
+            return dispatch
+
+        dispatch = dict()
+        for name in dir(cls):
+            if not name.startswith("handle_") or name == "handle_event":
+                continue
+            dispatch[name[7:]] = name
+        for event, name in cls.HANDLERS.items():
+            dispatch[event.replace(":", "_")] = name
+        cls._dispatch = dispatch
+        return dispatch
+
     def build_connection(self, socket, address, ssl=False):
         return PushiConnection(self, socket, address, ssl=ssl)
 
+    def drain(self, window=None):
+        """
+        Starts draining the server, meaning that no more connections are
+        accepted and that the existing ones are closed with the reconnect
+        (4200) code at a random time within the provided window, so that
+        the reconnections (and re-subscriptions) are spread over time.
+
+        The new connections are meant to be accepted by a replacement
+        process bound to the same port (using `SO_REUSEPORT`), started
+        before the draining. The `drained` event is triggered once the
+        window has elapsed.
+
+        :type window: int
+        :param window: The window in seconds over which the connections
+        are closed, defaults to the server's drain window.
+        """
+
+        if self.draining:
+            return
+        self.draining = True
+        window = self.drain_window if window == None else window
+
+        # stops accepting new connections by removing the service socket
+        # from the poll and closing it, from this moment the connections
+        # are accepted only by the replacement process (if any)
+        if self.socket:
+            self.unsub_all(self.socket)
+            self.socket.close()
+
+        for connection in list(self.sockets.values()):
+            self.delay(
+                lambda connection=connection: self.reconnect(connection),
+                timeout=random.uniform(0, window),
+            )
+        self.delay(lambda: self.trigger("drained", self), timeout=window + 1)
+        self.trigger("drain", self)
+
+    def reconnect(self, connection):
+        if not connection.status == netius.OPEN:
+            return
+        connection.reject(CLOSE_RECONNECT, b"Server draining")
+
+    def heartbeat(self, timestamp=None):
+        """
+        Runs a tick of the heartbeat, processing the connections that
+        expired in the timer wheel, so that the idle ones are pinged
+        and the ones that did not answer the ping are closed (reaped).
+
+        The activity of the connections is not tracked in the wheel,
+        instead the connection is re-scheduled for the remaining time
+        in case there was activity since it was scheduled.
+
+        :type timestamp: float
+        :param timestamp: The current timestamp, defaults to now.
+        """
+
+        if timestamp == None:
+            timestamp = time.time()
+
+        for socket_id in self.wheel.expire(timestamp):
+            connection = self.sockets.get(socket_id, None)
+            if not connection:
+                continue
+
+            # in case there was activity in the connection since the ping
+            # was sent the connection is responsive and the ping is no longer
+            # pending, then if the connection is not idle for the complete
+            # interval it's re-scheduled for the remaining time
+            if connection.pinged and connection.activity > connection.pinged:
+                connection.pinged = None
+            idle = timestamp - connection.activity
+            if idle < self.ping_interval and not connection.pinged:
+                self.wheel.add(socket_id, self.ping_interval - idle)
+                continue
+
+            # the connection is idle, if it has been pinged (or did not even
+            # complete the handshake) it's considered unresponsive and closed,
+            # otherwise it's pinged and given some time to answer
+            if connection.pinged or not connection.handshake:
+                self.reaped += 1
+                connection.close()
+                continue
+
+            connection.pinged = timestamp
+            connection.send_pushi(dict(event="pusher:ping", data="{}"))
+            self.wheel.add(socket_id, self.ping_timeout)
+
+    def on_heartbeat(self):
+        self.heartbeat()
+        self.delay(self.on_heartbeat, timeout=self.wheel.resolution)
+
     def on_handshake(self, connection):
         netius.servers.WSServer.on_handshake(self, connection)
         connection.load_app()
 
+        # the connections accepted right before the draining started
+        # are told to reconnect immediately (to the replacement process)
+        if self.draining:
+            connection.reject(CLOSE_RECONNECT, b"Server draining")
+            return
+
+        # the settings of the app are only retrieved inline in case they
+        # are cached, otherwise the data source is queried off the loop and
+        # the connection is held (its data buffered) until it returns
+        settings = dict()
+        if self.state:
+            settings = self.state.get_settings_cached(connection.app_key)
+        if settings == None:
+            connection.admitting = True
+            self.resolve_settings(connection)
+            return
+
+        self.on_settings(connection, settings)
+
+    def on_settings(self, connection, settings):
+        connection.admitting = False
+        if not connection.status == netius.OPEN:
+            return
+
+        # the draining may have started while the settings were resolved
+        # in which case the connection is told to reconnect immediately
+        if self.draining:
+            connection.reject(CLOSE_RECONNECT, b"Server draining")
+            return
+
+        connection.configure(settings)
+
+        # verifies that the app is able to accept one more connection,
+        # rejecting it (before any state is changed) otherwise
+        if not self.admit(connection, settings):
+            self.refused += 1
+            connection.reject(CLOSE_OVERFLOW, b"Over quota")
+            return
+
         json_d = dict(
             event="pusher:connection_established",
             data=json.dumps(dict(socket_id=connection.socket_id)),
         )
         connection.send_pushi(json_d)
 
-    def on_data_ws(self, connection, data):
+        # parses the data that was received (and buffered) while the
+        # settings of the app of the connection were being resolved
+        data = connection.get_buffer()
+        if data:
+            self.parse(connection, data)
+
+    def resolve_settings(self, connection):
+        """
+        Resolves the settings of the app of the provided connection off
+        the event loop (using a pool of threads), as they require a query
+        to the data source, admitting the connection once resolved.
+
+        The concurrent resolutions of the same app are coalesced, so that
+        a burst of connections of an app triggers a single query.
+
+        :type connection: PushiConnection
+        :param connection: The connection whose settings are resolved.
+        """
+
+        app_key = connection.app_key
+        waiting = self.resolving.get(app_key, None)
+        if not waiting == None:
+            waiting.append(connection)
+            return
+        self.resolving[app_key] = [connection]
+
+        def resolve():
+            # retrieves the settings from the state, in case there's an
+            # error (eg: the data source is down) the server defaults are
+            # used, just like for an app that defines no settings
+            try:
+                settings = self.state.get_settings(app_key)
+            except Exception as exception:
+                self.warning("Problem resolving settings: %s" % exception)
+                settings = dict()
+            self.delay(lambda: self.on_resolved(app_key, settings), safe=True)
+
+        if not self.resolver:
+            self.resolver = netius.pool.TaskPool(count=self.resolve_threads)
+            self.resolver.build()
+            for thread in self.resolver.instances:
+                thread.daemon = True
+            self.resolver.start()
+        self.resolver.execute(resolve)
+
+    def on_resolved(self, app_key, settings):
+        for connection in self.resolving.pop(app_key, []):
+            self.on_settings(connection, settings)
+
+    def on_data_ws(self, connection, data, opcode=None):
+        # a rejected connection is about to be closed and its messages
+        # must not be handled (nor reach the state) from now on
+        if connection.rejected:
+            return
+
+        # the control frames (close, ping and pong) are not messages and
+        # so are neither rate limited nor decoded as messages
+        is_control = not opcode == None and opcode >= 0x08
+
+        # verifies that the message is within the rate limit of the
+        # connection (before it's even decoded) dropping it otherwise,
+        # the client is notified only once for each sequence of drops
+        if is_control:
+            pass
+        elif connection.bucket and not connection.bucket.consume():
+            self.throttles += 1
+            if connection.throttled:
+                return
+            connection.throttled = True
+            data = dict(message="Message rate limit exceeded", code=ERROR_RATE)
+            connection.send_pushi(dict(event="pusher:error", data=json.dumps(data)))
+            return
+        connection.throttled = False
+
         netius.servers.WSServer.on_data_ws(self, connection, data)
 
         cls = self.__class__
 
+        if is_control:
+            return
         if not data:
             return
         if data == cls.WS_CLOSE_FRAME:
             return
 
         try:
-            data = data.decode("utf-8")
-            json_d = json.loads(data)
+            json_d = connection.decode(data)
+            event = json_d.get("event", None)
         except Exception:
-            raise netius.DataError("Invalid message received '%s'" % data)
+            raise netius.DataError("Invalid message received '%s'" % repr(data))
 
-        event = json_d.get("event", None)
-        event = event.replace(":", "_")
+        if not event:
+            raise netius.DataError("No event defined in message")
 
-        method_name = "handle_" + event
-        has_method = hasattr(self, method_name)
-        if has_method:
-            method = getattr(self, method_name)
-        else:
-            method = self.handle_event
+        method = self.resolve(event)
         method(connection, json_d)
 
+    def admit(self, connection, settings):
+        """
+        Verifies if the provided (handshaken) connection may be admitted
+        according to the limits of its app, both the maximum number of
+        connections and the rate of new connections (token bucket).
+
+        The accounting of the admitted connection is updated, and should
+        be reverted using `release()` once the connection is closed.
+
+        :type connection: PushiConnection
+        :param connection: The connection to be admitted.
+        :type settings: Dictionary
+        :param settings: The map of settings for the app of the connection.
+        :rtype: bool
+        :return: If the connection has been admitted.
+        """
+
+        app_key = connection.app_key
+        count = self.app_sockets.get(app_key, 0)
+        max_connections = settings.get("max_connections", self.max_connections)
+        rate = settings.get("connection_rate", self.connection_rate)
+        burst = settings.get("connection_burst", self.connection_burst)
+
+        if max_connections and count >= max_connections:
+            return False
+
+        # the bucket of the app is only kept while there are connections
+        # for it so that (invalid) app keys are not able to grow memory
+        if rate:
+            _bucket = self.app_buckets.get(app_key, None)
+            if _bucket:
+                _bucket.configure(rate, burst=burst)
+            else:
+                _bucket = bucket.TokenBucket(rate, burst=burst)
+            if not _bucket.consume():
+                return False
+            self.app_buckets[app_key] = _bucket
+
+        self.app_sockets[app_key] = count + 1
+        connection.admitted = True
+        return True
+
+    def release(self, connection):
+        if not connection.admitted:
+            return
+        connection.admitted = False
+        app_key = connection.app_key
+        count = self.app_sockets[app_key] - 1
+        if count > 0:
+            self.app_sockets[app_key] = count
+            return
+        del self.app_sockets[app_key]
+        self.app_buckets.pop(app_key, None)
+
+    def resolve(self, event):
+        """
+        Resolves the handler of the inbound event with the provided name,
+        the registered handler (if any) or the handler method of the event
+        from the dispatch table of the class, defaulting to the handling
+        as a client event.
+
+        :type event: String
+        :param event: The name of the event to resolve the handler.
+        :rtype: Function
+        :return: The handler to be called for the event.
+        """
+
+        handler = self.dispatchers.get(event, None)
+        if handler:
+            return handler
+        name = self.dispatch.get(event.replace(":", "_"), "handle_event")
+        return getattr(self, name)
+
+    def register(self, event, handler):
+        """
+        Registers the provided handler for the (inbound) event with the
+        provided name, so that custom client events may be handled by
+        the app without the need to subclass the server.
+
+        The handler is called with both the connection and the message
+        (as a map) and replaces any previously registered one, including
+        the default handling of the event (eg: trigger in channel).
+
+        :type event: String
+        :param event: The name of the event to be handled (eg: client-move).
+        :type handler: Function
+        :param handler: The callable to be called for the event.
+        """
+
+        self.dispatchers[event] = handler
+
+    def unregister(self, event):
+        """
+        Removes the handler registered for the event with the provided
+        name, restoring the default handling of the event, either by its
+        handler method (eg: pusher:subscribe) or as a client event.
+
+        :type event: String
+        :param event: The name of the event to remove the handler.
+        """
+
+        self.dispatchers.pop(event, None)
+
     def handle_pusher_subscribe(self, connection, json_d):
         data = json_d.get("data", {})
         channel = data.get("channel", None)
         auth = data.get("auth", None)
         channel_data = data.get("channel_data", None)
+        mid = data.get("mid", None)
+        mids = data.get("mids", None)
 
         self.trigger(
             "subscribe",
@@ -153,14 +1260,41 @@ class PushiServer(netius.servers.WSServer):
         if not self.state:
             return
 
-        data = self.state.get_channel(connection.app_key, channel)
+        # in case the client provided the mid of the last event it has
+        # seen in the channel (resume) the events sent after it are gathered
+        # from memory, the resumed flag lets the client know if the gap was
+        # filled or if it should fallback to the latest events instead, the
+        # personal channels are resumed using the mids of their alias channels
+        resume = mid or mids
+        events = (
+            self.state.resume(connection.app_key, channel, mid, mids=mids)
+            if resume
+            else None
+        )
+
+        # gathers the channel information with the members (up to the
+        # limit of the connection) inline, signaling that more members
+        # exist (to be requested using pusher:members) when over the limit,
+        # note that the encoded members are shared among the subscriptions
+        data = self.state.get_channel(connection.app_key, channel, members=False)
+        if resume:
+            data["resumed"] = not events == None
+        limit = connection.members_limit
+        members_s = self.state.get_members_s(connection.app_key, channel, count=limit)
+        member_count = self.state.get_member_count(connection.app_key, channel)
+        if limit and member_count > limit:
+            data["member_count"] = member_count
+            data["members_more"] = True
         json_d = dict(
             event="pusher_internal:subscription_succeeded",
-            data=json.dumps(data),
+            data=self.dump_members(data, members_s),
             channel=channel,
         )
         connection.send_pushi(json_d)
 
+        for event in events or ():
+            connection.send_pushi(event)
+
     def handle_pusher_unsubscribe(self, connection, json_d):
         data = json_d.get("data", {})
         channel = data.get("channel", None)
@@ -209,6 +1343,49 @@ class PushiServer(netius.servers.WSServer):
         )
         connection.send_pushi(json_d)
 
+    def handle_pusher_members(self, connection, json_d):
+        data = json_d.get("data", {})
+        channel = data.get("channel", None)
+        skip = int(data.get("skip", 0))
+        count = int(data.get("count", 0))
+
+        self.trigger(
+            "validate",
+            connection=connection,
+            app_key=connection.app_key,
+            socket_id=connection.socket_id,
+            channel=channel,
+        )
+
+        if not self.state:
+            return
+
+        # bounds the size of the page to the members limit of the connection
+        # and retrieves it (encoded) sending it back to the connection with
+        # the paging information, so that the next page may be requested
+        limit = connection.members_limit
+        if limit and (not count or count > limit):
+            count = limit
+        members_s = self.state.get_members_s(
+            connection.app_key, channel, skip=skip, count=count
+        )
+        member_count = self.state.get_member_count(connection.app_key, channel)
+        data = dict(skip=skip, count=count, member_count=member_count)
+        json_d = dict(
+            event="pusher_internal:members",
+            data=self.dump_members(data, members_s),
+            channel=channel,
+        )
+        connection.send_pushi(json_d)
+
+    def handle_pusher_ping(self, connection, json_d):
+        connection.send_pushi(dict(event="pusher:pong", data="{}"))
+
+    def handle_pusher_pong(self, connection, json_d):
+        # the activity of the connection has already been registered
+        # upon the receiving of the data, nothing to be done
+        pass
+
     def handle_event(self, connection, json_d):
         data = json_d["data"]
         event = json_d["event"]
@@ -230,10 +1407,139 @@ class PushiServer(netius.servers.WSServer):
             owner_id=connection.socket_id,
         )
 
+    def _handshake_response(self, accept_key, extensions=None, protocol=None):
+        data = netius.servers.WSServer._handshake_response(self, accept_key)
+        headers = ""
+        if extensions:
+            headers += "Sec-WebSocket-Extensions: %s\r\n" % extensions
+        if protocol:
+            headers += "Sec-WebSocket-Protocol: %s\r\n" % protocol
+        return data[:-2] + headers + "\r\n"
+
+    def dump_members(self, data, members_s):
+        """
+        Serializes the provided data map as JSON with the (already)
+        JSON encoded members map under the `members` key, so that the
+        encoding of the members is re-used.
+
+        :type data: Dictionary
+        :param data: The map to be serialized together with the members.
+        :type members_s: String
+        :param members_s: The JSON encoded map of members.
+        :rtype: String
+        :return: The JSON string of the data map with the members.
+        """
+
+        data_s = json.dumps(data)
+        if data_s == "{}":
+            return '{"members": ' + members_s + "}"
+        return '{"members": ' + members_s + ", " + data_s[1:]
+
     def send_socket(self, socket_id, json_d):
         connection = self.sockets[socket_id]
         connection.send_pushi(json_d)
 
+    def send_sockets(self, socket_ids, json_d):
+        """
+        Sends the provided JSON message to the complete set of sockets
+        identified by the provided identifiers, the message is serialized
+        and encoded (as a WebSocket frame) only once for all of them.
+
+        Sockets that are no longer registered in the server are ignored,
+        as they may have been disconnected in the meantime.
+
+        :type socket_ids: List
+        :param socket_ids: The sequence of socket identifiers to which
+        the message is going to be sent.
+        :type json_d: Dictionary
+        :param json_d: The JSON message to be sent to the sockets.
+        :rtype: PushiMessage
+        :return: The shared message structure that was sent.
+        """
+
+        message = PushiMessage(json_d)
+        for socket_id in socket_ids:
+            connection = self.sockets.get(socket_id, None)
+            if not connection:
+                continue
+            connection.send_message(message)
+        return message
+
+
+def encode_deflate(data, compressor):
+    """
+    Compresses the provided data using the provided (raw deflate)
+    compressor and encodes the result as a WebSocket frame with the
+    first reserved bit set, as defined by the permessage-deflate
+    (RFC 7692) extension.
+
+    :type data: String
+    :param data: The (text) data to be compressed and encoded.
+    :type compressor: Compress
+    :param compressor: The zlib compressor object to be used, should
+    be a raw deflate one (negative window bits).
+    :rtype: String
+    :return: The compressed WebSocket frame.
+    """
+
+    data = netius.legacy.bytes(data)
+    compressed = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    if compressed.endswith(DEFLATE_TAIL):
+        compressed = compressed[:-4]
+    encoded = netius.common.encode_ws(compressed, mask=False)
+    return b"\xc1" + encoded[1:]
+
+
+def encode_binary(json_d):
+    """
+    Encodes the provided (Pusher envelope) message using MessagePack,
+    decoding the values that are JSON documents encoded as strings so
+    that they are carried as proper (binary) structures.
+
+    Just like the Pusher clients, only strings that represent a JSON
+    object or array are decoded, any other string is kept as is.
+
+    :type json_d: Dictionary
+    :param json_d: The message to be encoded.
+    :rtype: String
+    :return: The MessagePack encoded message.
+    """
+
+    structure = dict(json_d)
+    for key in NESTED_KEYS:
+        value = structure.get(key, None)
+        if not netius.legacy.is_string(value):
+            continue
+        if not value[:1] in ("{", "["):
+            continue
+        try:
+            structure[key] = json.loads(value)
+        except ValueError:
+            pass
+    return msgpack.packb(structure, use_bin_type=True)
+
+
+def loads(data):
+    """
+    Decodes the provided (UTF-8 encoded) JSON data using the fastest
+    JSON backend that is available (orjson, ujson or the standard one).
+
+    :type data: String
+    :param data: The UTF-8 encoded JSON data to be decoded.
+    :rtype: Object
+    :return: The decoded JSON structure.
+    """
+
+    if orjson:
+        return orjson.loads(data)
+    if ujson:
+        return ujson.loads(data.decode("utf-8"))
+    return json.loads(data.decode("utf-8"))
+
+
+def decode_binary(data):
+    return msgpack.unpackb(data, raw=False)
+
 
 if __name__ == "__main__":
     server = PushiServer()
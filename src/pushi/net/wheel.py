@@ -0,0 +1,124 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import math
+import time
+
+
+class TimerWheel(object):
+    """
+    Hashed timer wheel implementation, where each key is placed in
+    the slot of the tick at which it expires (modulo the size of the
+    wheel) together with the number of complete rounds to wait.
+
+    Both the scheduling and the removal of a key are O(1), and each
+    tick only visits the keys of its slot, so that the cost does not
+    depend on the total number of keys (eg: connections) scheduled.
+
+    Please note that a key may only be scheduled once, scheduling it
+    again replaces its previous expiration.
+    """
+
+    def __init__(self, size=512, resolution=1.0, timestamp=None):
+        self.size = size
+        self.resolution = resolution
+        self.timestamp = time.time() if timestamp == None else timestamp
+        self.cursor = 0
+        self.slots = [dict() for _index in range(size)]
+        self.entries = dict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def add(self, key, timeout):
+        """
+        Schedules the provided key to expire after the provided timeout,
+        rounded up to the resolution of the wheel (minimum of one tick).
+
+        :type key: Object
+        :param key: The (hashable) key to be scheduled.
+        :type timeout: float
+        :param timeout: The timeout in seconds after which the key expires.
+        """
+
+        self.remove(key)
+        ticks = max(int(math.ceil(timeout / self.resolution)), 1)
+        index = (self.cursor + ticks) % self.size
+        self.slots[index][key] = (ticks - 1) // self.size
+        self.entries[key] = index
+
+    def remove(self, key):
+        index = self.entries.pop(key, None)
+        if index == None:
+            return
+        del self.slots[index][key]
+
+    def tick(self):
+        """
+        Advances the wheel by a single tick, returning the keys that
+        have expired in it, which are removed from the wheel.
+
+        :rtype: List
+        :return: The sequence of keys that have expired.
+        """
+
+        expired = []
+        self.cursor = (self.cursor + 1) % self.size
+        slot = self.slots[self.cursor]
+        for key, rounds in list(slot.items()):
+            if rounds > 0:
+                slot[key] = rounds - 1
+                continue
+            del slot[key]
+            del self.entries[key]
+            expired.append(key)
+        return expired
+
+    def expire(self, timestamp=None):
+        """
+        Runs every tick that is due until the provided timestamp, so
+        that a late call (eg: busy event loop) catches up with time.
+
+        :type timestamp: float
+        :param timestamp: The current timestamp, defaults to now.
+        :rtype: List
+        :return: The sequence of keys that have expired.
+        """
+
+        if timestamp == None:
+            timestamp = time.time()
+        expired = []
+        while self.timestamp + self.resolution <= timestamp:
+            self.timestamp += self.resolution
+            expired.extend(self.tick())
+        return expired
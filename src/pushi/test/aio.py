@@ -0,0 +1,217 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import json
+import time
+import socket
+import threading
+import unittest
+
+import netius
+
+import pushi
+
+from pushi.base import bus
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    mock = None
+
+
+class AsyncioServerTest(unittest.TestCase):
+    """
+    Unit tests for the AsyncioServer class.
+
+    Tests the asyncio backend of the server, serving a real (local)
+    WebSocket connection in a separate thread.
+    """
+
+    def setUp(self):
+        """
+        Sets up test fixtures before each test method.
+        """
+
+        if not pushi.net.aio.asyncio:
+            self.skipTest("asyncio not available")
+
+        _socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        _socket.bind(("127.0.0.1", 0))
+        self.port = _socket.getsockname()[1]
+        _socket.close()
+
+        self.server = pushi.AsyncioServer()
+        self.thread = threading.Thread(
+            target=self.server.serve, kwargs=dict(port=self.port)
+        )
+        self.thread.start()
+        self.addCleanup(self.thread.join)
+        self.addCleanup(self.server.stop)
+
+    def test_handshake(self):
+        """
+        Tests that the connection is established and that the events
+        sent from another thread reach the client.
+        """
+
+        client = self.connect()
+        self.addCleanup(client.close)
+        client.sendall(
+            b"GET /"
+            + b"x" * 64
+            + b" HTTP/1.1\r\n"
+            + b"Upgrade: websocket\r\n"
+            + b"Connection: Upgrade\r\n"
+            + b"Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n"
+            + b"Sec-WebSocket-Version: 13\r\n\r\n"
+        )
+
+        data = self.receive(client, b"connection_established")
+        response, _sep, frame = data.partition(b"\r\n\r\n")
+        decoded, _remaining = netius.common.decode_ws(frame)
+        json_d = json.loads(decoded.decode("utf-8"))
+        socket_id = json.loads(json_d["data"])["socket_id"]
+
+        self.assertTrue(response.startswith(b"HTTP/1.1 101"))
+        self.assertEqual(list(self.server.sockets.keys()), [socket_id])
+
+        self.server.send_socket(socket_id, dict(event="message", data="hello"))
+        decoded, _remaining = netius.common.decode_ws(self.receive(client, b"hello"))
+
+        self.assertEqual(
+            json.loads(decoded.decode("utf-8")), dict(event="message", data="hello")
+        )
+
+    def connect(self, retries=50):
+        for _index in range(retries):
+            try:
+                return socket.create_connection(("127.0.0.1", self.port), timeout=5.0)
+            except socket.error:
+                time.sleep(0.1)
+        raise RuntimeError("Server not available")
+
+    def receive(self, client, token):
+        data = b""
+        while not token in data:
+            chunk = client.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+        return data
+
+
+class AsyncioWorkersTest(unittest.TestCase):
+    """
+    Unit tests for the asyncio backend in workers mode.
+
+    Runs both the master and a worker in the same process (no fork is
+    performed), connected by the two sides of a worker bus.
+    """
+
+    def setUp(self):
+        """
+        Sets up test fixtures before each test method.
+        """
+
+        if not pushi.net.aio.asyncio:
+            self.skipTest("asyncio not available")
+        if mock == None:
+            self.skipTest("Skipping test: mock unavailable")
+
+        master_b = bus.WorkerBus(1)
+        worker_b = bus.WorkerBus(0)
+        parent_s, child_s = master_b.pairs[0]
+        master_b.sockets, master_b.locks = [parent_s], [threading.Lock()]
+        worker_b.sockets, worker_b.locks = [child_s], [threading.Lock()]
+        self.addCleanup(child_s.close)
+        self.addCleanup(parent_s.close)
+
+        self.master = pushi.State()
+        self.master.server = pushi.AsyncioServer()
+        self.master.bus = master_b
+
+        self.worker = pushi.State()
+        self.worker.server = pushi.AsyncioServer()
+        self.worker.bus = worker_b
+        self.worker.worker = 0
+
+    def test_workers(self):
+        """
+        Tests that the master loop is started (without serving) and that
+        the messages of the bus are handled in the loops of the master
+        and of the worker, the worker listening the bus upon start.
+        """
+
+        threads = dict()
+        events = dict(master=threading.Event(), worker=threading.Event())
+
+        def on_bus(name):
+            def on_bus(message):
+                threads[name] = threading.current_thread().ident
+                events[name].set()
+
+            return on_bus
+
+        thread = self.master.start_loop()
+        self.addCleanup(thread.join, 5.0)
+        self.addCleanup(self.master.server.stop)
+        self.master.bus.listen(self.master.on_bus_master)
+
+        _socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        _socket.bind(("127.0.0.1", 0))
+        port = _socket.getsockname()[1]
+        _socket.close()
+
+        self.worker.server.bind("start", self.worker.on_worker_start)
+        worker = threading.Thread(
+            target=self.worker.server.serve, kwargs=dict(port=port)
+        )
+        worker.start()
+        self.addCleanup(worker.join, 5.0)
+        self.addCleanup(self.worker.server.stop)
+
+        with mock.patch.object(
+            self.master, "on_bus", on_bus("master")
+        ), mock.patch.object(self.worker, "on_bus", on_bus("worker")):
+            for _index in range(50):
+                if self.worker.bus.callback:
+                    break
+                time.sleep(0.1)
+            self.master.bus.publish(dict(type="send", channel="global"))
+            self.worker.bus.send(dict(type="trigger", kwargs=dict()))
+            self.assertTrue(events["master"].wait(5.0))
+            self.assertTrue(events["worker"].wait(5.0))
+
+        self.assertEqual(threads["master"], thread.ident)
+        self.assertEqual(threads["worker"], worker.ident)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import unittest
+
+import pushi
+
+
+class LoopbackBrokerTest(unittest.TestCase):
+    """
+    Unit tests for the LoopbackBroker class.
+
+    Tests the interest based routing of the messages among the
+    nodes connected to the same (loopback) hub.
+    """
+
+    def setUp(self):
+        """
+        Sets up test fixtures before each test method, connecting
+        three brokers to a private hub.
+        """
+
+        self.hub = pushi.LoopbackHub()
+        self.messages = dict()
+        self.brokers = []
+        for node_id in ("first", "second", "third"):
+            broker = pushi.LoopbackBroker(node_id=node_id, hub=self.hub)
+            messages = self.messages.setdefault(node_id, [])
+            broker.connect(messages.append)
+            self.brokers.append(broker)
+
+    def test_publish(self):
+        """
+        Tests that a message is only delivered to the other nodes that
+        have registered interest in the channel.
+        """
+
+        first, second, third = self.brokers
+        first.interest("app_id", "global")
+        second.interest("app_id", "global")
+
+        first.publish("app_id", "global", dict(data="hello"))
+
+        self.assertEqual(self.messages["first"], [])
+        self.assertEqual(self.messages["second"], [dict(data="hello")])
+        self.assertEqual(self.messages["third"], [])
+
+        first.publish("other_id", "global", dict(data="hello"))
+
+        self.assertEqual(len(self.messages["second"]), 1)
+
+    def test_disinterest(self):
+        """
+        Tests that the nodes without interest (or disconnected) no
+        longer receive the messages of the channel.
+        """
+
+        first, second, third = self.brokers
+        second.interest("app_id", "global")
+        third.interest("app_id", "global")
+
+        second.disinterest("app_id", "global")
+        third.disconnect()
+        first.publish("app_id", "global", dict(data="hello"))
+
+        self.assertEqual(self.messages["second"], [])
+        self.assertEqual(self.messages["third"], [])
+        self.assertEqual(self.hub.interests, dict())
+
+
+if __name__ == "__main__":
+    unittest.main()
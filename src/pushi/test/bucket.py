@@ -0,0 +1,78 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import unittest
+
+import pushi
+
+
+class TokenBucketTest(unittest.TestCase):
+    """
+    Unit tests for the TokenBucket class.
+
+    Tests the consumption and the (lazy) refill of the tokens
+    of the bucket according to the elapsed time.
+    """
+
+    def test_consume(self):
+        """
+        Tests that the burst is admitted and then the rate is enforced.
+        """
+
+        bucket = pushi.TokenBucket(2, burst=3, timestamp=0)
+
+        self.assertTrue(bucket.consume(timestamp=0))
+        self.assertTrue(bucket.consume(timestamp=0))
+        self.assertTrue(bucket.consume(timestamp=0))
+        self.assertFalse(bucket.consume(timestamp=0))
+        self.assertTrue(bucket.consume(timestamp=0.5))
+        self.assertFalse(bucket.consume(timestamp=0.5))
+        self.assertEqual(bucket.tokens, 0.0)
+
+        self.assertTrue(bucket.consume(count=3, timestamp=10))
+        self.assertFalse(bucket.consume(timestamp=10))
+
+    def test_configure(self):
+        """
+        Tests that the capacity defaults to the rate (minimum of one).
+        """
+
+        bucket = pushi.TokenBucket(0.1)
+
+        self.assertEqual(bucket.burst, 1)
+        self.assertEqual(bucket.tokens, 1.0)
+
+        bucket.configure(5)
+
+        self.assertEqual(bucket.burst, 5.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import unittest
+import threading
+
+import pushi
+
+
+class WorkerBusTest(unittest.TestCase):
+    """
+    Unit tests for the WorkerBus class.
+
+    Tests the relay of messages between the master and the
+    worker sides of the bus, using the socket pairs directly.
+    """
+
+    def setUp(self):
+        """
+        Sets up test fixtures before each test method, building both
+        sides of the bus in the same process (no fork is performed).
+        """
+
+        self.master = pushi.WorkerBus(1)
+        self.child = pushi.WorkerBus(0)
+        parent_s, child_s = self.master.pairs[0]
+        self.master.sockets = [parent_s]
+        self.master.locks = [threading.Lock()]
+        self.child.sockets = [child_s]
+        self.child.locks = [threading.Lock()]
+
+    def tearDown(self):
+        """
+        Closes the sockets of both sides of the bus.
+        """
+
+        for _socket in self.master.sockets + self.child.sockets:
+            _socket.close()
+
+    def test_publish(self):
+        """
+        Tests that the messages published by the master are received
+        by the worker in order and with the same contents.
+        """
+
+        messages = []
+        event = threading.Event()
+
+        def callback(message):
+            messages.append(message)
+            if len(messages) == 2:
+                event.set()
+
+        self.child.listen(callback)
+        self.master.publish(dict(type="send", channel="global", data="hello"))
+        self.master.publish(dict(type="send", channel="global", data="x" * 65536))
+
+        self.assertTrue(event.wait(5.0))
+        self.assertEqual(messages[0], dict(type="send", channel="global", data="hello"))
+        self.assertEqual(messages[1]["data"], "x" * 65536)
+
+    def test_close(self):
+        """
+        Tests that the closing of the master side is notified to the worker.
+        """
+
+        event = threading.Event()
+
+        self.child.listen(lambda message: None, close_callback=event.set)
+        self.master.sockets[0].close()
+
+        self.assertTrue(event.wait(5.0))
+
+    def test_close_error(self):
+        """
+        Tests that an error reading from the socket (eg: the socket is
+        closed while being read) is notified as the closing of the bus.
+        """
+
+        event = threading.Event()
+
+        self.child.sockets[0].close()
+        self.child.listen(lambda message: None, close_callback=event.set)
+
+        self.assertTrue(event.wait(5.0))
+
+    def test_send(self):
+        """
+        Tests that the messages sent by the worker reach the master.
+        """
+
+        messages = []
+        event = threading.Event()
+
+        def callback(message):
+            messages.append(message)
+            event.set()
+
+        self.master.listen(callback)
+        self.child.send(dict(type="trigger", kwargs=dict(app_id="app_id")))
+
+        self.assertTrue(event.wait(5.0))
+        self.assertEqual(messages, [dict(type="trigger", kwargs=dict(app_id="app_id"))])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,227 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import time
+import unittest
+
+import pushi
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+class HistoryCacheTest(unittest.TestCase):
+    """
+    Unit tests for the HistoryCache class.
+
+    Tests the filling, the write-through and the (LRU) eviction
+    of the cached history of the channels.
+    """
+
+    def test_get(self):
+        """
+        Tests that the pages within the cached events are hits and that
+        the ones beyond them are misses, unless the history is complete.
+        """
+
+        cache = pushi.HistoryCache(count=3)
+
+        self.assertEqual(cache.get(("app_id", "global")), None)
+
+        cache.fill(("app_id", "global"), [3, 2, 1])
+        cache.add(("app_id", "global"), 4)
+        cache.add(("app_id", "other"), 4)
+
+        self.assertEqual(cache.get(("app_id", "global"), count=2), [4, 3])
+        self.assertEqual(cache.get(("app_id", "global"), skip=1, count=2), [3, 2])
+        self.assertEqual(cache.get(("app_id", "global"), skip=2, count=2), None)
+        self.assertFalse(("app_id", "other") in cache)
+
+        cache.fill(("app_id", "other"), [1])
+
+        self.assertEqual(cache.get(("app_id", "other"), count=10), [1])
+
+    def test_evict(self):
+        """
+        Tests that the least recently used channels are evicted first.
+        """
+
+        cache = pushi.HistoryCache(count=3, size=2)
+        cache.fill(("app_id", "first"), [1])
+        cache.fill(("app_id", "second"), [1])
+        cache.get(("app_id", "first"))
+        cache.fill(("app_id", "third"), [1])
+
+        self.assertEqual(len(cache), 2)
+        self.assertTrue(("app_id", "first") in cache)
+        self.assertFalse(("app_id", "second") in cache)
+
+    def test_interleave(self):
+        """
+        Tests that a fill racing with the write-through of an event is
+        discarded and that an event already filled is not added twice.
+        """
+
+        key = ("app_id", "global")
+        first = dict(mid="first")
+        second = dict(mid="second")
+
+        # read of the data source, then the event is persisted (and
+        # added) before the fill, that must be discarded as it's stale
+        cache = pushi.HistoryCache(count=3)
+        version = cache.version(key)
+        cache.add(key, second)
+        cache.fill(key, [first], version=version)
+
+        self.assertFalse(key in cache)
+        self.assertEqual(cache.get(key), None)
+
+        # the event is persisted before the read of the data source and
+        # added after the fill, that must ignore it (already cached)
+        cache = pushi.HistoryCache(count=3)
+        version = cache.version(key)
+        cache.fill(key, [second, first], version=version)
+        cache.add(key, second)
+
+        self.assertEqual(cache.get(key), [second, first])
+
+        # a version dropped from the (bounded) versions map invalidates
+        # the pending fills, as the channel version is no longer known
+        cache = pushi.HistoryCache(count=3, size=1)
+        version = cache.version(key)
+        cache.add(key, second)
+        cache.add(("app_id", "other"), first)
+        cache.fill(key, [first], version=version)
+
+        self.assertFalse(key in cache)
+
+
+class AppCacheTest(unittest.TestCase):
+    """
+    Unit tests for the AppCache class.
+
+    Tests the lookup by identifier and key, the invalidation and
+    the expiration (TTL) of the cached app records.
+    """
+
+    def build_app(self, ident="app_id", key="app_key"):
+        app = mock.MagicMock()
+        app.ident = ident
+        app.key = key
+        return app
+
+    def test_get(self):
+        """
+        Tests that a cached app is retrieved by both its identifier
+        and its key and that it's removed once invalidated.
+        """
+
+        cache = pushi.AppCache(ttl=60.0)
+        app = self.build_app()
+
+        self.assertEqual(cache.get(app_id="app_id"), None)
+
+        cache.put(app)
+
+        self.assertEqual(cache.get(app_id="app_id"), app)
+        self.assertEqual(cache.get(app_key="app_key"), app)
+        self.assertEqual(cache.get(app_key="other"), None)
+
+        cache.invalidate(app_key="app_key")
+
+        self.assertEqual(cache.get(app_id="app_id"), None)
+        self.assertEqual(cache.get(app_key="app_key"), None)
+        self.assertEqual(len(cache), 0)
+
+    def test_expire(self):
+        """
+        Tests that the cached apps expire after the TTL and that
+        a zero TTL disables the cache.
+        """
+
+        cache = pushi.AppCache(ttl=0.01)
+        cache.put(self.build_app())
+        time.sleep(0.02)
+
+        self.assertEqual(cache.get(app_id="app_id"), None)
+        self.assertFalse("app_id" in cache)
+
+        cache = pushi.AppCache(ttl=0)
+        cache.put(self.build_app())
+
+        self.assertEqual(cache.get(app_id="app_id"), None)
+
+    def test_generation(self):
+        """
+        Tests that an app retrieved before an invalidation is not
+        added to the cache, as it may be stale.
+        """
+
+        cache = pushi.AppCache(ttl=60.0)
+        generation = cache.generation
+        cache.invalidate(app_id="app_id")
+        cache.put(self.build_app(), generation=generation)
+
+        self.assertEqual(cache.get(app_id="app_id"), None)
+
+        cache.put(self.build_app(), generation=cache.generation)
+
+        self.assertNotEqual(cache.get(app_id="app_id"), None)
+
+    def test_missing(self):
+        """
+        Tests that the negative entries of unknown apps are bounded, that
+        they expire and that they're removed once the app is cached.
+        """
+
+        cache = pushi.AppCache(ttl=60.0, miss_ttl=60.0, size=2)
+        cache.put_missing(app_key="first")
+        cache.put_missing(app_key="second")
+        cache.put_missing(app_key="third")
+
+        self.assertFalse(cache.is_missing(app_key="first"))
+        self.assertTrue(cache.is_missing(app_key="second"))
+        self.assertTrue(cache.is_missing(app_key="third"))
+
+        cache.put(self.build_app(key="third"))
+
+        self.assertFalse(cache.is_missing(app_key="third"))
+
+        cache = pushi.AppCache(ttl=60.0, miss_ttl=0.01)
+        cache.put_missing(app_id="app_id")
+        time.sleep(0.02)
+
+        self.assertFalse(cache.is_missing(app_id="app_id"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import json
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from pushi.net import client
+
+
+class PushiProtocolTest(unittest.TestCase):
+    """
+    Unit tests for the PushiProtocol class.
+
+    Tests the (client side) resume of the channels upon re-connection,
+    capturing the events sent instead of using a real connection.
+    """
+
+    def setUp(self):
+        """
+        Sets up test fixtures before each test method.
+        """
+
+        self.protocol = client.PushiProtocol()
+        self.protocol.state = "connected"
+        self.protocol.api = mock.MagicMock()
+        self.protocol.send_event = mock.MagicMock()
+
+    def test_resume_failed(self):
+        """
+        Tests that a subscription that could not be resumed drops the
+        stale mid of the channel and falls back to the latest events.
+        """
+
+        channel = self.protocol.subscribe_pushi("global")
+        channel.mid = "mid"
+
+        self.protocol.send_event.reset_mock()
+        self.protocol.on_message_pushi(
+            dict(
+                event="pusher_internal:subscription_succeeded",
+                channel="global",
+                data=json.dumps(dict(name="global", alias=[], resumed=False)),
+            )
+        )
+
+        self.assertEqual(channel.mid, None)
+        self.protocol.send_event.assert_called_once_with(
+            "pusher:latest", dict(channel="global", skip=0, count=10)
+        )
+
+    def test_resume_personal(self):
+        """
+        Tests that a personal channel is resumed using the mids of the
+        events received through each one of its alias channels.
+        """
+
+        self.protocol.subscribe_pushi("personal-user")
+        self.protocol.on_message_pushi(
+            dict(
+                event="pusher_internal:subscription_succeeded",
+                channel="personal-user",
+                data=json.dumps(dict(name="personal-user", alias=["global", "other"])),
+            )
+        )
+        self.protocol.on_message_pushi(
+            dict(event="message", channel="global", data="hello", mid="mid")
+        )
+
+        self.protocol.send_event.reset_mock()
+        self.protocol.on_connect_pushi(dict(socket_id="socket_id"))
+
+        _event, data = self.protocol.send_event.call_args[0]
+        self.assertEqual(data["channel"], "personal-user")
+        self.assertEqual(data["mids"], {"global": "mid"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import sys
+import unittest
+import threading
+
+import pushi
+
+
+class MetricsTest(unittest.TestCase):
+    """
+    Unit tests for the Metrics class.
+
+    Tests the accounting of the various metric types and their
+    rendering using the Prometheus text exposition format.
+    """
+
+    def test_counter(self):
+        """
+        Tests the rendering of a labeled counter.
+        """
+
+        metrics = pushi.Metrics()
+        counter = metrics.counter("events_total", "Number of events", label="type")
+        counter.inc("public")
+        counter.inc("public")
+        counter.inc("private", value=3)
+
+        self.assertEqual(
+            metrics.render(),
+            "# HELP events_total Number of events\n"
+            "# TYPE events_total counter\n"
+            'events_total{type="private"} 3\n'
+            'events_total{type="public"} 2\n',
+        )
+
+    def test_gauge(self):
+        """
+        Tests that the gauge values are computed upon rendering.
+        """
+
+        metrics = pushi.Metrics()
+        metrics.gauge("connections", "Number of connections", lambda: 2)
+
+        self.assertEqual(
+            metrics.render(),
+            "# HELP connections Number of connections\n"
+            "# TYPE connections gauge\n"
+            "connections 2\n",
+        )
+
+    def test_histogram(self):
+        """
+        Tests that the bucket counts of the histogram are cumulative.
+        """
+
+        metrics = pushi.Metrics()
+        histogram = metrics.histogram("latency", "Latency", buckets=(0.1, 1.0))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(2.0)
+
+        self.assertEqual(
+            metrics.render(),
+            "# HELP latency Latency\n"
+            "# TYPE latency histogram\n"
+            'latency_bucket{le="0.1"} 1\n'
+            'latency_bucket{le="1.0"} 2\n'
+            'latency_bucket{le="+Inf"} 3\n'
+            "latency_sum 2.55\n"
+            "latency_count 3\n",
+        )
+
+    def test_concurrent(self):
+        """
+        Tests that the metrics may be rendered while being updated (with
+        new keys) from other threads, without losing any of the updates.
+        """
+
+        # switches threads as often as possible (when supported) so that
+        # the rendering is interleaved with the insertion of new keys
+        if hasattr(sys, "setswitchinterval"):
+            self.addCleanup(sys.setswitchinterval, sys.getswitchinterval())
+            sys.setswitchinterval(1e-6)
+
+        metrics = pushi.Metrics()
+        counter = metrics.counter("events_total", "Number of events", label="type")
+        histogram = metrics.histogram("latency", "Latency", label="type")
+
+        def update(index):
+            for value in range(1000):
+                counter.inc("%d-%d" % (index, value))
+                histogram.observe(0.01, key="%d-%d" % (index, value))
+
+        threads = [threading.Thread(target=update, args=(index,)) for index in range(4)]
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            metrics.render()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sum(counter.get_values().values()), 4000)
+        self.assertEqual(len(histogram.samples()), 4000 * (len(histogram.buckets) + 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
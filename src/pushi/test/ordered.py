@@ -0,0 +1,90 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import copy
+import unittest
+
+import pushi
+
+
+class OrderedSetTest(unittest.TestCase):
+    """
+    Unit tests for the OrderedSet class.
+
+    Tests the membership operations and the keeping of the insertion
+    order of the items.
+    """
+
+    def test_order(self):
+        """
+        Tests that the items are iterated in the order they were added
+        and that adding an existing item keeps its original position.
+        """
+
+        items = pushi.OrderedSet(["c", "a"])
+        items.add("b")
+        items.add("c")
+
+        self.assertEqual(list(items), ["c", "a", "b"])
+        self.assertEqual(len(items), 3)
+        self.assertTrue("a" in items)
+        self.assertFalse("d" in items)
+
+    def test_remove(self):
+        """
+        Tests the removal of items, with the remove operation raising
+        for unknown items and the discard one ignoring them.
+        """
+
+        items = pushi.OrderedSet(["a", "b", "c"])
+        items.remove("b")
+        items.discard("d")
+
+        self.assertEqual(list(items), ["a", "c"])
+        self.assertRaises(KeyError, items.remove, "d")
+
+        items.discard("a")
+        items.discard("c")
+
+        self.assertEqual(len(items), 0)
+        self.assertFalse(items)
+
+    def test_copy(self):
+        """
+        Tests that a copy of the set is not changed by the changes
+        made to the original one.
+        """
+
+        items = pushi.OrderedSet(["a", "b"])
+        other = copy.copy(items)
+        items.add("c")
+
+        self.assertEqual(list(other), ["a", "b"])
+        self.assertEqual(list(items.copy()), ["a", "b", "c"])
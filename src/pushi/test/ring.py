@@ -0,0 +1,88 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import unittest
+
+import pushi
+
+
+class RingBufferTest(unittest.TestCase):
+    """
+    Unit tests for the RingBuffer class.
+
+    Tests the retrieval of the events sent after a mid and the
+    bounding of the buffer both per channel and in memory.
+    """
+
+    def test_since(self):
+        """
+        Tests that the events after the mid are returned in order and
+        that an unknown (or evicted) mid is reported as a gap.
+        """
+
+        ring = pushi.RingBuffer(count=3)
+        for index in range(5):
+            ring.add(("app_id", "global"), dict(mid=str(index), data="hello"))
+        ring.add(("app_id", "global"), dict(data="transient"))
+
+        self.assertEqual(
+            ring.since(("app_id", "global"), "2"),
+            [dict(mid="3", data="hello"), dict(mid="4", data="hello")],
+        )
+        self.assertEqual(ring.since(("app_id", "global"), "4"), [])
+        self.assertEqual(ring.since(("app_id", "global"), "1"), None)
+        self.assertEqual(ring.since(("app_id", "other"), "1"), None)
+
+    def test_evict(self):
+        """
+        Tests that the oldest events of the least recently written
+        channels are evicted once the memory limit is reached.
+        """
+
+        ring = pushi.RingBuffer(count=10, size=1000)
+        ring.add(("app_id", "first"), dict(mid="1", data="x" * 300))
+        ring.add(("app_id", "second"), dict(mid="2", data="x" * 300))
+        ring.add(("app_id", "second"), dict(mid="3", data="x" * 100))
+
+        self.assertFalse(("app_id", "first") in ring)
+        self.assertEqual(len(ring), 1)
+        self.assertEqual(ring.bytes, 656)
+        self.assertEqual(
+            ring.since(("app_id", "second"), "2"), [dict(mid="3", data="x" * 100)]
+        )
+
+        ring.clear()
+
+        self.assertEqual(len(ring), 0)
+        self.assertEqual(ring.bytes, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
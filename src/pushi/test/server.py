@@ -0,0 +1,821 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import zlib
+import json
+import unittest
+import threading
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import netius
+
+import pushi
+
+
+class PushiServerTest(unittest.TestCase):
+    """
+    Unit tests for the PushiServer class.
+
+    Tests the sending of messages to the connections, making sure
+    that the encoding of the messages is shared by the connections.
+    """
+
+    def setUp(self):
+        """
+        Sets up test fixtures before each test method.
+        """
+
+        self.server = pushi.PushiServer()
+
+    def build_connection(self):
+        """
+        Builds a socket-less connection, registered in the server
+        and ready to have data sent through it.
+        """
+
+        connection = self.server.build_connection(None, ("127.0.0.1", 0))
+        connection.status = netius.OPEN
+        self.server.sockets[connection.socket_id] = connection
+        return connection
+
+    def test_message(self):
+        """
+        Tests that the message serialization and frame are cached.
+        """
+
+        message = pushi.PushiMessage(dict(event="message", data="hello"))
+
+        self.assertEqual(
+            json.loads(message.data()), dict(event="message", data="hello")
+        )
+        self.assertIs(message.data(), message.data())
+        self.assertIs(message.frame(), message.frame())
+        self.assertEqual(message.frame()[0:1], b"\x81")
+
+    def test_send_sockets(self):
+        """
+        Tests that the same frame buffer is shared by all the connections.
+        """
+
+        first = self.build_connection()
+        second = self.build_connection()
+
+        message = self.server.send_sockets(
+            [first.socket_id, second.socket_id, "unknown"], dict(event="message")
+        )
+
+        self.assertIs(first.pending[0][0], message.frame())
+        self.assertIs(second.pending[0][0], message.frame())
+        self.assertEqual(first.count, 1)
+        self.assertEqual(second.count, 1)
+        self.assertEqual(self.server.count, 2)
+
+    def test_negotiate(self):
+        """
+        Tests the negotiation of the permessage-deflate extension.
+        """
+
+        self.server.deflate = True
+        connection = self.build_connection()
+        connection.headers["sec-websocket-extensions"] = (
+            "x-webkit-deflate-frame, "
+            "permessage-deflate; client_max_window_bits; server_max_window_bits=10"
+        )
+
+        extensions = connection.negotiate()
+
+        self.assertEqual(
+            extensions,
+            "permessage-deflate; server_no_context_takeover; server_max_window_bits=10",
+        )
+        self.assertTrue(connection.deflate)
+        self.assertEqual(connection.deflate_bits, 10)
+        self.assertEqual(connection.deflater, None)
+
+        response = self.server._handshake_response("key", extensions=extensions)
+        self.assertTrue(
+            response.endswith("Sec-WebSocket-Extensions: %s\r\n\r\n" % extensions)
+        )
+
+    def test_negotiate_invalid(self):
+        """
+        Tests that unknown or disabled offers are declined.
+        """
+
+        connection = self.build_connection()
+        connection.headers["sec-websocket-extensions"] = "permessage-deflate; unknown=1"
+        self.assertEqual(connection.negotiate(), None)
+        self.assertFalse(connection.deflate)
+
+        connection.headers["sec-websocket-extensions"] = "permessage-deflate"
+        self.server.deflate = False
+        self.assertEqual(connection.negotiate(), None)
+        self.assertFalse(connection.deflate)
+
+    def test_send_deflate(self):
+        """
+        Tests that the compressed frame is shared by the connections and
+        that it may be inflated back into the original message.
+        """
+
+        self.server.deflate = True
+        first = self.build_connection()
+        second = self.build_connection()
+        plain = self.build_connection()
+        for connection in (first, second):
+            connection.headers["sec-websocket-extensions"] = "permessage-deflate"
+            connection.negotiate()
+
+        json_d = dict(event="message", data="hello " * 100)
+        message = self.server.send_sockets(
+            [first.socket_id, second.socket_id, plain.socket_id], json_d
+        )
+
+        frame = first.pending[0][0]
+        self.assertIs(frame, second.pending[0][0])
+        self.assertIs(plain.pending[0][0], message.frame())
+        self.assertEqual(frame[0:1], b"\xc1")
+        self.assertTrue(len(frame) < len(message.frame()))
+
+        decoded, _remaining = netius.common.decode_ws(frame)
+        inflater = zlib.decompressobj(-15)
+        data = inflater.decompress(decoded + b"\x00\x00\xff\xff")
+        self.assertEqual(json.loads(data.decode("utf-8")), json_d)
+
+        # sends a message smaller than the minimum size for compression
+        # making sure that the plain frame is used instead
+        message = self.server.send_sockets([first.socket_id], dict(event="ping"))
+        self.assertIs(first.pending[0][0], message.frame())
+
+    def test_on_data_deflate(self):
+        """
+        Tests that compressed frames received are inflated.
+        """
+
+        self.server.deflate = True
+        connection = self.build_connection()
+        connection.headers["sec-websocket-extensions"] = "permessage-deflate"
+        connection.negotiate()
+        connection.handshake = True
+
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        data = b'{"event": "client-move"}'
+        compressed = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        frame = netius.common.encode_ws(compressed[:-4], mask=True)
+        frame = b"\xc1" + frame[1:]
+
+        with mock.patch.object(self.server, "on_data_ws") as on_data_ws:
+            self.server.on_data(connection, frame)
+            on_data_ws.assert_called_once_with(connection, data, opcode=0x01)
+
+    def test_negotiate_protocol(self):
+        """
+        Tests the negotiation of the binary (MessagePack) subprotocol.
+        """
+
+        self.server.binary = True
+        connection = self.build_connection()
+
+        self.assertEqual(connection.negotiate_protocol(), None)
+        self.assertFalse(connection.binary)
+
+        connection.headers["sec-websocket-protocol"] = "chat, pushi.msgpack"
+        protocol = connection.negotiate_protocol()
+
+        self.assertEqual(protocol, "pushi.msgpack")
+        self.assertTrue(connection.binary)
+
+        response = self.server._handshake_response(
+            "key", extensions="permessage-deflate", protocol=protocol
+        )
+        self.assertTrue(
+            response.endswith(
+                "Sec-WebSocket-Extensions: permessage-deflate\r\n"
+                "Sec-WebSocket-Protocol: pushi.msgpack\r\n\r\n"
+            )
+        )
+
+    def test_send_binary(self):
+        """
+        Tests that binary connections receive a shared binary frame with
+        the nested JSON documents decoded, while text ones keep JSON.
+        """
+
+        binary = self.build_connection()
+        binary.binary = True
+        text = self.build_connection()
+        json_d = dict(event="message", channel="global", data='{"value": 1}')
+
+        message = self.server.send_sockets([binary.socket_id, text.socket_id], json_d)
+
+        self.assertEqual(binary.pending[0][0], message.binary())
+        self.assertEqual(text.pending[0][0], message.frame())
+        self.assertEqual(netius.legacy.ord(message.binary()[0]), 0x82)
+
+        decoded, _remaining = netius.common.decode_ws(message.binary())
+        self.assertEqual(
+            pushi.net.server.decode_binary(decoded),
+            dict(event="message", channel="global", data=dict(value=1)),
+        )
+
+        encoded = pushi.net.server.encode_binary(dict(data="[invalid", member="1"))
+        self.assertEqual(
+            pushi.net.server.decode_binary(encoded), dict(data="[invalid", member="1")
+        )
+
+    def test_on_data_binary(self):
+        """
+        Tests that binary frames received are decoded using MessagePack.
+        """
+
+        connection = self.build_connection()
+        connection.binary = True
+        connection.handshake = True
+
+        data = pushi.net.server.encode_binary(dict(event="client-move"))
+        frame = netius.common.encode_ws(data, opcode=0x02, mask=True)
+
+        with mock.patch.object(self.server, "handle_event") as handle_event:
+            self.server.on_data(connection, frame)
+            handle_event.assert_called_once_with(connection, dict(event="client-move"))
+
+    def test_dispatch(self):
+        """
+        Tests that the inbound events are dispatched to the protocol
+        handlers and that any other event is handled as a client event.
+        """
+
+        connection = self.build_connection()
+
+        self.assertEqual(
+            self.server.resolve("pusher:subscribe"),
+            self.server.handle_pusher_subscribe,
+        )
+        self.assertEqual(self.server.resolve("client-move"), self.server.handle_event)
+
+        with mock.patch.object(self.server, "handle_event") as handle_event:
+            self.server.on_data_ws(connection, b'{"event": "client-move"}')
+            handle_event.assert_called_once_with(connection, dict(event="client-move"))
+
+        self.assertRaises(
+            netius.DataError, self.server.on_data_ws, connection, b'{"data": 1}'
+        )
+        self.assertRaises(netius.DataError, self.server.on_data_ws, connection, b"{")
+
+    def test_dispatch_subclass(self):
+        """
+        Tests that the handler methods of a subclass are dispatched by
+        the name of their events and that the dispatch table is built
+        once for each class.
+        """
+
+        class CustomServer(pushi.PushiServer):
+            def handle_pusher_custom(self, connection, json_d):
+                pass
+
+        server = CustomServer()
+        connection = server.build_connection(None, ("127.0.0.1", 0))
+
+        with mock.patch.object(server, "handle_pusher_custom") as handle_custom:
+            server.on_data_ws(connection, b'{"event": "pusher:custom"}')
+            handle_custom.assert_called_once_with(
+                connection, dict(event="pusher:custom")
+            )
+
+        self.assertEqual(server.resolve("pusher:ping"), server.handle_pusher_ping)
+        self.assertEqual(
+            CustomServer.get_dispatch()["pusher_custom"], "handle_pusher_custom"
+        )
+        self.assertIs(CustomServer.get_dispatch(), server.dispatch)
+        self.assertNotIn("pusher_custom", pushi.PushiServer.get_dispatch())
+
+    def test_register(self):
+        """
+        Tests that a registered handler is called for its custom event
+        and that the default handling is restored once unregistered.
+        """
+
+        connection = self.build_connection()
+        handler = mock.MagicMock()
+
+        self.server.register("client-move", handler)
+        self.server.on_data_ws(connection, b'{"event": "client-move", "data": 1}')
+        handler.assert_called_once_with(connection, dict(event="client-move", data=1))
+
+        self.server.unregister("client-move")
+        with mock.patch.object(self.server, "handle_event") as handle_event:
+            self.server.on_data_ws(connection, b'{"event": "client-move"}')
+            self.assertEqual(handle_event.call_count, 1)
+        self.assertEqual(handler.call_count, 1)
+
+    def test_heartbeat(self):
+        """
+        Tests that idle connections are pinged and then reaped in case
+        they do not answer, while active connections are re-scheduled.
+        """
+
+        self.server.wheel = pushi.TimerWheel(timestamp=0)
+        self.server.ping_interval = 10
+        self.server.ping_timeout = 5
+
+        active = self.build_connection()
+        idle = self.build_connection()
+        pending = self.build_connection()
+        for connection in (active, idle, pending):
+            connection.handshake = connection != pending
+            connection.activity = 0
+            self.server.wheel.add(connection.socket_id, 10)
+
+        active.activity = 4
+        self.server.heartbeat(10)
+
+        self.assertEqual(active.pinged, None)
+        self.assertEqual(active.count, 0)
+        self.assertEqual(idle.pinged, 10)
+        self.assertEqual(idle.count, 1)
+        self.assertEqual(pending.status, netius.CLOSED)
+        self.assertEqual(self.server.reaped, 1)
+
+        self.server.heartbeat(14)
+
+        self.assertEqual(active.pinged, 14)
+        self.assertEqual(active.count, 1)
+
+        active.activity = 15
+        self.server.heartbeat(15)
+
+        self.assertEqual(idle.status, netius.CLOSED)
+        self.assertEqual(self.server.reaped, 2)
+
+        self.server.heartbeat(19)
+
+        self.assertEqual(active.pinged, None)
+        self.assertEqual(active.status, netius.OPEN)
+        self.assertTrue(active.socket_id in self.server.wheel)
+
+    def test_admit(self):
+        """
+        Tests that the connections of an app are admitted according to
+        the maximum number of connections and the connection rate.
+        """
+
+        connections = []
+        for _index in range(4):
+            connection = self.build_connection()
+            connection.app_key = "app_key"
+            connections.append(connection)
+
+        settings = dict(max_connections=2)
+        self.assertTrue(self.server.admit(connections[0], settings))
+        self.assertTrue(self.server.admit(connections[1], settings))
+        self.assertFalse(self.server.admit(connections[2], settings))
+
+        self.server.release(connections[0])
+        self.server.release(connections[0])
+
+        self.assertEqual(self.server.app_sockets["app_key"], 1)
+        self.assertTrue(self.server.admit(connections[2], settings))
+
+        settings = dict(connection_rate=0.001, connection_burst=1)
+        self.assertTrue(self.server.admit(connections[3], settings))
+        self.assertFalse(self.server.admit(connections[0], settings))
+
+        for connection in connections[1:]:
+            self.server.release(connection)
+
+        self.assertEqual(self.server.app_sockets, dict())
+        self.assertEqual(self.server.app_buckets, dict())
+
+    def test_admit_pipelined(self):
+        """
+        Tests that the frames pipelined after a refused handshake are
+        dropped, never reaching the handlers of the events.
+        """
+
+        app_key = "k" * 64
+        self.server.app_sockets[app_key] = 1
+        self.server.max_connections = 1
+        connection = self.build_connection()
+        subscribe = mock.MagicMock()
+
+        handshake = (
+            b"GET /app/" + app_key.encode("utf-8") + b" HTTP/1.1\r\n"
+            b"Host: localhost\r\n"
+            b"Upgrade: websocket\r\n"
+            b"Connection: Upgrade\r\n"
+            b"Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n"
+            b"Sec-WebSocket-Version: 13\r\n\r\n"
+        )
+        frame = netius.common.encode_ws(
+            b'{"event": "pusher:subscribe", "data": {"channel": "global"}}',
+            mask=True,
+        )
+
+        with mock.patch.object(self.server, "delay"):
+            with mock.patch.dict(
+                self.server.dispatchers, {"pusher:subscribe": subscribe}
+            ):
+                self.server.on_data(connection, handshake + frame)
+                self.server.on_data(connection, frame)
+
+        self.assertEqual(self.server.refused, 1)
+        self.assertFalse(connection.admitted)
+        self.assertTrue(connection.rejected)
+        self.assertEqual(subscribe.call_count, 0)
+
+    def test_admit_resolve(self):
+        """
+        Tests that the settings of an app that is not cached are resolved
+        off the loop, once for concurrent connections, with the frames
+        received meanwhile being parsed only once the connection is admitted.
+        """
+
+        app_key = "k" * 64
+        self.server.state = mock.MagicMock()
+        self.server.state.get_settings_cached.return_value = None
+        self.server.state.get_settings.return_value = dict(max_connections=1)
+        subscribe = mock.MagicMock()
+        resolved = []
+        event = threading.Event()
+
+        def delay(callable, *args, **kwargs):
+            if not callable.__name__ == "<lambda>":
+                return
+            resolved.append(callable)
+            event.set()
+
+        handshake = (
+            b"GET /app/" + app_key.encode("utf-8") + b" HTTP/1.1\r\n"
+            b"Host: localhost\r\n"
+            b"Upgrade: websocket\r\n"
+            b"Connection: Upgrade\r\n"
+            b"Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n"
+            b"Sec-WebSocket-Version: 13\r\n\r\n"
+        )
+        frame = netius.common.encode_ws(
+            b'{"event": "pusher:subscribe", "data": {"channel": "global"}}',
+            mask=True,
+        )
+
+        first = self.build_connection()
+        second = self.build_connection()
+
+        with mock.patch.dict(self.server.dispatchers, {"pusher:subscribe": subscribe}):
+            with mock.patch.object(self.server, "delay", delay):
+                self.server.on_data(first, handshake + frame)
+                self.server.on_data(second, handshake)
+                self.assertTrue(event.wait(5.0))
+
+            self.assertTrue(first.admitting)
+            self.assertEqual(subscribe.call_count, 0)
+            self.assertEqual(len(resolved), 1)
+
+            with mock.patch.object(self.server, "delay"):
+                resolved[0]()
+
+            self.assertEqual(subscribe.call_count, 1)
+
+        self.server.state.get_settings.assert_called_once_with(app_key)
+        self.assertFalse(first.admitting)
+        self.assertTrue(first.admitted)
+        self.assertTrue(second.rejected)
+        self.assertEqual(self.server.refused, 1)
+        self.assertEqual(self.server.resolving, dict())
+
+    def test_throttle(self):
+        """
+        Tests that the messages over the rate limit of the connection
+        are dropped, notifying the client only once.
+        """
+
+        connection = self.build_connection()
+        connection.configure(dict(message_rate=0.001, message_burst=2))
+
+        with mock.patch.object(self.server, "handle_event") as handle_event:
+            for _index in range(4):
+                self.server.on_data_ws(connection, b'{"event": "client-move"}')
+            self.assertEqual(handle_event.call_count, 2)
+
+        self.assertEqual(self.server.throttles, 2)
+        self.assertEqual(connection.count, 1)
+        self.assertTrue(connection.throttled)
+
+    def test_throttle_control(self):
+        """
+        Tests that the control frames (eg: ping) are not charged against
+        the rate limit of the connection, only the data messages are.
+        """
+
+        connection = self.build_connection()
+        connection.configure(dict(message_rate=0.001, message_burst=2))
+
+        with mock.patch.object(self.server, "handle_event") as handle_event:
+            for _index in range(4):
+                self.server.on_data_ws(connection, b"", opcode=0x09)
+            for _index in range(2):
+                self.server.on_data_ws(connection, b'{"event": "client-move"}')
+            self.assertEqual(handle_event.call_count, 2)
+
+        self.assertEqual(self.server.throttles, 0)
+        self.assertFalse(connection.throttled)
+
+    def test_drain(self):
+        """
+        Tests that the draining closes every connection with the reconnect
+        code within the window and then triggers the drained event.
+        """
+
+        first = self.build_connection()
+        second = self.build_connection()
+        drained = mock.MagicMock()
+        self.server.bind("drained", drained)
+
+        with mock.patch.object(self.server, "delay") as delay:
+            self.server.drain(window=10)
+            self.server.drain(window=10)
+
+        self.assertTrue(self.server.draining)
+        self.assertEqual(delay.call_count, 3)
+        for callable, kwargs in [
+            (call[0][0], call[1]) for call in delay.call_args_list
+        ]:
+            self.assertTrue(0 <= kwargs["timeout"] <= 11)
+            callable()
+
+        self.assertEqual(first.pending[0][0][2:4], b"\x10\x68")
+        self.assertEqual(second.pending[0][0][2:4], b"\x10\x68")
+        drained.assert_called_once_with(self.server)
+
+    def test_drain_queue(self):
+        """
+        Tests that the frames queued for a slow connection are flushed
+        before the reconnect close frame and that both the frames sent
+        and received after it are dropped.
+        """
+
+        connection = self.build_connection()
+        self.server.write_window = 0
+        connection.send_pushi(dict(event="first"))
+        connection.send_pushi(dict(event="second"))
+
+        self.assertEqual(len(connection.queue), 2)
+
+        with mock.patch.object(self.server, "delay"):
+            self.server.reconnect(connection)
+
+        connection.send_pushi(dict(event="third"))
+
+        frames = [item[0] for item in connection.pending]
+        self.assertEqual(len(frames), 3)
+        self.assertTrue(b"first" in frames[-1])
+        self.assertTrue(b"second" in frames[-2])
+        self.assertEqual(frames[0][2:4], b"\x10\x68")
+        self.assertEqual(len(connection.queue), 0)
+
+        with mock.patch.object(self.server, "handle_event") as handle_event:
+            self.server.on_data_ws(connection, b'{"event": "client-move"}')
+        self.assertEqual(handle_event.call_count, 0)
+
+    def test_coalesce(self):
+        """
+        Tests that the channel events sent in the window are bundled into
+        a single batch frame, flushed before any non coalesced message.
+        """
+
+        connection = self.build_connection()
+        connection.configure(dict(coalesce=10))
+
+        for index in range(3):
+            connection.send_pushi(dict(event="tick", channel="prices", data=str(index)))
+
+        self.assertEqual(len(connection.pending), 0)
+        self.assertEqual(len(connection.batch), 3)
+        self.assertEqual(connection.count, 3)
+
+        connection.send_pushi(dict(event="pusher:pong", data="{}"))
+
+        self.assertEqual(len(connection.pending), 2)
+        self.assertEqual(connection.batch, [])
+
+        decoded, _remaining = netius.common.decode_ws(connection.pending[-1][0])
+        batch = json.loads(decoded.decode("utf-8"))
+        self.assertEqual(batch["event"], "pusher:batch")
+        self.assertEqual(
+            batch["data"],
+            [
+                dict(event="tick", channel="prices", data=str(index))
+                for index in range(3)
+            ],
+        )
+
+        connection.flush_batch()
+
+        self.assertEqual(len(connection.pending), 2)
+
+    def test_coalesce_channels(self):
+        """
+        Tests that only the channels with the configured prefixes are
+        coalesced and that a single message is sent without envelope.
+        """
+
+        connection = self.build_connection()
+        connection.configure(dict(coalesce=10, coalesce_channels=["prices-"]))
+
+        connection.send_pushi(dict(event="tick", channel="global", data="1"))
+        connection.send_pushi(dict(event="tick", channel="prices-eur", data="1"))
+
+        self.assertEqual(len(connection.pending), 1)
+        self.assertEqual(len(connection.batch), 1)
+
+        message = connection.batch[0]
+        connection.flush_batch()
+
+        self.assertEqual(connection.pending[0][0], message.frame())
+
+    def test_coalesce_binary(self):
+        """
+        Tests that binary connections receive the batch as MessagePack.
+        """
+
+        connection = self.build_connection()
+        connection.binary = True
+        connection.configure(dict(coalesce=10))
+
+        connection.send_pushi(dict(event="tick", channel="prices", data='{"a": 1}'))
+        connection.send_pushi(dict(event="tick", channel="prices", data="2"))
+        connection.flush_batch()
+
+        decoded, _remaining = netius.common.decode_ws(connection.pending[0][0])
+        self.assertEqual(
+            pushi.net.server.decode_binary(decoded),
+            dict(
+                event="pusher:batch",
+                data=[
+                    dict(event="tick", channel="prices", data=dict(a=1)),
+                    dict(event="tick", channel="prices", data="2"),
+                ],
+            ),
+        )
+
+    def test_queue_drop_oldest(self):
+        """
+        Tests that the oldest queued messages are dropped over the limits.
+        """
+
+        connection = self.build_connection()
+        connection.configure(dict(queue_messages=2, queue_policy="drop_oldest"))
+        self.server.write_window = 0
+
+        frames = [
+            connection.encode(pushi.PushiMessage(dict(event="message", data=index)))
+            for index in range(3)
+        ]
+        for frame in frames:
+            connection.send_frame(frame)
+
+        self.assertEqual(list(connection.queue), frames[1:])
+        self.assertEqual(connection.queue_s, len(frames[1]) + len(frames[2]))
+        self.assertEqual(connection.evictions, 1)
+        self.assertEqual(self.server.queued_s, connection.queue_s)
+
+        info = self.server.info_dict()
+        self.assertEqual(info["queued_bytes"], connection.queue_s)
+        self.assertEqual(info["evictions"], 1)
+
+        # enlarges the write window and notifies the connection that
+        # data has been flushed, so that the queue is sent
+        self.server.write_window = 65536
+        connection.on_unpend(connection)
+
+        self.assertEqual(len(connection.queue), 0)
+        self.assertEqual(self.server.queued_s, 0)
+        self.assertEqual(connection.pending[0][0], frames[2])
+
+    def test_queue_drop_newest(self):
+        """
+        Tests that the newest queued messages are dropped over the limits.
+        """
+
+        connection = self.build_connection()
+        connection.configure(dict(queue_bytes=1, queue_policy="drop_newest"))
+        self.server.write_window = 0
+
+        connection.send_pushi(dict(event="message"))
+
+        self.assertEqual(len(connection.queue), 0)
+        self.assertEqual(connection.evictions, 1)
+        self.assertEqual(connection.count, 1)
+
+    def test_conflate(self):
+        """
+        Tests that only the most recent undelivered frame of a conflated
+        channel is kept, being sent after the queued frames.
+        """
+
+        connection = self.build_connection()
+        connection.configure(dict(conflate_channels=["scores-"]))
+        self.server.write_window = 0
+
+        for index in range(3):
+            connection.send_pushi(
+                dict(event="score", channel="conflated-match", data=str(index))
+            )
+        connection.send_pushi(dict(event="message", channel="global", data="1"))
+        connection.send_pushi(dict(event="score", channel="scores-1", data="1"))
+        connection.send_pushi(dict(event="score", channel="scores-1", data="2"))
+
+        self.assertEqual(len(connection.queue), 1)
+        self.assertEqual(
+            list(connection.latest.keys()), ["conflated-match", "scores-1"]
+        )
+        self.assertEqual(connection.conflations, 3)
+        self.assertEqual(self.server.conflations, 3)
+        self.assertEqual(
+            connection.queue_s,
+            sum(len(frame) for frame in connection.queue)
+            + sum(len(frame) for frame in connection.latest.values()),
+        )
+
+        self.server.write_window = 65536
+        connection.on_unpend(connection)
+
+        self.assertEqual(len(connection.latest), 0)
+        self.assertEqual(connection.queue_s, 0)
+        self.assertEqual(self.server.queued_s, 0)
+        payloads = [
+            json.loads(netius.common.decode_ws(pending[0])[0].decode("utf-8"))
+            for pending in reversed(connection.pending)
+        ]
+        self.assertEqual(
+            [(payload["channel"], payload["data"]) for payload in payloads],
+            [("global", "1"), ("conflated-match", "2"), ("scores-1", "2")],
+        )
+
+    def test_conflate_coalesce(self):
+        """
+        Tests that a conflated event replaces the older one in the batch.
+        """
+
+        connection = self.build_connection()
+        connection.configure(dict(coalesce=10))
+
+        connection.send_pushi(dict(event="score", channel="conflated-a", data="1"))
+        connection.send_pushi(dict(event="tick", channel="prices", data="1"))
+        connection.send_pushi(dict(event="score", channel="conflated-a", data="2"))
+
+        self.assertEqual(
+            [message.json_d["data"] for message in connection.batch], ["1", "2"]
+        )
+        self.assertEqual(connection.batch[1].json_d["channel"], "conflated-a")
+
+    def test_queue_disconnect(self):
+        """
+        Tests that the connection is disconnected over the limits.
+        """
+
+        connection = self.build_connection()
+        connection.configure(dict(queue_messages=1, queue_policy="disconnect"))
+        self.server.write_window = 0
+
+        connection.send_pushi(dict(event="message"))
+        connection.send_pushi(dict(event="message"))
+
+        self.assertTrue(connection.overflown)
+        self.assertEqual(len(connection.queue), 0)
+        self.assertEqual(self.server.disconnects, 1)
+        self.assertEqual(connection.pending[0][0][0:4], b"\x88\x0f\x10\x04")
+
+
+if __name__ == "__main__":
+    unittest.main()
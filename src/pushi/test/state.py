@@ -0,0 +1,1152 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import threading
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import netius
+import appier
+
+import pushi
+
+from pushi.base import snapshot
+
+
+class StateTest(unittest.TestCase):
+    """
+    Unit tests for the State class.
+
+    Tests the in-memory channel state management, including the
+    subscription of sockets and the sending of events to channels.
+    """
+
+    def setUp(self):
+        """
+        Sets up test fixtures before each test method.
+        """
+
+        # creates the state with a mocked app and a (socket-less)
+        # server, registering an app state directly so that no data
+        # source access is required
+        self.state = pushi.State()
+        self.state.app = mock.MagicMock()
+        self.state.server = pushi.PushiServer(self.state)
+        self.app_state = pushi.AppState("app_id", "app_key")
+        self.state.app_id_state["app_id"] = self.app_state
+        self.state.app_key_state["app_key"] = self.app_state
+
+    def build_connection(self, channels=()):
+        """
+        Builds a socket-less connection registered in the server and
+        subscribed to the provided (public) channels.
+        """
+
+        connection = self.state.server.build_connection(None, ("127.0.0.1", 0))
+        connection.status = netius.OPEN
+        connection.app_key = "app_key"
+        self.state.server.sockets[connection.socket_id] = connection
+        for channel in channels:
+            self.state.subscribe(connection, "app_key", connection.socket_id, channel)
+        return connection
+
+    def test_subscribe(self):
+        """
+        Tests the subscription and unsubscription of a socket.
+        """
+
+        connection = self.build_connection(channels=("global",))
+        socket_id = connection.socket_id
+
+        self.assertTrue(self.state.is_subscribed("app_key", socket_id, "global"))
+        self.assertEqual(list(self.app_state.channel_sockets["global"]), [socket_id])
+
+        self.state.unsubscribe(connection, "app_key", socket_id, "global")
+
+        self.assertFalse(self.state.is_subscribed("app_key", socket_id, "global"))
+
+    def test_presence(self):
+        """
+        Tests that the sockets of the same user share a single member
+        record, with the member added and removed events being sent
+        only for the first and last socket of the user.
+        """
+
+        first = self.build_connection()
+        second = self.build_connection()
+        other = self.build_connection()
+        channel = "presence-room"
+
+        for connection, user_id in ((first, "a"), (second, "a"), (other, "b")):
+            self.state.subscribe(
+                connection,
+                "app_key",
+                connection.socket_id,
+                channel,
+                channel_data=dict(user_id=user_id),
+                force=True,
+            )
+
+        info = self.app_state.channel_info[channel]
+        self.assertEqual(info.user_count, 2)
+        self.assertIs(
+            self.app_state.get_member(channel, first.socket_id),
+            self.app_state.get_member(channel, second.socket_id),
+        )
+        self.assertEqual(
+            self.state.get_members("app_key", channel),
+            dict(a=dict(user_id="a"), b=dict(user_id="b")),
+        )
+        self.assertEqual(first.count, 1)
+        self.assertEqual(second.count, 1)
+        self.assertEqual(other.count, 0)
+
+        self.state.unsubscribe(first, "app_key", first.socket_id, channel)
+
+        self.assertEqual(info.user_count, 2)
+        self.assertEqual(other.count, 0)
+
+        self.state.unsubscribe(second, "app_key", second.socket_id, channel)
+
+        self.assertEqual(info.user_count, 1)
+        self.assertEqual(other.count, 1)
+        self.assertEqual(self.app_state.get_member(channel, first.socket_id), None)
+
+        self.state.unsubscribe(other, "app_key", other.socket_id, channel)
+
+        self.assertFalse(channel in self.app_state.channel_info)
+
+    def test_presence_diff(self):
+        """
+        Tests that the membership changes in the presence window are
+        coalesced into a single diff event, cancelling the changes that
+        revert each other and without notifying the connections about
+        the addition of their own user, and that above the cap only the
+        count is sent.
+        """
+
+        watcher = self.build_connection()
+        peer = self.build_connection()
+        first = self.build_connection()
+        second = self.build_connection()
+        third = self.build_connection()
+        channel = "presence-room"
+        self.state.presence_window = 100
+
+        def subscribe(connection, user_id):
+            self.state.subscribe(
+                connection,
+                "app_key",
+                connection.socket_id,
+                channel,
+                channel_data=dict(user_id=user_id),
+                force=True,
+            )
+
+        def frames(connection):
+            return [
+                json.loads(netius.common.decode_ws(item[0])[0].decode("utf-8"))
+                for item in reversed(connection.pending)
+            ]
+
+        with mock.patch.object(self.state.server, "delay") as delay:
+            subscribe(watcher, "w")
+            subscribe(peer, "w")
+            self.state.flush_presence("app_key", channel)
+            subscribe(first, "a")
+            subscribe(second, "b")
+            self.state.unsubscribe(second, "app_key", second.socket_id, channel)
+
+        windows = [
+            call for call in delay.call_args_list if call[1].get("timeout") == 0.1
+        ]
+        self.assertEqual(len(windows), 2)
+        self.assertEqual(watcher.count, 0)
+        self.state.flush_presence("app_key", channel)
+
+        self.assertEqual(watcher.count, 1)
+        diff = frames(watcher)[-1]
+        self.assertEqual(diff["event"], "pusher:member_diff")
+        self.assertEqual(
+            json.loads(diff["data"]),
+            dict(added=[dict(user_id="a")], removed=[], count=2),
+        )
+        self.assertIs(watcher.pending[0][0], peer.pending[0][0])
+        self.assertEqual(peer.count, 1)
+        self.assertEqual(first.count, 0)
+
+        with mock.patch.object(self.state.server, "delay"):
+            subscribe(second, "b")
+            subscribe(third, "c")
+        self.state.flush_presence("app_key", channel)
+
+        self.assertEqual(
+            json.loads(frames(watcher)[-1]["data"]),
+            dict(added=[dict(user_id="b"), dict(user_id="c")], removed=[], count=4),
+        )
+        self.assertEqual(first.count, 1)
+        self.assertEqual(
+            json.loads(frames(second)[-1]["data"]),
+            dict(added=[dict(user_id="c")], removed=[], count=4),
+        )
+        self.assertEqual(
+            json.loads(frames(third)[-1]["data"]),
+            dict(added=[dict(user_id="b")], removed=[], count=4),
+        )
+
+        self.state.presence_window = 0
+        self.state.presence_cap = 2
+        self.state.unsubscribe(third, "app_key", third.socket_id, channel)
+
+        count = frames(watcher)[-1]
+        self.assertEqual(count["event"], "pusher:member_count")
+        self.assertEqual(json.loads(count["data"]), dict(count=3))
+
+    def test_members(self):
+        """
+        Tests that the members sent inline upon subscription are capped
+        to the members limit of the connection, with the remaining ones
+        requested in pages, sharing the (cached) encoding of the members.
+        """
+
+        channel = "presence-room"
+        for user_id in ("a", "b", "c", "d"):
+            connection = self.build_connection()
+            self.state.subscribe(
+                connection,
+                "app_key",
+                connection.socket_id,
+                channel,
+                channel_data=dict(user_id=user_id),
+                force=True,
+            )
+
+        def frame(connection):
+            item = connection.pending[0]
+            return json.loads(netius.common.decode_ws(item[0])[0].decode("utf-8"))
+
+        connection.members_limit = 2
+        connection.pending.clear()
+        self.state.server.handle_pusher_subscribe(
+            connection, dict(data=dict(channel=channel))
+        )
+
+        data = json.loads(frame(connection)["data"])
+        self.assertEqual(
+            data["members"], dict(a=dict(user_id="a"), b=dict(user_id="b"))
+        )
+        self.assertEqual(data["member_count"], 4)
+        self.assertEqual(data["members_more"], True)
+        self.assertEqual(data["name"], channel)
+
+        self.state.server.handle_pusher_members(
+            connection, dict(data=dict(channel=channel, skip=2, count=10))
+        )
+
+        json_d = frame(connection)
+        data = json.loads(json_d["data"])
+        self.assertEqual(json_d["event"], "pusher_internal:members")
+        self.assertEqual(
+            data["members"], dict(c=dict(user_id="c"), d=dict(user_id="d"))
+        )
+        self.assertEqual(data["count"], 2)
+        self.assertEqual(data["member_count"], 4)
+
+        members_s = self.state.get_members_s("app_key", channel)
+        self.assertIs(self.state.get_members_s("app_key", channel), members_s)
+        self.state.unsubscribe(connection, "app_key", connection.socket_id, channel)
+        self.assertEqual(
+            json.loads(self.state.get_members_s("app_key", channel)),
+            dict(a=dict(user_id="a"), b=dict(user_id="b"), c=dict(user_id="c")),
+        )
+
+    def test_peer(self):
+        """
+        Tests that the peer channels are only subscribed once addressed
+        and that the later connections of their users are subscribed to
+        them, while the connections leaving are unsubscribed.
+        """
+
+        first = self.build_connection()
+        second = self.build_connection()
+        other = self.build_connection()
+        channel = "presence-room"
+        peer_channel = "peer-room:a&b"
+
+        for connection, user_id in ((first, "a"), (second, "b"), (other, "c")):
+            self.state.subscribe(
+                connection,
+                "app_key",
+                connection.socket_id,
+                channel,
+                channel_data=dict(user_id=user_id, peer=True),
+                force=True,
+            )
+
+        self.assertEqual(
+            list(self.app_state.socket_channels[first.socket_id]), [channel]
+        )
+        self.assertFalse(peer_channel in self.app_state.channel_sockets)
+
+        self.state.trigger(
+            "app_id",
+            "message",
+            "hello",
+            channels=peer_channel,
+            owner_id=first.socket_id,
+        )
+
+        self.assertEqual(
+            list(self.app_state.channel_sockets[peer_channel]),
+            [first.socket_id, second.socket_id],
+        )
+        frames = [
+            json.loads(netius.common.decode_ws(item[0])[0].decode("utf-8"))
+            for item in reversed(second.pending)
+        ]
+        self.assertEqual(frames[-1]["channel"], peer_channel)
+        self.assertEqual(frames[-1]["data"], "hello")
+        self.assertFalse(
+            self.state.is_subscribed("app_key", other.socket_id, peer_channel)
+        )
+
+        device = self.build_connection()
+        self.state.subscribe(
+            device,
+            "app_key",
+            device.socket_id,
+            channel,
+            channel_data=dict(user_id="b", peer=True),
+            force=True,
+        )
+
+        self.assertTrue(
+            self.state.is_subscribed("app_key", device.socket_id, peer_channel)
+        )
+
+        self.state.unsubscribe(first, "app_key", first.socket_id, channel)
+
+        self.assertFalse(
+            self.state.is_subscribed("app_key", first.socket_id, peer_channel)
+        )
+        self.assertFalse("a" in self.app_state.channel_info[channel].peers)
+
+    def test_peer_verify(self):
+        """
+        Tests that a peer channel is only opened by one of its users and
+        that neither invalid channel names nor unknown users are indexed.
+        """
+
+        first = self.build_connection()
+        second = self.build_connection()
+        other = self.build_connection()
+        outsider = self.build_connection()
+        channel = "presence-room"
+
+        for connection, user_id in ((first, "a"), (second, "b"), (other, "c")):
+            self.state.subscribe(
+                connection,
+                "app_key",
+                connection.socket_id,
+                channel,
+                channel_data=dict(user_id=user_id, peer=True),
+                force=True,
+            )
+
+        for socket_id, peer_channel in (
+            (other.socket_id, "peer-room:a&b"),
+            (outsider.socket_id, "peer-room:a&b"),
+            (first.socket_id, "peer-room:a&random"),
+            (first.socket_id, "peer-room:a&a"),
+            (first.socket_id, "peer-room:b&a"),
+            (first.socket_id, "peer-room:a"),
+        ):
+            self.assertRaises(
+                RuntimeError,
+                self.state.trigger,
+                "app_id",
+                "message",
+                "hello",
+                channels=peer_channel,
+                owner_id=socket_id,
+            )
+
+        info = self.app_state.channel_info[channel]
+        self.assertEqual(dict(info.peers), dict())
+        self.assertFalse(
+            self.state.is_subscribed("app_key", first.socket_id, "peer-room:a&b")
+        )
+
+        self.state.trigger(
+            "app_id",
+            "message",
+            "hello",
+            channels="peer-room:a&random",
+        )
+
+        self.assertEqual(dict(info.peers), dict())
+
+        self.state.trigger(
+            "app_id",
+            "message",
+            "hello",
+            channels="peer-room:a&b",
+            owner_id=second.socket_id,
+        )
+
+        self.assertEqual(sorted(info.peers.keys()), ["a", "b"])
+
+    def test_send_channel(self):
+        """
+        Tests that the event is sent once to every subscribed socket
+        except the owner one, sharing the same encoded frame.
+        """
+
+        owner = self.build_connection(channels=("global",))
+        first = self.build_connection(channels=("global",))
+        second = self.build_connection(channels=("global",))
+        invalid = dict()
+
+        self.state.send_channel(
+            "app_id",
+            "global",
+            dict(event="message", data="hello"),
+            owner_id=owner.socket_id,
+            invalid=invalid,
+        )
+
+        self.assertEqual(owner.count, 0)
+        self.assertEqual(first.count, 1)
+        self.assertEqual(second.count, 1)
+        self.assertIs(first.pending[0][0], second.pending[0][0])
+        self.assertTrue(first.socket_id in invalid)
+        self.assertTrue(second.socket_id in invalid)
+
+        # re-sends the event with the same invalid map, making sure
+        # that no socket receives the event twice
+        self.state.send_channel(
+            "app_id",
+            "global",
+            dict(event="message", data="hello"),
+            owner_id=owner.socket_id,
+            invalid=invalid,
+        )
+
+        self.assertEqual(first.count, 1)
+        self.assertEqual(second.count, 1)
+
+    def test_send_channel_echo(self):
+        """
+        Tests that the owner socket receives the event with the echo flag.
+        """
+
+        owner = self.build_connection(channels=("global",))
+
+        self.state.send_channel(
+            "app_id",
+            "global",
+            dict(event="message", data="hello"),
+            echo=True,
+            owner_id=owner.socket_id,
+        )
+
+        self.assertEqual(owner.count, 1)
+
+    def test_send_channel_bus(self):
+        """
+        Tests that the master relays the event to the workers using
+        the bus, identifying the trigger with the provided key.
+        """
+
+        self.state.bus = mock.MagicMock()
+
+        self.state.send_channel(
+            "app_id", "global", dict(event="message", data="hello"), key="key"
+        )
+
+        self.state.bus.publish.assert_called_once_with(
+            dict(
+                type="send",
+                app_id="app_id",
+                channel="global",
+                json_d=dict(event="message", data="hello"),
+                echo=False,
+                owner_id=None,
+                key="key",
+            )
+        )
+
+    def test_trigger_worker(self):
+        """
+        Tests that a worker verifies the presence of the owner and then
+        forwards the trigger to the master instead of sending it.
+        """
+
+        owner = self.build_connection(channels=("global",))
+        other = self.build_connection(channels=("global",))
+        self.state.bus = mock.MagicMock()
+        self.state.worker = 0
+
+        self.state.trigger(
+            "app_id", "message", "hello", channels="global", owner_id=owner.socket_id
+        )
+
+        self.assertEqual(other.count, 0)
+        message = self.state.bus.send.call_args[0][0]
+        self.assertEqual(message["type"], "trigger")
+        self.assertEqual(message["kwargs"]["channels"], ["global"])
+        self.assertEqual(message["kwargs"]["verify"], False)
+
+        self.assertRaises(
+            RuntimeError,
+            self.state.trigger,
+            "app_id",
+            "message",
+            "hello",
+            channels="private",
+            owner_id=owner.socket_id,
+        )
+
+    def test_handoff(self):
+        """
+        Tests that the triggers coming from a thread other than the one
+        of the server loop are queued and then run by the loop, in
+        batches and waking up the loop only once.
+        """
+
+        connection = self.build_connection(channels=("global",))
+        self.state.handoff_batch = 2
+
+        with mock.patch.object(self.state.server, "is_main", return_value=False):
+            with mock.patch.object(self.state.server, "delay") as delay:
+                for index in range(3):
+                    self.state.trigger(
+                        "app_id", "message", "hello %d" % index, channels="global"
+                    )
+
+        self.assertEqual(connection.count, 0)
+        self.assertEqual(len(self.state.handoff_queue), 3)
+        delay.assert_called_once_with(self.state.flush_handoff, safe=True)
+
+        with mock.patch.object(self.state.server, "delay") as delay:
+            self.state.flush_handoff()
+            self.assertEqual(connection.count, 2)
+            self.state.flush_handoff()
+            self.assertEqual(connection.count, 3)
+            flushes = [
+                call
+                for call in delay.call_args_list
+                if call[0][0] == self.state.flush_handoff
+            ]
+            self.assertEqual(flushes, [mock.call(self.state.flush_handoff)])
+
+        self.assertEqual(len(self.state.handoff_queue), 0)
+        self.assertEqual(self.state.handoff_pending, False)
+        self.assertEqual(self.state.get_depth()["handoff"], 0)
+
+    def test_handoff_direct(self):
+        """
+        Tests that the operations are run directly (no hand-off) in case
+        there's no server loop, and that the failures of the handed off
+        operations reach the caller waiting for them.
+        """
+
+        server = self.state.server
+        self.state.load_handlers(load=False)
+        self.state.server = None
+        handoff = self.state.handoff(
+            self.state.apn_handler.add, "app_id", "token", "global"
+        )
+
+        self.assertTrue(handoff.done)
+        self.assertEqual(self.state.apn_handler.subs, {"app_id": {"global": ["token"]}})
+        self.assertEqual(len(self.state.handoff_queue), 0)
+
+        self.state.server = server
+        trigger_c = mock.MagicMock(side_effect=RuntimeError("Problem"))
+        with mock.patch.object(self.state.server, "delay"):
+            with mock.patch.object(self.state.server, "is_main", return_value=False):
+                handoff = self.state.trigger("app_id", "message", "hello")
+            self.assertFalse(handoff.done)
+            with mock.patch.object(self.state, "trigger_c", trigger_c):
+                self.state.flush_handoff()
+
+        self.assertTrue(handoff.done)
+        self.assertRaises(RuntimeError, handoff.wait, 1.0)
+
+    def test_handoff_master(self):
+        """
+        Tests that in the master of a set of workers (no connections are
+        served) the triggers coming from other threads are handed off to
+        the loop of the master, instead of running concurrently.
+        """
+
+        self.state.bus = mock.MagicMock()
+        thread = self.state.start_loop()
+        threads = []
+        event = threading.Event()
+
+        def trigger_c(*args, **kwargs):
+            threads.append(threading.current_thread().ident)
+            event.set()
+
+        try:
+            with mock.patch.object(self.state, "trigger_c", trigger_c):
+                self.assertTrue(self.state.is_foreign())
+                other = threading.Thread(
+                    target=self.state.trigger, args=("app_id", "message", "hello")
+                )
+                other.start()
+                other.join()
+                self.assertTrue(event.wait(5.0))
+        finally:
+            self.state.server.delay(self.state.server.stop, safe=True)
+            thread.join(5.0)
+
+        self.assertEqual(threads, [thread.ident])
+        self.assertFalse(thread.is_alive())
+
+    def test_presence_worker(self):
+        """
+        Tests that the presence channels are refused in a worker (where
+        the membership would be partial) unless local presence is set.
+        """
+
+        connection = self.build_connection()
+        self.state.bus = mock.MagicMock()
+        self.state.worker = 0
+
+        for channel in ("presence-room", "peer-presence-room:a&b"):
+            self.assertRaises(
+                RuntimeError,
+                self.state.subscribe,
+                connection,
+                "app_key",
+                connection.socket_id,
+                channel,
+                channel_data=dict(user_id="a"),
+                force=True,
+            )
+        self.assertEqual(self.app_state.channel_info, {})
+
+        self.state.local_presence = True
+        self.state.subscribe(
+            connection,
+            "app_key",
+            connection.socket_id,
+            "presence-room",
+            channel_data=dict(user_id="a"),
+            force=True,
+        )
+        self.assertEqual(self.app_state.channel_info["presence-room"].user_count, 1)
+
+    def test_bus_send(self):
+        """
+        Tests that a worker sends the relayed events to its sockets only
+        once per trigger, even if subscribed to multiple of its channels.
+        """
+
+        connection = self.build_connection(channels=("global", "other"))
+        self.state.bus = mock.MagicMock()
+        self.state.worker = 0
+
+        for channel in ("global", "other"):
+            self.state.on_bus(
+                dict(
+                    type="send",
+                    app_id="app_id",
+                    channel=channel,
+                    json_d=dict(event="message", data="hello"),
+                    echo=False,
+                    owner_id=None,
+                    key="key",
+                )
+            )
+
+        self.assertEqual(connection.count, 1)
+        self.assertEqual(self.state.bus.publish.call_count, 0)
+
+    def test_broker(self):
+        """
+        Tests that an event sent in a node reaches the sockets of the
+        other node of the cluster, and that the interest in the channel
+        is only kept while there are sockets subscribed.
+        """
+
+        hub = pushi.LoopbackHub()
+        other = pushi.State()
+        other.app = mock.MagicMock()
+        other.server = pushi.PushiServer(other)
+        other.app_id_state["app_id"] = pushi.AppState("app_id", "app_key")
+        other.app_key_state["app_key"] = other.app_id_state["app_id"]
+        self.state.set_broker(pushi.LoopbackBroker(node_id="first", hub=hub))
+        other.set_broker(pushi.LoopbackBroker(node_id="second", hub=hub))
+
+        connection = other.server.build_connection(None, ("127.0.0.1", 0))
+        connection.status = netius.OPEN
+        connection.app_key = "app_key"
+        other.server.sockets[connection.socket_id] = connection
+        other.subscribe(connection, "app_key", connection.socket_id, "global")
+        other.subscribe(connection, "app_key", connection.socket_id, "other")
+
+        self.assertEqual(hub.interests[("app_id", "global")], set(["second"]))
+
+        self.state.trigger("app_id", "message", "hello", channels=("global", "other"))
+
+        self.assertEqual(connection.count, 1)
+
+        other.unsubscribe(connection, "app_key", connection.socket_id, "global")
+        other.unsubscribe(connection, "app_key", connection.socket_id, "other")
+
+        self.assertEqual(hub.interests, dict())
+        self.assertEqual(other.interests, dict())
+
+    def test_broker_presence(self):
+        """
+        Tests that the presence channels are refused in the nodes of a
+        cluster, and that with local presence set the membership of each
+        node only holds the users of its own connections.
+        """
+
+        hub = pushi.LoopbackHub()
+        other = pushi.State()
+        other.app = mock.MagicMock()
+        other.server = pushi.PushiServer(other)
+        other.app_id_state["app_id"] = pushi.AppState("app_id", "app_key")
+        other.app_key_state["app_key"] = other.app_id_state["app_id"]
+        self.state.set_broker(pushi.LoopbackBroker(node_id="first", hub=hub))
+        other.set_broker(pushi.LoopbackBroker(node_id="second", hub=hub))
+
+        first = self.build_connection()
+        second = other.server.build_connection(None, ("127.0.0.1", 0))
+        second.status = netius.OPEN
+        second.app_key = "app_key"
+        other.server.sockets[second.socket_id] = second
+
+        self.assertRaises(
+            RuntimeError,
+            self.state.subscribe,
+            first,
+            "app_key",
+            first.socket_id,
+            "presence-room",
+            channel_data=dict(user_id="a"),
+            force=True,
+        )
+
+        for state, connection, user_id in (
+            (self.state, first, "a"),
+            (other, second, "b"),
+        ):
+            state.local_presence = True
+            state.subscribe(
+                connection,
+                "app_key",
+                connection.socket_id,
+                "presence-room",
+                channel_data=dict(user_id=user_id),
+                force=True,
+            )
+
+        members = self.app_state.channel_info["presence-room"].members
+        others = other.app_key_state["app_key"].channel_info["presence-room"].members
+        self.assertEqual(list(members.keys()), ["a"])
+        self.assertEqual(list(others.keys()), ["b"])
+
+    def test_broker_handoff(self):
+        """
+        Tests that the events received from the broker in a thread other
+        than the one of the server loop are handed off to the loop.
+        """
+
+        connection = self.build_connection(channels=("global",))
+        message = dict(
+            type="send",
+            app_id="app_id",
+            channel="global",
+            json_d=dict(event="message", channel="global", data="hello"),
+            echo=False,
+            owner_id=None,
+            key="key",
+        )
+
+        with mock.patch.object(self.state.server, "is_main", return_value=False):
+            with mock.patch.object(self.state.server, "delay") as delay:
+                self.state.on_broker(message)
+
+        self.assertEqual(connection.count, 0)
+        self.assertEqual(len(self.state.handoff_queue), 1)
+        delay.assert_called_once_with(self.state.flush_handoff, safe=True)
+
+        with mock.patch.object(self.state.server, "delay"):
+            self.state.flush_handoff()
+
+        self.assertEqual(connection.count, 1)
+
+    def test_metrics(self):
+        """
+        Tests that the subscriptions, the events and the delayed
+        operations are accounted in the metrics of the state.
+        """
+
+        self.state.server.app_sockets["app_key"] = 2
+        connection = self.build_connection(channels=("global", "conflated-a"))
+        self.state.unsubscribe(connection, "app_key", connection.socket_id, "global")
+        self.state.trigger("app_id", "message", "hello", channels="conflated-a")
+        self.state.trigger("app_id", "message", "hello", persist=True)
+
+        self.assertEqual(self.state.metric_subscribes.values["public"], 1)
+        self.assertEqual(self.state.metric_subscribes.values["conflated"], 1)
+        self.assertEqual(self.state.metric_unsubscribes.values["public"], 1)
+        self.assertEqual(self.state.metric_events.values["conflated"], 1)
+        self.assertEqual(self.state.metric_events.values["public"], 1)
+        self.assertEqual(self.state.metric_fanout.values[None][-2], 0)
+        self.assertEqual(self.state.get_connections(), dict(app_id=2))
+        self.assertEqual(self.state.get_depth(), dict(persist=1, handoff=0))
+
+        execute = self.state.app.delay.call_args[0][0]
+        with mock.patch.object(self.state, "get_subscriptions", return_value=[]):
+            with mock.patch("pushi.PushiEvent.save"):
+                execute()
+
+        self.assertEqual(self.state.get_depth(), dict(persist=0, handoff=0))
+        self.assertTrue(
+            'pushi_events_total{type="conflated"} 1' in self.state.metrics.render()
+        )
+
+    def test_snapshot(self):
+        """
+        Tests that the indexes are restored from the snapshot, catching
+        up with the new entities, and that a source is loaded from the
+        data source in case entities were removed or changed since the
+        snapshot (modified after its watermark).
+        """
+
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+
+        models = (pushi.Subscription, pushi.APN, pushi.SMTP, pushi.Web, pushi.WebPush)
+        for model in models:
+            for name, value in (("find", []), ("count", 0)):
+                patcher = mock.patch.object(model, name, return_value=value)
+                patcher.start()
+                self.addCleanup(patcher.stop)
+
+        self.state.snapshot_path = os.path.join(path, "snapshot")
+        self.state.load_handlers(load=False)
+        self.state.apn_handler.add("app_id", "token", "global")
+        self.app_state.alias["personal-user"] = ["global"]
+        self.state.save_snapshot()
+
+        other = pushi.State()
+        other.app = mock.MagicMock()
+        other.load_handlers(load=False)
+        sub = mock.MagicMock(app_id="app_id", token="other", event="global")
+        pushi.APN.find.return_value = [sub]
+        pushi.APN.count.side_effect = lambda **kwargs: 0 if kwargs else 1
+        other.restore_snapshot(snapshot.read(self.state.snapshot_path))
+
+        self.assertEqual(other.apn_handler.subs["app_id"]["global"], ["token", "other"])
+        pushi.APN.count.assert_called_with(id={"$lte": 0}, modified={"$gte": mock.ANY})
+        self.assertEqual(
+            other.app_key_state["app_key"].alias_i, {"global": ["personal-user"]}
+        )
+
+        other = pushi.State()
+        other.app = mock.MagicMock()
+        other.load_handlers(load=False)
+        pushi.APN.count.side_effect = lambda **kwargs: 0
+        other.restore_snapshot(snapshot.read(self.state.snapshot_path))
+
+        self.assertEqual(other.apn_handler.subs["app_id"]["global"], ["other"])
+
+        other = pushi.State()
+        other.app = mock.MagicMock()
+        other.load_handlers(load=False)
+        pushi.APN.count.side_effect = lambda **kwargs: 1
+        other.restore_snapshot(snapshot.read(self.state.snapshot_path))
+
+        self.assertEqual(other.apn_handler.subs["app_id"]["global"], ["other"])
+
+    def test_handler_handoff(self):
+        """
+        Tests that the subscriptions of the handlers created from a thread
+        other than the one of the server loop (eg: HTTP request handler)
+        are handed off to the loop, the only writer of the indexes.
+        """
+
+        self.state.load_handlers(load=False)
+        models = (
+            (pushi.APN, self.state.apn_handler, dict(token="token")),
+            (pushi.SMTP, self.state.smtp_handler, dict(email="email")),
+            (pushi.Web, self.state.web_handler, dict(url="url")),
+            (pushi.WebPush, self.state.web_push_handler, dict(id=1)),
+        )
+
+        with mock.patch.object(
+            appier, "get_app", return_value=mock.MagicMock(state=self.state)
+        ), mock.patch.object(pushi.PushiBase, "post_create"):
+            with mock.patch.object(self.state.server, "is_main", return_value=False):
+                with mock.patch.object(self.state.server, "delay"):
+                    for model, handler, kwargs in models:
+                        instance = model(event="global", **kwargs)
+                        instance.instance = "app_id"
+                        instance.post_create()
+                        self.assertEqual(handler.subs, {})
+
+            self.assertEqual(len(self.state.handoff_queue), 4)
+            with mock.patch.object(self.state.server, "delay"):
+                self.state.flush_handoff()
+
+        for model, handler, kwargs in models:
+            self.assertEqual(
+                handler.subs, {"app_id": {"global": list(kwargs.values())}}
+            )
+
+    def test_snapshot_loop(self):
+        """
+        Tests that the indexes are copied in the server loop when saving
+        the snapshot from another thread, so that the serialization runs
+        over a copy that is not changed by the loop in the meantime.
+        """
+
+        self.state.bus = mock.MagicMock()
+        self.state.load_handlers(load=False)
+        self.state.apn_handler.add("app_id", "token", "global")
+        thread = self.state.start_loop()
+        threads = []
+        written = []
+
+        copy_sources = self.state.copy_sources
+
+        def copy_sources_c():
+            threads.append(threading.current_thread().ident)
+            return copy_sources()
+
+        try:
+            with mock.patch.object(self.state, "get_sources", return_value=[]):
+                self.assertEqual(self.state.call_loop(lambda: 1), 1)
+            with mock.patch.object(
+                self.state, "copy_sources", copy_sources_c
+            ), mock.patch.object(
+                self.state,
+                "get_sources",
+                return_value=[
+                    (
+                        "apn",
+                        mock.MagicMock(find=lambda **kwargs: [], count=lambda: 0),
+                        None,
+                        self.state.apn_handler.snapshot,
+                        None,
+                    )
+                ],
+            ), mock.patch.object(
+                snapshot, "write", lambda path, data: written.append(data)
+            ):
+                self.state.snapshot_path = "snapshot"
+                other = threading.Thread(target=self.state.save_snapshot)
+                other.start()
+                other.join(5.0)
+        finally:
+            self.state.server.delay(self.state.server.stop, safe=True)
+            thread.join(5.0)
+
+        self.assertEqual(threads, [thread.ident])
+        data = written[0]["sources"]["apn"]["data"]
+        self.assertEqual(data, self.state.apn_handler.snapshot())
+        self.assertIsNot(data, self.state.apn_handler.snapshot())
+
+    def test_resume(self):
+        """
+        Tests that a client subscribing with the mid of the last event it
+        has seen gets the missed events replayed from memory, and that an
+        unknown mid is signaled so that the client may fallback.
+        """
+
+        self.state.ring.count = 64
+        self.build_connection(channels=("global",))
+        for data in ("first", "second", "third"):
+            self.state.trigger("app_id", "message", data, channels="global")
+
+        mids = [
+            mid
+            for mid, _json_d, _size in self.state.ring.channels[("app_id", "global")]
+        ]
+
+        for mid, expected in ((mids[0], ["second", "third"]), ("unknown", [])):
+            connection = self.build_connection()
+            self.state.server.handle_pusher_subscribe(
+                connection, dict(data=dict(channel="global", mid=mid))
+            )
+            frames = [
+                json.loads(netius.common.decode_ws(item[0])[0].decode("utf-8"))
+                for item in reversed(connection.pending)
+            ]
+            subscribed = json.loads(frames[0]["data"])
+
+            self.assertEqual(subscribed["resumed"], bool(expected))
+            self.assertEqual([frame["data"] for frame in frames[1:]], expected)
+
+    def test_resume_personal(self):
+        """
+        Tests that a personal channel is resumed from the mids of each one
+        of its alias channels, and that it's not resumed in case the mid of
+        any of them is missing (the gap can't be proven to be filled).
+        """
+
+        self.state.ring.count = 64
+        self.app_state.alias["personal-user"] = ["global", "other"]
+        self.build_connection(channels=("global", "other"))
+        for channel in ("global", "other"):
+            for data in ("first", "second"):
+                self.state.trigger("app_id", "message", data, channels=channel)
+
+        mids = dict(
+            (channel, self.state.ring.channels[("app_id", channel)][0][0])
+            for channel in ("global", "other")
+        )
+
+        for _mids, expected in (
+            (mids, ["second", "second"]),
+            (dict(other=mids["other"]), []),
+        ):
+            connection = self.build_connection()
+            with mock.patch.object(self.state, "get_events", return_value=[]):
+                self.state.server.handle_pusher_subscribe(
+                    connection, dict(data=dict(channel="personal-user", mids=_mids))
+                )
+            frames = [
+                json.loads(netius.common.decode_ws(item[0])[0].decode("utf-8"))
+                for item in reversed(connection.pending)
+            ]
+            subscribed = json.loads(frames[0]["data"])
+
+            self.assertEqual(subscribed["resumed"], bool(expected))
+            self.assertEqual([frame["data"] for frame in frames[1:]], expected)
+
+    def test_history(self):
+        """
+        Tests that the recent history of a channel is read from the data
+        source only once and then kept up to date with the persisted events.
+        """
+
+        self.state.history.count = 50
+        find = mock.MagicMock(return_value=[dict(_id="id", mid="first")])
+        with mock.patch("pushi.PushiEvent.find", find):
+            for _index in range(2):
+                events = self.state.get_events("app_key", "global", limit=False)
+                self.assertEqual(events, [dict(mid="first")])
+
+        self.assertEqual(find.call_count, 1)
+        self.assertEqual(self.state.metric_history.values, dict(hit=1, miss=1))
+
+        self.state.trigger("app_id", "message", "hello", persist=True)
+        execute = self.state.app.delay.call_args[0][0]
+        with mock.patch.object(self.state, "get_subscriptions", return_value=[]):
+            with mock.patch("pushi.PushiEvent.save"):
+                execute()
+
+        events = self.state.get_events("app_key", "global", limit=False)
+
+        self.assertEqual(len(events), 2)
+        self.assertEqual(events[0]["data"]["data"], "hello")
+        self.assertEqual(events[1], dict(mid="first"))
+
+    def test_get_settings(self):
+        """
+        Tests that only the settings defined in the app are returned.
+        """
+
+        app = mock.MagicMock()
+        app.queue_bytes = 1024
+        app.queue_messages = None
+        app.queue_policy = "disconnect"
+        app.coalesce = None
+        app.coalesce_channels = None
+        app.conflate_channels = None
+        app.max_connections = None
+        app.members_limit = None
+        app.connection_rate = None
+        app.connection_burst = None
+        app.message_rate = None
+        app.message_burst = None
+
+        with mock.patch.object(self.state, "get_app", return_value=app):
+            settings = self.state.get_settings("app_key")
+
+        self.assertEqual(settings, dict(queue_bytes=1024, queue_policy="disconnect"))
+
+        with mock.patch.object(self.state, "get_app", return_value=None):
+            settings = self.state.get_settings("app_key")
+
+        self.assertEqual(settings, dict())
+
+    def test_get_app(self):
+        """
+        Tests that the apps are retrieved from the data source only once,
+        until they are invalidated (eg: upon the update of the app).
+        """
+
+        app = mock.MagicMock()
+        app.ident = "app_id"
+        app.key = "app_key"
+
+        with mock.patch("pushi.App.get", return_value=app) as get:
+            self.assertEqual(self.state.get_app(app_id="app_id"), app)
+            self.assertEqual(self.state.get_app(app_id="app_id"), app)
+            self.assertEqual(self.state.get_app(app_key="app_key"), app)
+            self.assertEqual(get.call_count, 1)
+
+            self.state.invalidate_app(app_id="app_id", app_key="app_key")
+
+            self.assertEqual(self.state.get_app(app_key="app_key"), app)
+            self.assertEqual(get.call_count, 2)
+
+        self.assertEqual(self.state.metric_apps.values, dict(hit=2, miss=2))
+
+        with mock.patch("pushi.App.get", return_value=None) as get:
+            self.assertEqual(self.state.get_app(app_key="invalid", raise_e=False), None)
+            self.assertEqual(self.state.get_settings("invalid"), dict())
+            self.assertEqual(self.state.get_settings_cached("invalid"), dict())
+            self.assertEqual(get.call_count, 1)
+
+        self.assertEqual(self.state.get_settings_cached("other"), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
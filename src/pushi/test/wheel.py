@@ -0,0 +1,81 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Hive Pushi System
+# Copyright (c) 2008-2024 Hive Solutions Lda.
+#
+# This file is part of Hive Pushi System.
+#
+# Hive Pushi System is free software: you can redistribute it and/or modify
+# it under the terms of the Apache License as published by the Apache
+# Foundation, either version 2.0 of the License, or (at your option) any
+# later version.
+#
+# Hive Pushi System is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# Apache License for more details.
+#
+# You should have received a copy of the Apache License along with
+# Hive Pushi System. If not, see <http://www.apache.org/licenses/>.
+
+__author__ = "João Magalhães <joamag@hive.pt>"
+""" The author(s) of the module """
+
+__copyright__ = "Copyright (c) 2008-2024 Hive Solutions Lda."
+""" The copyright for the module """
+
+__license__ = "Apache License, Version 2.0"
+""" The license for the module """
+
+import unittest
+
+import pushi
+
+
+class TimerWheelTest(unittest.TestCase):
+    """
+    Unit tests for the TimerWheel class.
+
+    Tests the expiration of the keys scheduled in the wheel,
+    including the ones with timeouts longer than a round.
+    """
+
+    def test_expire(self):
+        """
+        Tests that the keys expire at the tick of their timeout.
+        """
+
+        wheel = pushi.TimerWheel(size=4, timestamp=0)
+        wheel.add("first", 1)
+        wheel.add("second", 2.5)
+        wheel.add("third", 4)
+        wheel.add("fourth", 9)
+
+        self.assertEqual(len(wheel), 4)
+        self.assertEqual(wheel.expire(1), ["first"])
+        self.assertEqual(wheel.expire(2), [])
+        self.assertEqual(wheel.expire(3), ["second"])
+        self.assertEqual(wheel.expire(8), ["third"])
+        self.assertEqual(wheel.expire(9), ["fourth"])
+        self.assertEqual(len(wheel), 0)
+
+    def test_remove(self):
+        """
+        Tests that removed and re-scheduled keys do not expire early.
+        """
+
+        wheel = pushi.TimerWheel(size=4, timestamp=0)
+        wheel.add("first", 1)
+        wheel.add("second", 1)
+        wheel.remove("first")
+        wheel.add("second", 3)
+
+        self.assertFalse("first" in wheel)
+        self.assertEqual(wheel.expire(2), [])
+        self.assertEqual(wheel.expire(3), ["second"])
+        wheel.remove("second")
+
+
+if __name__ == "__main__":
+    unittest.main()